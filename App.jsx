@@ -4,6 +4,16 @@ import { Upload, Search, User, LogOut, Camera, Image, RefreshCw, Eye, EyeOff, Al
 // Define the absolute URL for your backend API
 const API_BASE_URL = 'http://localhost:3000/api';
 
+// Highlighted thumbnails are rendered on demand by the API, one request per visible result
+const highlightUrl = (result) =>
+  `${API_BASE_URL}/highlight/${result.photo_id}?box=${result.box.join(',')}&size=thumb` +
+  (result.timestamp_ms !== undefined ? `&t=${result.timestamp_ms}` : '');
+
+const formatTimestamp = (ms) => {
+  const seconds = Math.floor(ms / 1000);
+  return `${Math.floor(seconds / 60)}:${String(seconds % 60).padStart(2, '0')}`;
+};
+
 const SnapIDApp = () => {
   const [currentUser, setCurrentUser] = useState(null);
   const [activeTab, setActiveTab] = useState('login');
@@ -109,27 +119,44 @@ const SnapIDApp = () => {
     setLoading(true);
     setUploadProgress(0);
     
-    const formData = new FormData();
-    Array.from(files).forEach(file => {
-      formData.append('album_photos', file);
+    // Photos go up together; videos go one per request to the video route,
+    // the only one accepting bodies over 16MB
+    const isVideo = (file) => /\.(mp4|mov|m4v|avi|mkv|webm)$/i.test(file.name);
+    const requests = [];
+    const photos = Array.from(files).filter(file => !isVideo(file));
+    if (photos.length > 0) {
+      const formData = new FormData();
+      photos.forEach(file => formData.append('album_photos', file));
+      requests.push(['upload_album', formData]);
+    }
+    Array.from(files).filter(isVideo).forEach(file => {
+      const formData = new FormData();
+      formData.append('album_videos', file);
+      requests.push(['upload_videos', formData]);
     });
     
     try {
-      const response = await fetch(`${API_BASE_URL}/upload_album`, {
-        method: 'POST',
-        body: formData,
-        credentials: 'include'
-      });
-      
-      const data = await response.json();
-      
-      if (response.ok && data.success) {
-        showMessage('success', data.message);
-        setUploadProgress(100);
-        setTimeout(() => setUploadProgress(0), 2000);
-      } else {
-        showMessage('error', data.message || data.error || 'Upload failed');
+      let uploaded = 0;
+      for (const [index, [route, formData]] of requests.entries()) {
+        const response = await fetch(`${API_BASE_URL}/${route}`, {
+          method: 'POST',
+          body: formData,
+          credentials: 'include'
+        });
+        
+        const data = await response.json();
+        
+        if (!response.ok || !data.success) {
+          showMessage('error', data.message || data.error || 'Upload failed');
+          setLoading(false);
+          return;
+        }
+        uploaded += data.files.length;
+        setUploadProgress(Math.round(100 * (index + 1) / requests.length));
       }
+      showMessage('success', `Successfully uploaded ${uploaded} files`);
+      setUploadProgress(100);
+      setTimeout(() => setUploadProgress(0), 2000);
     } catch (error) {
       showMessage('error', 'Upload failed. Please try again.');
     }
@@ -582,7 +609,7 @@ const handleDownloadAll = async () => {
                 type="file"
                 ref={albumFileRef}
                 multiple
-                accept=".jpg,.jpeg,.png"
+                accept=".jpg,.jpeg,.png,.mp4,.mov,.m4v,.avi,.mkv,.webm"
                 onChange={(e) => handleAlbumUpload(e.target.files)}
                 className="hidden"
               />
@@ -600,7 +627,7 @@ const handleDownloadAll = async () => {
                     Drop photos here or click to browse
                   </p>
                   <p className="text-gray-500 text-lg">
-                    Select multiple photos â€¢ JPG, PNG supported â€¢ Max 10MB each
+                    Select multiple photos or videos â€¢ JPG, PNG, MP4, MOV supported
                   </p>
                 </div>
               </div>
@@ -693,7 +720,8 @@ const handleDownloadAll = async () => {
                       <div key={index} className="group relative overflow-hidden rounded-2xl shadow-lg hover:shadow-2xl transition-all duration-300 transform hover:scale-105">
                         <div className="aspect-square cursor-pointer" onClick={() => handleDownload(result.filename)}>
                           <img
-                            src={result.image_data}
+                            src={highlightUrl(result)}
+                            loading="lazy"
                             alt={decodeURIComponent(result.filename)}
                             className="w-full h-full object-cover group-hover:scale-110 transition-transform duration-500"
                           />
@@ -702,6 +730,7 @@ const handleDownloadAll = async () => {
                         <div className="absolute bottom-0 left-0 right-0 p-4 text-white transform translate-y-full group-hover:translate-y-0 transition-transform duration-300">
                           <p className="font-semibold truncate text-sm mb-1">
                             {decodeURIComponent(result.filename)}
+                            {result.timestamp_ms !== undefined && ` @ ${formatTimestamp(result.timestamp_ms)}`}
                           </p>
                           <div className="flex items-center gap-2">
                             <div className="w-2 h-2 bg-green-400 rounded-full animate-pulse"></div>
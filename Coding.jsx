@@ -20,6 +20,31 @@ const CompetitiveCodingPlatform = () => {
   const navigate = useNavigate();
   const API_BASE = 'http://localhost:3000';
 
+  // The coding service rate-limits each candidate by a token it issues; keep
+  // one per browser tab and fetch a fresh one if the service rejects it
+  const getCandidateToken = async (refresh = false) => {
+    let token = refresh ? null : sessionStorage.getItem('codingToken');
+    if (!token) {
+      const response = await fetch(`${API_BASE}/session`, { method: 'POST' });
+      if (!response.ok) {
+        throw new Error('Could not start a coding session');
+      }
+      token = (await response.json()).token;
+      sessionStorage.setItem('codingToken', token);
+    }
+    return token;
+  };
+
+  const postWithToken = async (path, body) => {
+    const send = async (token) => fetch(`${API_BASE}${path}`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json', 'X-Candidate-Token': token },
+      body: JSON.stringify(body),
+    });
+    const response = await send(await getCandidateToken());
+    return response.status === 401 ? send(await getCandidateToken(true)) : response;
+  };
+
   const languages = [
     { value: 'java', label: 'Java', icon: '☕' },
     { value: 'python', label: 'Python', icon: '🐍' },
@@ -130,11 +155,7 @@ const CompetitiveCodingPlatform = () => {
     setActiveTab('results');
     setError(null);
     try {
-      const response = await fetch(`${API_BASE}/run`, {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ code, language, problemId }),
-      });
+      const response = await postWithToken('/run', { code, language, problemId });
       if (!response.ok) {
         const errorData = await response.json();
         throw new Error(errorData.error || 'Failed to run code');
@@ -163,11 +184,7 @@ const CompetitiveCodingPlatform = () => {
     setActiveTab('results');
     setError(null);
     try {
-      const response = await fetch(`${API_BASE}/submit`, {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ code, language, problemId }),
-      });
+      const response = await postWithToken('/submit', { code, language, problemId });
       if (!response.ok) {
         const errorData = await response.json();
         throw new Error(errorData.error || 'Failed to submit code');
@@ -1,33 +1,51 @@
 from flask import Flask, request, jsonify, session, send_file
 from flask_cors import CORS
 from pymongo import MongoClient
+from bson import ObjectId
+from bson.errors import InvalidId
 import os
-import cv2
 import numpy as np
-import torch
-import torchvision.transforms as transforms
-import base64
-from PIL import Image
-from mtcnn import MTCNN
-from facenet_pytorch import InceptionResnetV1
-from scipy.spatial.distance import cosine
 import json
-import hashlib
 import time
-from threading import Thread
+import hashlib
+from threading import Lock
 from werkzeug.utils import secure_filename
-from datetime import datetime
+from datetime import datetime, timedelta
 import bcrypt
 import urllib.parse
 import zipfile
 import io
+import click
+from embedding_store import EmbeddingStore, NO_TIMESTAMP, best_faces_per_file
+from face_pipeline import SUPPORTED_EXTENSIONS, extract_faces, extract_features, index_image, get_file_hash
+from image_io import decode_image
+from metrics import MetricsRegistry, PROMETHEUS_CONTENT_TYPE
+from bounded_cache import BoundedLRU
+from rendering import RENDITIONS, render_highlight
+from search_shards import ShardedSearcher, authkey_from_env
+from photo_metadata import extract_photo_metadata
+from video_ingest import VIDEO_EXTENSIONS, is_video, index_video, extract_video_metadata
+from pca_matcher import PCA_FILENAME, PCAProjection, TwoStageMatcher, sample_embeddings
+from singleflight import SingleFlight
 
 app = Flask(__name__)
 app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['ALBUM_FOLDER'] = 'album'
 app.config['CACHE_FOLDER'] = 'cache'
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+# Only /api/upload_videos takes bodies this large; Werkzeug spools the files to disk as they arrive
+app.config['MAX_VIDEO_UPLOAD_LENGTH'] = 512 * 1024 * 1024
 app.config['SECRET_KEY'] = 'your-secret-key'
+# Label stage timings with the username; turn off to keep /metrics cardinality bounded
+app.config['METRICS_PER_USER_LABELS'] = os.environ.get('METRICS_PER_USER_LABELS', '1') != '0'
+app.config['RENDER_CACHE_BYTES'] = 64 * 1024 * 1024  # rendered highlight JPEGs kept in memory
+# Scatter-gather search: local shard worker processes and/or remote `search_shards.py serve` addresses
+app.config['SEARCH_WORKERS'] = int(os.environ.get('SEARCH_WORKERS', '0'))
+app.config['SEARCH_WORKER_ADDRESSES'] = [a for a in os.environ.get('SEARCH_WORKER_ADDRESSES', '').split(',') if a]
+app.config['SEARCH_MIN_ROWS_PER_SHARD'] = 50000
+# Two-stage PCA matcher, used once `flask --app app fit-pca` has written CACHE_FOLDER/pca.npz
+app.config['PCA_MATCHER'] = os.environ.get('PCA_MATCHER', '1') != '0'
+app.config['PCA_MARGIN'] = float(os.environ.get('PCA_MARGIN', '1.0'))  # < 1 trades recall for speed
 
 # Configure CORS
 CORS(app, supports_credentials=True, resources={
@@ -47,26 +65,94 @@ users_collection = db['users']
 photos_collection = db['photos']
 embeddings_collection = db['embeddings']
 
+# Indexes backing the search prefilters (capture date, event and folder)
+photos_collection.create_index([("username", 1), ("taken_at", 1)])
+photos_collection.create_index([("username", 1), ("event", 1)])
+photos_collection.create_index([("username", 1), ("folder", 1)])
+# Search results are resolved to photo ids by path
+photos_collection.create_index([("username", 1), ("filepath", 1)])
+
 # Create required folders
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 os.makedirs(app.config['ALBUM_FOLDER'], exist_ok=True)
 os.makedirs(app.config['CACHE_FOLDER'], exist_ok=True)
 
-# Initialize MTCNN & FaceNet
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-detector = MTCNN()
-facenet = InceptionResnetV1(pretrained='vggface2').eval().to(device)
-
-# Tensor Transform
-transform = transforms.Compose([
-    transforms.ToTensor(),
-    transforms.Resize((160, 160)),
-    transforms.Normalize(mean=[0.5], std=[0.5])
-])
+# Memory-mapped per-user embedding matrices, shared by all workers on the host
+embedding_store = EmbeddingStore(app.config['CACHE_FOLDER'])
 
 # Global variables for cache
 cache_last_updated = 0
-cache_updating = False
+
+# Single-flight layers: concurrent callers for the same search, album check or
+# index rebuild wait on one in-flight computation and share its result
+search_flight = SingleFlight()
+album_check_flight = SingleFlight()
+index_flight = SingleFlight()
+user_index_locks = {}
+user_index_locks_guard = Lock()
+
+# Shard workers are started on first search, not at import time
+sharded_searcher = None
+sharded_searcher_lock = Lock()
+
+def get_sharded_searcher():
+    global sharded_searcher
+    if not app.config['SEARCH_WORKERS'] and not app.config['SEARCH_WORKER_ADDRESSES']:
+        return None
+    with sharded_searcher_lock:
+        if sharded_searcher is None:
+            sharded_searcher = ShardedSearcher(
+                app.config['CACHE_FOLDER'],
+                workers=app.config['SEARCH_WORKERS'],
+                addresses=app.config['SEARCH_WORKER_ADDRESSES'],
+                authkey=authkey_from_env(),
+                min_rows_per_shard=app.config['SEARCH_MIN_ROWS_PER_SHARD'])
+        return sharded_searcher
+
+def load_two_stage_matcher():
+    pca_path = os.path.join(app.config['CACHE_FOLDER'], PCA_FILENAME)
+    if not app.config['PCA_MATCHER'] or not os.path.exists(pca_path):
+        return None
+    projection = PCAProjection.load(pca_path)
+    print(f"Two-stage matcher enabled with a {projection.dims}-d PCA projection.")
+    return TwoStageMatcher(embedding_store, projection, margin=app.config['PCA_MARGIN'])
+
+two_stage_matcher = load_two_stage_matcher()
+
+# Highlighted result images, rendered on demand by /api/highlight
+render_cache = BoundedLRU(max_bytes=app.config['RENDER_CACHE_BYTES'])
+
+# Metrics served on /metrics
+metrics = MetricsRegistry()
+stage_seconds = metrics.histogram(
+    'face_stage_seconds', 'Time spent in each stage of search, upload and indexing.',
+    ['operation', 'stage', 'user'])
+indexed_photos = metrics.counter('face_indexed_photos_total', 'Photos run through detection and embedding.', ['user'])
+indexed_faces = metrics.counter('face_indexed_faces_total', 'Faces embedded by the indexer.', ['user'])
+index_queue_depth = metrics.gauge('face_index_queue_depth', 'Cache update jobs currently queued or running.')
+
+def metric_user(username):
+    return username if app.config['METRICS_PER_USER_LABELS'] else ''
+
+def stage_timer(operation, username):
+    user = metric_user(username)
+    return lambda stage: stage_seconds.time(operation=operation, stage=stage, user=user)
+
+def cached_faces_by_user():
+    totals = {}
+    for username, count in embedding_store.cached_users().items():
+        key = (metric_user(username),)
+        totals[key] = totals.get(key, 0) + count
+    return totals
+
+metrics.gauge('face_cache_faces', 'Faces in the memory-mapped embedding views open in this process.',
+              ['user'], callback=cached_faces_by_user)
+metrics.gauge('face_cache_users', 'Users with an embedding view open in this process.',
+              callback=lambda: len(embedding_store.cached_users()))
+metrics.gauge('face_render_cache_bytes', 'Bytes of rendered highlight images held in the LRU cache.',
+              callback=lambda: render_cache.size_bytes)
+metrics.gauge('face_render_cache_entries', 'Rendered highlight images held in the LRU cache.',
+              callback=lambda: len(render_cache))
 
 # Custom JSON encoder
 class NumpyEncoder(json.JSONEncoder):
@@ -83,38 +169,6 @@ class NumpyEncoder(json.JSONEncoder):
             return obj.isoformat()
         return super(NumpyEncoder, self).default(obj)
 
-def extract_faces(img_array, confidence_threshold=0.8):
-    if img_array is None:
-        return [], []
-    rgb_img = cv2.cvtColor(img_array, cv2.COLOR_BGR2RGB)
-    faces = detector.detect_faces(rgb_img)
-    face_images, face_positions = [], []
-    for face in faces:
-        if face['confidence'] >= confidence_threshold:
-            x, y, w, h = face['box']
-            x1, y1, x2, y2 = max(0, x), max(0, y), min(rgb_img.shape[1], x + w), min(rgb_img.shape[0], y + h)
-            face_img = rgb_img[y1:y2, x1:x2]
-            if face_img.size > 0:
-                face_images.append(face_img)
-                face_positions.append((x1, y1, x2, y2))
-    return face_images, face_positions
-
-def extract_features(face_img):
-    face_img = Image.fromarray(face_img)
-    face_tensor = transform(face_img).unsqueeze(0).to(device)
-    with torch.no_grad():
-        embedding = facenet(face_tensor).cpu().numpy()
-    return embedding / np.linalg.norm(embedding)
-
-def get_file_hash(file_path):
-    hasher = hashlib.md5()
-    with open(file_path, 'rb') as f:
-        buf = f.read(65536)
-        while len(buf) > 0:
-            hasher.update(buf)
-            buf = f.read(65536)
-    return hasher.hexdigest()
-
 def load_cache(username):
     embeddings = embeddings_collection.find({"username": username})
     cache = {}
@@ -139,12 +193,28 @@ def save_cache(username, cache):
                 "last_updated": datetime.utcnow()
             })
         cache_last_updated = time.time()
+        embedding_store.write(username, cache)
         print(f"Cache saved with {len(cache)} entries for user {username}.")
         return True
     except Exception as e:
         print(f"Error saving cache: {str(e)}")
         return False
 
+def rebuild_embedding_store(username):
+    count = embedding_store.write(username, load_cache(username))
+    print(f"Embedding store rebuilt with {count} faces for user {username}.")
+    return embedding_store.open(username)
+
+def open_embedding_view(username):
+    view = embedding_store.open(username)
+    if view is None:
+        view = rebuild_embedding_store(username)
+    return view
+
+def load_cache_index(username):
+    # File hashes only, served from the on-disk store instead of Mongo
+    return open_embedding_view(username).file_hashes()
+
 def check_album_changes(username, cache):
     user_photos = photos_collection.find({"username": username})
     photo_paths = {photo['filepath'] for photo in user_photos}
@@ -156,43 +226,56 @@ def check_album_changes(username, cache):
             return True
     return False
 
+def album_version(username):
+    latest = photos_collection.find_one({"username": username}, {"_id": 1}, sort=[("_id", -1)])
+    return (photos_collection.count_documents({"username": username}), latest['_id'] if latest else None)
+
+def user_index_lock(username):
+    with user_index_locks_guard:
+        return user_index_locks.setdefault(username, Lock())
+
 def update_cache_async(username):
-    global cache_updating
-    if cache_updating:
-        return
-    cache_updating = True
-    thread = Thread(target=update_cache, args=(username,))
-    thread.daemon = True
-    thread.start()
+    index_flight.start(('index', username, album_version(username)), update_cache, username)
+
+def update_cache_shared(username):
+    # Synchronous rebuild that joins an identical one already in flight
+    return index_flight.do(('index', username, album_version(username)), update_cache, username)
+
+def is_index_updating(username):
+    return bool(index_flight.in_flight(lambda key: key[1] == username))
 
 def update_cache(username):
-    global cache_updating
+    stage = stage_timer('index', username)
+    user = metric_user(username)
+    index_queue_depth.inc()
+    # Rebuilds for one user never overlap, even for different album versions
+    user_lock = user_index_lock(username)
+    user_lock.acquire()
     try:
         print(f"Starting cache update for user {username}...")
         user_photos = photos_collection.find({"username": username})
-        supported_extensions = ['jpg', 'jpeg', 'png']
+        with stage('load_cache'):
+            old_cache = load_cache(username)
         new_cache = {}
         for photo in user_photos:
             img_path = photo['filepath']
-            if not any(img_path.lower().endswith(ext) for ext in supported_extensions):
+            if not img_path.lower().endswith(SUPPORTED_EXTENSIONS + VIDEO_EXTENSIONS):
                 continue
-            file_hash = get_file_hash(img_path)
-            if img_path in new_cache and new_cache[img_path]['hash'] == file_hash:
+            with stage('hash'):
+                file_hash = get_file_hash(img_path)
+            # Reuse embeddings of unchanged photos (e.g. ones indexed by bulk_index.py)
+            if img_path in old_cache and old_cache[img_path]['hash'] == file_hash:
+                new_cache[img_path] = old_cache[img_path]
                 continue
             try:
-                img_array = cv2.imread(img_path)
-                if img_array is None:
-                    continue
-                faces, positions = extract_faces(img_array)
-                if not faces:
+                if is_video(img_path):
+                    face_data = index_video(img_path, stage=stage)
+                else:
+                    face_data = index_image(img_path, stage=stage)
+                indexed_photos.inc(user=user)
+                indexed_faces.inc(len(face_data), user=user)
+                if not face_data:
                     continue
-                face_data = []
-                for face, position in zip(faces, positions):
-                    features = extract_features(face)
-                    face_data.append({
-                        'embedding': features.tolist(),
-                        'position': position
-                    })
                 new_cache[img_path] = {
                     'hash': file_hash,
                     'faces': face_data
@@ -200,57 +283,85 @@ def update_cache(username):
             except Exception as e:
                 print(f"Error processing {img_path}: {str(e)}")
                 continue
-        save_cache(username, new_cache)
+        with stage('persist'):
+            save_cache(username, new_cache)
         print(f"Cache update completed for user {username}.")
     except Exception as e:
         print(f"Error updating cache: {str(e)}")
     finally:
-        cache_updating = False
-
-def find_matches_in_album(username, solo_embedding, similarity_threshold=0.3):
+        user_lock.release()
+        index_queue_depth.dec()
+
+def parse_search_filters(form):
+    """Photo query for the optional date_from/date_to/event/folder search fields, or None."""
+    query = {}
+    taken_at = {}
+    if form.get('date_from'):
+        taken_at['$gte'] = datetime.fromisoformat(form['date_from'])
+    if form.get('date_to'):
+        date_to = datetime.fromisoformat(form['date_to'])
+        # A bare date includes the whole day
+        if len(form['date_to']) == 10:
+            taken_at['$lt'] = date_to + timedelta(days=1)
+        else:
+            taken_at['$lte'] = date_to
+    if taken_at:
+        query['taken_at'] = taken_at
+    for field in ('event', 'folder'):
+        if form.get(field):
+            query[field] = form[field]
+    return query or None
+
+def find_matches_in_album(username, solo_embedding, similarity_threshold=0.3, filters=None):
     matches = []
-    cache = load_cache(username)
-    for img_path, cache_entry in cache.items():
+    stage = stage_timer('search', username)
+    with stage('open_store'):
+        view = open_embedding_view(username)
+    rows = None
+    if filters:
+        # Narrow to the rows of photos in scope so the scan costs what the scope does
+        with stage('prefilter'):
+            scoped = photos_collection.find(dict(filters, username=username), {"filepath": 1})
+            rows = view.rows_for_paths(photo['filepath'] for photo in scoped)
+    searcher = get_sharded_searcher()
+    with stage('score'):
+        if searcher is not None and rows is None:
+            hits = searcher.search(username, view, solo_embedding, similarity_threshold)
+        elif two_stage_matcher is not None:
+            hits = two_stage_matcher.best_faces_per_file(username, view, solo_embedding, similarity_threshold, rows=rows)
+        else:
+            hits = best_faces_per_file(view, solo_embedding, similarity_threshold, rows=rows)
+    with stage('resolve_photos'):
+        hit_paths = [view.files[file_idx][0] for file_idx, _, _ in hits]
+        photo_ids = {photo['filepath']: str(photo['_id']) for photo in photos_collection.find(
+            {"username": username, "filepath": {"$in": hit_paths}}, {"filepath": 1})}
+    for file_idx, best_similarity, row in hits:
+        img_path = view.files[file_idx][0]
         try:
-            if 'faces' not in cache_entry or not cache_entry['faces']:
+            best_face_position = tuple(int(v) for v in view.boxes[row, 1:5])
+            timestamp_ms = int(view.boxes[row, 5])
+            similarity_percentage = float((1 - best_similarity) * 100)
+            if similarity_percentage <= 70:
                 continue
-            matched = False
-            best_similarity = 1.0
-            best_face_position = None
-            for face_data in cache_entry['faces']:
-                features = np.array(face_data['embedding'])
-                position = face_data['position']
-                similarity = float(cosine(solo_embedding.flatten(), features.flatten()))
-                if similarity < best_similarity:
-                    best_similarity = similarity
-                    best_face_position = position
-                if similarity < similarity_threshold:
-                    matched = True
-            if matched:
-                similarity_percentage = float((1 - best_similarity) * 100)
-                if similarity_percentage <= 70:
-                    continue
-                img_array = cv2.imread(img_path)
-                if img_array is None:
-                    continue
-                result_img = img_array.copy()
-                if best_face_position:
-                    x1, y1, x2, y2 = best_face_position
-                    cv2.rectangle(result_img, (x1, y1), (x2, y2), (0, 255, 0), 2)
-                _, highlighted_buffer = cv2.imencode('.jpg', result_img)
-                highlighted_b64 = base64.b64encode(highlighted_buffer).decode('utf-8')
-                _, original_buffer = cv2.imencode('.jpg', img_array)
-                original_b64 = base64.b64encode(original_buffer).decode('utf-8')
-
-                # FIX: Send the clean basename without any URL encoding
-                filename = os.path.basename(img_path)
-                matches.append({
-                    "filename": filename,
-                    "filepath": img_path,
-                    "similarity": similarity_percentage,
-                    "image_data": f"data:image/jpeg;base64,{highlighted_b64}",
-                    "original_image_data": f"data:image/jpeg;base64,{original_b64}"
-                })
+            # Deleted since the store was last rebuilt
+            if img_path not in photo_ids:
+                continue
+
+            # FIX: Send the clean basename without any URL encoding
+            filename = os.path.basename(img_path)
+            # The highlighted image itself is rendered lazily by /api/highlight, keyed by photo id since
+            # photos from different archive folders can share a filename
+            match = {
+                "photo_id": photo_ids[img_path],
+                "filename": filename,
+                "filepath": img_path,
+                "similarity": similarity_percentage,
+                "box": list(best_face_position)
+            }
+            if timestamp_ms != NO_TIMESTAMP:
+                # Video match: the frame the best face was found in
+                match["timestamp_ms"] = timestamp_ms
+            matches.append(match)
         except Exception as e:
             print(f"Error processing cached entry {img_path}: {str(e)}")
             continue
@@ -308,9 +419,25 @@ def upload_album():
     if 'album_photos' not in request.files:
         return jsonify({"error": "No photos uploaded"}), 400
     
+    return save_album_uploads(request.files.getlist('album_photos'), SUPPORTED_EXTENSIONS + VIDEO_EXTENSIONS)
+
+@app.route('/api/upload_videos', methods=['POST'])
+def upload_videos():
+    if 'username' not in session:
+        return jsonify({"error": "Please login first"}), 401
+    
+    # Raised before the body is parsed; every other route keeps MAX_CONTENT_LENGTH
+    request.max_content_length = app.config['MAX_VIDEO_UPLOAD_LENGTH']
+    if 'album_videos' not in request.files:
+        return jsonify({"error": "No videos uploaded"}), 400
+    
+    return save_album_uploads(request.files.getlist('album_videos'), VIDEO_EXTENSIONS)
+
+def save_album_uploads(photos, extensions):
     try:
         username = session['username']
-        photos = request.files.getlist('album_photos')
+        stage = stage_timer('upload', username)
+        event = request.form.get('event') or None
         uploaded_files = []
         
         for photo in photos:
@@ -319,24 +446,31 @@ def upload_album():
                 filename = secure_filename(photo.filename)
                 
                 # The check now works correctly on the clean filename
-                if not filename.lower().endswith(('.jpg', '.jpeg', '.png')):
+                if not filename.lower().endswith(extensions):
                     continue
                 
                 # The file is saved with the clean name
                 file_path = os.path.join(app.config['ALBUM_FOLDER'], filename)
-                photo.save(file_path)
+                with stage('save'):
+                    photo.save(file_path)
                 
-                photos_collection.insert_one({
-                    "username": username,
-                    "filename": filename,  # Store the clean filename
-                    "filepath": file_path,
-                    "upload_date": datetime.utcnow()
-                })
+                with stage('register'):
+                    photos_collection.insert_one({
+                        "username": username,
+                        "filename": filename,  # Store the clean filename
+                        "filepath": file_path,
+                        "upload_date": datetime.utcnow(),
+                        "event": event,
+                        "folder": None,
+                        "media_type": "video" if is_video(file_path) else "photo",
+                        **(extract_video_metadata(file_path) if is_video(file_path) else extract_photo_metadata(file_path))
+                    })
                 
                 uploaded_files.append(filename)
         
         if uploaded_files:
-            update_cache_async(username)
+            with stage('enqueue_index'):
+                update_cache_async(username)
             return jsonify({
                 "success": True,
                 "message": f"Successfully uploaded {len(uploaded_files)} photos",
@@ -366,34 +500,19 @@ def search():
     if 'solo_photo' not in request.files:
         return jsonify({"error": "Photo is required"}), 400
     
+    try:
+        filters = parse_search_filters(request.form)
+    except ValueError:
+        return jsonify({"error": "date_from/date_to must be ISO dates (YYYY-MM-DD)"}), 400
+    
     try:
         username = session['username']
-        cache = load_cache(username)
-        
-        if check_album_changes(username, cache):
-            update_cache_async(username)
-        
-        solo_photo = request.files['solo_photo']
-        solo_img_data = np.frombuffer(solo_photo.read(), np.uint8)
-        solo_img_array = cv2.imdecode(solo_img_data, cv2.IMREAD_COLOR)
-        
-        solo_faces, _ = extract_faces(solo_img_array)
-        if not solo_faces:
-            return jsonify({
-                "match_found": False,
-                "message": "No face detected in the photo",
-                "matches": []
-            })
-        
-        solo_embedding = extract_features(solo_faces[0])
-        matches = find_matches_in_album(username, solo_embedding, similarity_threshold=0.5)
-        
+        photo_bytes = request.files['solo_photo'].read()
+        query_hash = hashlib.md5(photo_bytes + repr(sorted((filters or {}).items())).encode('utf-8')).hexdigest()
+        # Double-clicks and duplicate tabs share one search
+        body = search_flight.do(('search', username, query_hash), run_search, username, photo_bytes, filters)
         return app.response_class(
-            response=json.dumps({
-                "match_found": len(matches) > 0,
-                "message": f"Found {len(matches)} matching images" if matches else "No matches found in your album",
-                "matches": matches
-            }, cls=NumpyEncoder),
+            response=body,
             status=200,
             mimetype='application/json'
         )
@@ -401,6 +520,87 @@ def search():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+def run_search(username, photo_bytes, filters):
+    stage = stage_timer('search', username)
+    with stage('load_cache'):
+        view = open_embedding_view(username)
+    
+    with stage('check_album_changes'):
+        album_changed = album_check_flight.do(('check', username, view.version),
+                                              check_album_changes, username, view.file_hashes())
+    if album_changed:
+        update_cache_async(username)
+    
+    with stage('decode'):
+        solo_img_array, _ = decode_image(photo_bytes)
+    
+    with stage('detect'):
+        solo_faces, _ = extract_faces(solo_img_array, inplace=True)
+    if not solo_faces:
+        return json.dumps({
+            "match_found": False,
+            "message": "No face detected in the photo",
+            "matches": []
+        })
+    
+    with stage('embed'):
+        solo_embedding = extract_features(solo_faces[0])
+    matches = find_matches_in_album(username, solo_embedding, similarity_threshold=0.5, filters=filters)
+    
+    with stage('serialize'):
+        return json.dumps({
+            "match_found": len(matches) > 0,
+            "message": f"Found {len(matches)} matching images" if matches else "No matches found in your album",
+            "matches": matches
+        }, cls=NumpyEncoder)
+
+@app.route('/api/highlight/<photo_id>', methods=['GET'])
+def highlight_photo(photo_id):
+    if 'username' not in session:
+        return jsonify({"error": "Please login first"}), 401
+
+    try:
+        username = session['username']
+        rendition = request.args.get('size', 'thumb')
+        if rendition not in RENDITIONS:
+            return jsonify({"error": f"Unknown size '{rendition}'"}), 400
+        box = None
+        timestamp_ms = request.args.get('t', type=int)
+        if request.args.get('box'):
+            box = tuple(int(v) for v in request.args['box'].split(','))
+            if len(box) != 4:
+                return jsonify({"error": "box must be x1,y1,x2,y2"}), 400
+
+        try:
+            photo = photos_collection.find_one({"_id": ObjectId(photo_id), "username": username})
+        except InvalidId:
+            photo = None
+        if not photo or not os.path.exists(photo['filepath']):
+            return jsonify({"error": "Photo not found"}), 404
+
+        # mtime in the key so a replaced photo is never served stale
+        if is_video(photo['filepath']) and timestamp_ms is None:
+            return jsonify({"error": "t (timestamp in ms) is required for videos"}), 400
+        if not is_video(photo['filepath']):
+            timestamp_ms = None
+        key = (photo['filepath'], os.stat(photo['filepath']).st_mtime_ns, box, rendition, timestamp_ms)
+        rendered = render_cache.get(key)
+        if rendered is None:
+            with stage_timer('highlight', username)('render'):
+                rendered = render_highlight(photo['filepath'], box, max_side=RENDITIONS[rendition],
+                                            timestamp_ms=timestamp_ms)
+            if rendered is None:
+                return jsonify({"error": "Could not decode photo"}), 500
+            render_cache.put(key, rendered)
+
+        response = app.response_class(response=rendered, status=200, mimetype='image/jpeg')
+        response.headers['Cache-Control'] = 'private, max-age=3600'
+        return response
+    except ValueError:
+        return jsonify({"error": "box must be x1,y1,x2,y2"}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/api/download_photo/<filename>', methods=['GET'])
 def download_photo(filename):
     if 'username' not in session:
@@ -471,7 +671,7 @@ def force_update_cache():
         return jsonify({"error": "Please login first"}), 401
     
     try:
-        update_cache(session['username'])
+        update_cache_shared(session['username'])
         return jsonify({"success": True, "message": "Cache updated successfully"})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -490,7 +690,7 @@ def user_stats():
             "username": username,
             "photo_count": photo_count,
             "cached_embeddings": cache_count,
-            "cache_status": "updating" if cache_updating else "ready"
+            "cache_status": "updating" if is_index_updating(username) else "ready"
         })
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -536,6 +736,10 @@ def health_check():
         "timestamp": datetime.utcnow().isoformat()
     })
 
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    return app.response_class(response=metrics.render(), status=200, content_type=PROMETHEUS_CONTENT_TYPE)
+
 # Error handlers
 @app.errorhandler(404)
 def not_found(error):
@@ -547,13 +751,34 @@ def internal_error(error):
 
 @app.errorhandler(413)
 def too_large(error):
-    return jsonify({"error": "File too large. Maximum size is 16MB"}), 413
+    limit_mb = (request.max_content_length or app.config['MAX_CONTENT_LENGTH']) // (1024 * 1024)
+    return jsonify({"error": f"File too large. Maximum size is {limit_mb}MB"}), 413
 
 def initialize_cache():
     for user in users_collection.find():
         username = user['username']
-        if check_album_changes(username, load_cache(username)):
-            update_cache(username)
+        if check_album_changes(username, load_cache_index(username)):
+            update_cache_shared(username)
+
+@app.cli.command('rebuild-embeddings')
+@click.argument('username', required=False)
+def rebuild_embeddings_command(username):
+    """Rebuild the on-disk embedding store from Mongo."""
+    usernames = [username] if username else [user['username'] for user in users_collection.find()]
+    for name in usernames:
+        rebuild_embedding_store(name)
+
+@app.cli.command('fit-pca')
+@click.option('--dims', default=128, show_default=True, help='Reduced dimensionality (64-128 recommended).')
+@click.option('--sample', default=200000, show_default=True, help='Stored embeddings sampled across users.')
+def fit_pca_command(dims, sample):
+    """Fit the deployment-wide PCA projection used by the two-stage matcher."""
+    usernames = [user['username'] for user in users_collection.find()]
+    samples = sample_embeddings(embedding_store, usernames, sample)
+    projection = PCAProjection.fit(samples, dims)
+    projection.save(os.path.join(app.config['CACHE_FOLDER'], PCA_FILENAME))
+    print(f"Fitted {dims}-d projection on {len(samples)} embeddings, "
+          f"capturing {projection.explained_energy(samples):.1%} of their energy. Restart workers to use it.")
 
 # Initialize cache on startup
 with app.app_context():
@@ -0,0 +1,307 @@
+"""Load test for the coding service.
+
+Starts fake_judge0.py (executing Python submissions, with the given latency
+and failure injection) and coding.py on local ports, then replays a mix of
+/run and /submit requests from a rising number of concurrent candidates.
+Each candidate sends a request, waits for the answer, thinks for an
+exponentially distributed time and repeats.  Reports throughput, latency
+percentiles and error rates per concurrency level as JSON, so runs can be
+diffed against bench_coding_baseline.json:
+
+    python bench_coding.py --concurrency 1 4 16 64 --duration 30 --output bench.json
+    python bench_coding.py --judge0-latency 0.3 --judge0-jitter 0.5 --judge0-jitter-distribution exponential
+    python bench_coding.py --target http://127.0.0.1:5000   # an already running service
+
+Solutions are written in Python, the language the fake actually runs.  Each
+request's code carries a unique comment so the result cache only serves the
+repeat_fraction of requests that resend earlier code.
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import socket
+import shutil
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+from datetime import datetime
+import requests
+
+# question id -> outcome -> Python solution
+SOLUTIONS = {
+    1: {
+        'correct': "class Solution:\n    def add(self, a, b):\n        return a + b\n",
+        'wrong': "class Solution:\n    def add(self, a, b):\n        return a - b\n",
+        'crash': "class Solution:\n    def add(self, a, b):\n        return a / 0\n",
+        'syntax': "class Solution:\n    def add(self, a, b)\n        return a + b\n",
+    },
+    2: {
+        'correct': "class Solution:\n    def reverseString(self, s):\n        s.reverse()\n",
+        'wrong': "class Solution:\n    def reverseString(self, s):\n        s.sort()\n",
+        'crash': "class Solution:\n    def reverseString(self, s):\n        s[len(s)] = s[0]\n",
+        'syntax': "class Solution:\n    def reverseString(self, s):\n        s.reverse(\n",
+    },
+    3: {
+        'correct': (
+            "class Solution:\n"
+            "    def twoSum(self, nums, target):\n"
+            "        seen = {}\n"
+            "        for i, n in enumerate(nums):\n"
+            "            if target - n in seen:\n"
+            "                return [seen[target - n], i]\n"
+            "            seen[n] = i\n"
+        ),
+        'wrong': "class Solution:\n    def twoSum(self, nums, target):\n        return [0, 1]\n",
+        'crash': "class Solution:\n    def twoSum(self, nums, target):\n        return nums[len(nums)]\n",
+        'syntax': "class Solution:\n    def twoSum(self, nums, target):\n        return [0, 1\n",
+    },
+}
+# Custom /run inputs, used for a share of /run requests (each runs the reference too)
+CUSTOM_INPUTS = {1: "a = 40, b = 2", 2: "racecar!", 3: "nums = [1, 5, 9, 13], target = 14"}
+
+
+def parse_weights(text):
+    """'run=0.7,submit=0.3' -> {'run': 0.7, 'submit': 0.3}"""
+    weights = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        weights[name.strip()] = float(weight)
+    return weights
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_until_up(url, process, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"{url} exited with {process.returncode} before it was ready")
+        try:
+            requests.get(url, timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+def start_services(args, workdir):
+    """(coding service URL, processes) for a fake Judge0 and a coding.py wired to it."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    judge0_port, coding_port = free_port(), free_port()
+    judge0 = subprocess.Popen(
+        [sys.executable, os.path.join(here, 'fake_judge0.py'), '--port', str(judge0_port), '--execute',
+         '--latency', str(args.judge0_latency), '--jitter', str(args.judge0_jitter),
+         '--jitter-distribution', args.judge0_jitter_distribution, '--error-rate', str(args.judge0_error_rate),
+         '--throttle-rate', str(args.judge0_throttle_rate), '--tle-rate', str(args.judge0_tle_rate)],
+        cwd=here, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    processes = [judge0]
+    try:
+        wait_until_up(f"http://127.0.0.1:{judge0_port}/submissions/none", judge0)
+        env = dict(os.environ, EXECUTOR='judge0', JUDGE0_BASE_URL=f"http://127.0.0.1:{judge0_port}",
+                   JOBS_FOLDER=os.path.join(workdir, 'jobs'))
+        coding = subprocess.Popen(
+            [sys.executable, '-c',
+             f"import coding; coding.app.run(host='127.0.0.1', port={coding_port}, threaded=True)"],
+            cwd=here, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        processes.append(coding)
+        url = f"http://127.0.0.1:{coding_port}"
+        wait_until_up(url + '/metrics', coding)
+    except BaseException:
+        stop_services(processes)
+        raise
+    return url, processes
+
+
+def stop_services(processes):
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+class Workload:
+    """Draws (endpoint, request body) pairs from the configured mix."""
+
+    def __init__(self, mix, outcomes, custom_fraction, repeat_fraction):
+        self.mix = mix
+        self.outcomes = outcomes
+        self.custom_fraction = custom_fraction
+        self.repeat_fraction = repeat_fraction
+
+    @staticmethod
+    def _choice(rng, weights):
+        return rng.choices(list(weights), weights=list(weights.values()))[0]
+
+    def next(self, rng, sent):
+        kind = self._choice(rng, self.mix)
+        if sent.get(kind) and rng.random() < self.repeat_fraction:
+            return kind, rng.choice(sent[kind])
+        question_id = rng.choice(sorted(SOLUTIONS))
+        code = SOLUTIONS[question_id][self._choice(rng, self.outcomes)] + f"# {uuid.uuid4().hex}\n"
+        body = {'question_id': question_id, 'language': 'python', 'code': code}
+        if kind == 'run' and rng.random() < self.custom_fraction:
+            body['test_case'] = CUSTOM_INPUTS[question_id]
+        sent.setdefault(kind, []).append(body)
+        return kind, body
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, int(round(q / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+def summarize(samples, elapsed):
+    """Throughput, latency percentiles and error rates of (status, seconds) samples."""
+    seconds = sorted(sample_seconds for _, sample_seconds in samples)
+    statuses = {}
+    for status, _ in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    count = len(samples)
+    rejected = sum(1 for status, _ in samples if status in (429, 503))
+    failed = sum(1 for status, _ in samples if status is None or (status >= 400 and status not in (429, 503)))
+    summary = {
+        'requests': count,
+        'throughput_rps': round(count / elapsed, 3) if elapsed else None,
+        'error_rate': round(failed / count, 4) if count else None,
+        'rejected_rate': round(rejected / count, 4) if count else None,
+        'statuses': statuses,
+    }
+    for q in (50, 90, 95, 99):
+        value = percentile(seconds, q)
+        summary[f"p{q}_ms"] = round(value * 1000, 1) if value is not None else None
+    summary['max_ms'] = round(seconds[-1] * 1000, 1) if seconds else None
+    return summary
+
+
+def run_stage(url, concurrency, args, workload):
+    """Summary of `concurrency` candidates sending requests for args.duration seconds."""
+    samples = {kind: [] for kind in workload.mix}
+    lock = threading.Lock()
+    started = time.monotonic()
+    deadline = started + args.duration
+
+    def candidate(index):
+        rng = random.Random(f"{args.seed}:{concurrency}:{index}")
+        session = requests.Session()
+        # Each candidate gets its own rate-limit bucket, as a browser would
+        session.headers['X-Candidate-Token'] = session.post(f"{url}/session", timeout=args.timeout).json()['token']
+        sent = {}
+        # Stagger the first requests over one think time, as candidates arrive
+        time.sleep(rng.uniform(0, args.think_time))
+        while time.monotonic() < deadline:
+            kind, body = workload.next(rng, sent)
+            request_started = time.monotonic()
+            try:
+                response = session.post(f"{url}/{kind}", json=body, timeout=args.timeout)
+                status = response.status_code
+            except requests.RequestException:
+                status = None
+            with lock:
+                samples[kind].append((status, time.monotonic() - request_started))
+            if args.think_time:
+                time.sleep(min(rng.expovariate(1 / args.think_time), max(0.0, deadline - time.monotonic())))
+
+    threads = [threading.Thread(target=candidate, args=(i,), daemon=True) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+    every = [sample for kind_samples in samples.values() for sample in kind_samples]
+    return {
+        'concurrency': concurrency,
+        'elapsed_s': round(elapsed, 1),
+        'overall': summarize(every, elapsed),
+        'endpoints': {kind: summarize(kind_samples, elapsed) for kind, kind_samples in samples.items()},
+    }
+
+
+def saturation(stages, latency_budget_ms, max_error_rate):
+    """The first concurrency whose p95 latency or error rate is over budget, or None."""
+    for stage in stages:
+        overall = stage['overall']
+        if (overall['p95_ms'] or 0) > latency_budget_ms or (overall['error_rate'] or 0) > max_error_rate:
+            return stage['concurrency']
+    return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the coding service against a fake Judge0.")
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16, 64],
+                        help="Concurrent candidates, one stage per value")
+    parser.add_argument('--duration', type=float, default=30, help="Seconds per stage")
+    parser.add_argument('--think-time', type=float, default=5.0,
+                        help="Mean seconds a candidate waits between requests (0 = back to back)")
+    parser.add_argument('--mix', type=parse_weights, default='run=0.7,submit=0.3', help="Endpoint weights")
+    parser.add_argument('--outcomes', type=parse_weights, default='correct=0.6,wrong=0.25,crash=0.1,syntax=0.05',
+                        help="Weights of correct, wrong, crashing and non-compiling solutions")
+    parser.add_argument('--custom-fraction', type=float, default=0.3,
+                        help="Share of /run requests with a custom test case")
+    parser.add_argument('--repeat-fraction', type=float, default=0.1,
+                        help="Share of requests resending a candidate's earlier code unchanged")
+    parser.add_argument('--timeout', type=float, default=120, help="Client timeout per request, seconds")
+    parser.add_argument('--latency-budget-ms', type=float, default=5000,
+                        help="p95 latency above which a stage counts as saturated")
+    parser.add_argument('--max-error-rate', type=float, default=0.01)
+    parser.add_argument('--judge0-latency', type=float, default=0.05, help="Fake Judge0 fixed latency, seconds")
+    parser.add_argument('--judge0-jitter', type=float, default=0.1)
+    parser.add_argument('--judge0-jitter-distribution', choices=['uniform', 'exponential'], default='exponential')
+    parser.add_argument('--judge0-error-rate', type=float, default=0.0)
+    parser.add_argument('--judge0-throttle-rate', type=float, default=0.0)
+    parser.add_argument('--judge0-tle-rate', type=float, default=0.0)
+    parser.add_argument('--target', help="URL of a running coding service instead of starting one")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="Write JSON here instead of stdout")
+    args = parser.parse_args(argv)
+
+    workload = Workload(args.mix, args.outcomes, args.custom_fraction, args.repeat_fraction)
+    report = {
+        "benchmark": "coding_load",
+        "timestamp": datetime.utcnow().isoformat(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "config": {key: value for key, value in vars(args).items() if key not in ('output', 'target')},
+        "stages": [],
+    }
+    workdir = tempfile.mkdtemp(prefix='bench_coding_')
+    processes = []
+    try:
+        if args.target:
+            url = args.target.rstrip('/')
+        else:
+            url, processes = start_services(args, workdir)
+        for concurrency in args.concurrency:
+            report["stages"].append(run_stage(url, concurrency, args, workload))
+            print(f"concurrency {concurrency}: {report['stages'][-1]['overall']}", file=sys.stderr)
+    finally:
+        stop_services(processes)
+        shutil.rmtree(workdir, ignore_errors=True)
+    report["saturated_at"] = saturation(report["stages"], args.latency_budget_ms, args.max_error_rate)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
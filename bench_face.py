@@ -0,0 +1,357 @@
+"""Benchmarks for the face search pipeline.
+
+Times each stage of indexing and search (decode, detect, embed, persist,
+load, match, encode response) on synthetic albums of configurable size, and
+optionally on a fixture directory of real photos, and prints the results as
+JSON so runs can be diffed between releases:
+
+    python bench_face.py --faces 1000 100000 1000000 --output bench.json
+    python bench_face.py --images fixtures/album --faces 10000
+
+Mongo is replaced by an in-memory stand-in (LocalCollection); the on-disk
+embedding store is written to a temporary directory.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import resource
+import tracemalloc
+from datetime import datetime
+import cv2
+import numpy as np
+from embedding_store import EmbeddingStore, EMBEDDING_DIM, BOX_COLUMNS, NO_TIMESTAMP, best_faces_per_file
+from rendering import RENDITIONS, render_highlight
+from pca_matcher import PCAProjection, TwoStageMatcher
+from image_io import decode_image
+
+SUPPORTED_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+
+class LocalCollection:
+    """Minimal in-memory stand-in for the pymongo collections app.py uses."""
+
+    def __init__(self):
+        self.docs = []
+
+    @staticmethod
+    def _matches(doc, query):
+        return all(doc.get(key) == value for key, value in (query or {}).items())
+
+    def find(self, query=None, projection=None):
+        return [doc for doc in self.docs if self._matches(doc, query)]
+
+    def find_one(self, query=None):
+        return next(iter(self.find(query)), None)
+
+    def insert_one(self, doc):
+        self.docs.append(dict(doc))
+
+    def insert_many(self, docs):
+        self.docs.extend(dict(doc) for doc in docs)
+
+    def delete_many(self, query):
+        self.docs = [doc for doc in self.docs if not self._matches(doc, query)]
+
+    def count_documents(self, query):
+        return len(self.find(query))
+
+
+class StageTimer:
+    def __init__(self, trace_memory=True):
+        self.samples = {}
+        self.rss = {}
+        self.allocs = {}
+        self.trace_memory = trace_memory
+
+    def record(self, stage, seconds, items=1):
+        self.samples.setdefault(stage, []).append((seconds, items))
+
+    def time(self, stage, fn, *args, items=1, trace=True, **kwargs):
+        # Peak traced allocation of the call is its per-request memory; numpy and
+        # OpenCV arrays are allocated through numpy and show up in tracemalloc.
+        # Python-heavy stages pass trace=False to keep tracing overhead out of them.
+        traced = self.trace_memory and trace
+        if traced:
+            tracemalloc.start()
+            baseline = tracemalloc.get_traced_memory()[0]
+        started = time.perf_counter()
+        result = fn(*args, **kwargs)
+        self.record(stage, time.perf_counter() - started, items)
+        if traced:
+            peak = tracemalloc.get_traced_memory()[1] - baseline
+            tracemalloc.stop()
+            self.allocs.setdefault(stage, []).append(peak / (1024 * 1024))
+        self.rss[stage] = peak_rss_mb()
+        return result
+
+    def report(self):
+        report = {}
+        for stage, samples in self.samples.items():
+            seconds = np.array([s for s, _ in samples])
+            items = sum(n for _, n in samples)
+            total = float(seconds.sum())
+            report[stage] = {
+                "calls": len(samples),
+                "items": items,
+                "total_s": round(total, 6),
+                "throughput_per_s": round(items / total, 3) if total > 0 else None,
+                "p50_ms": round(float(np.percentile(seconds, 50)) * 1000, 3),
+                "p95_ms": round(float(np.percentile(seconds, 95)) * 1000, 3),
+                "p99_ms": round(float(np.percentile(seconds, 99)) * 1000, 3),
+                "peak_rss_mb": self.rss.get(stage),
+            }
+            if stage in self.allocs:
+                allocs = np.array(self.allocs[stage])
+                report[stage]["p50_request_alloc_mb"] = round(float(np.percentile(allocs, 50)), 3)
+                report[stage]["peak_request_alloc_mb"] = round(float(allocs.max()), 3)
+        return report
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    return round(peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024, 1)
+
+
+def normalize(rows):
+    rows /= np.linalg.norm(rows, axis=1, keepdims=True)
+    return rows
+
+
+def synthetic_album(n_faces, rng, faces_per_photo=3, faces_per_identity=20, spectrum_decay=0.0, chunk=100000):
+    """Random unit embeddings clustered around identities, so queries have real matches.
+
+    spectrum_decay > 0 gives identity directions a power-law variance spectrum,
+    closer to real FaceNet embeddings than the isotropic default.
+    """
+    n_identities = max(1, n_faces // faces_per_identity)
+    scales = (1.0 + np.arange(EMBEDDING_DIM, dtype=np.float32)) ** (-spectrum_decay / 2)
+    scales /= np.sqrt(np.mean(scales ** 2))
+    identities = normalize(rng.standard_normal((n_identities, EMBEDDING_DIM), dtype=np.float32) * scales)
+    vectors = np.empty((n_faces, EMBEDDING_DIM), dtype=np.float32)
+    for start in range(0, n_faces, chunk):
+        stop = min(start + chunk, n_faces)
+        ids = rng.integers(0, n_identities, stop - start)
+        noise = rng.standard_normal((stop - start, EMBEDDING_DIM), dtype=np.float32) * (scales * 0.03)
+        vectors[start:stop] = normalize(identities[ids] + noise)
+    boxes = np.empty((n_faces, BOX_COLUMNS), dtype=np.int32)
+    boxes[:, 0] = np.arange(n_faces) // faces_per_photo
+    boxes[:, 1:3] = rng.integers(0, 800, (n_faces, 2))
+    boxes[:, 3:5] = boxes[:, 1:3] + rng.integers(40, 200, (n_faces, 2))
+    boxes[:, 5] = NO_TIMESTAMP
+    n_files = int(boxes[-1, 0]) + 1 if n_faces else 0
+    files = [[f"album/synthetic_{i:07d}.jpg", f"{i:032x}"] for i in range(n_files)]
+    return files, vectors, boxes, identities
+
+
+def bench_large_decode(timer, workdir, megapixels, max_pixels, repeats=3):
+    """Uncapped vs capped decode of one large synthetic panorama."""
+    height = int((megapixels * 1e6 / 3) ** 0.5)
+    width = 3 * height
+    # A smooth gradient keeps the JPEG small on disk while decoding to full size.
+    row = np.linspace(0, 255, width, dtype=np.float32)
+    panorama = np.empty((height, width, 3), dtype=np.uint8)
+    panorama[:] = row[None, :, None].astype(np.uint8)
+    path = os.path.join(workdir, 'panorama.jpg')
+    cv2.imwrite(path, panorama)
+    del panorama
+    for _ in range(repeats):
+        timer.time('decode_uncapped', cv2.imread, path)
+        timer.time('decode_capped', decode_image, path, max_pixels)
+    return {"width": width, "height": height, "max_pixels": max_pixels}
+
+
+def bench_fixture_pipeline(timer, image_dir, limit):
+    """decode/detect/embed on real photos; needs the MTCNN and FaceNet models."""
+    import face_pipeline
+    paths = sorted(
+        os.path.join(dirpath, name)
+        for dirpath, _, names in os.walk(image_dir)
+        for name in names if name.lower().endswith(SUPPORTED_EXTENSIONS)
+    )[:limit]
+    cache = {}
+    for path in paths:
+        img_array, _ = timer.time('decode', decode_image, path)
+        if img_array is None:
+            continue
+        faces, positions = timer.time('detect', face_pipeline.extract_faces, img_array, inplace=True)
+        face_data = []
+        for face, position in zip(faces, positions):
+            features = timer.time('embed', face_pipeline.extract_features, face)
+            face_data.append({'embedding': features.tolist(), 'position': position})
+        if face_data:
+            cache[path] = {'hash': face_pipeline.get_file_hash(path), 'faces': face_data}
+    return {"photos": len(paths), "photos_with_faces": len(cache),
+            "faces": sum(len(entry['faces']) for entry in cache.values())}
+
+
+def bench_album(n_faces, args, rng, workdir):
+    timer = StageTimer(trace_memory=args.trace_memory)
+    username = f"bench_{n_faces}"
+    files, vectors, boxes, identities = synthetic_album(n_faces, rng, spectrum_decay=args.spectrum_decay)
+
+    store = EmbeddingStore(os.path.join(workdir, 'cache'))
+    timer.time('persist', store.write_arrays, username, files, vectors, boxes, items=n_faces)
+
+    if n_faces <= args.mongo_max_faces:
+        # Same document shape and per-file insert pattern as save_cache/load_cache.
+        collection = LocalCollection()
+        docs_by_file = {}
+        for row in range(n_faces):
+            file_idx = int(boxes[row, 0])
+            docs_by_file.setdefault(file_idx, []).append(
+                {'embedding': vectors[row].tolist(), 'position': boxes[row, 1:5].tolist()})
+
+        def persist_mongo():
+            for file_idx, faces in docs_by_file.items():
+                collection.insert_one({"username": username, "filepath": files[file_idx][0],
+                                       "hash": files[file_idx][1], "faces": faces,
+                                       "last_updated": datetime.utcnow()})
+
+        def load_mongo():
+            return {doc['filepath']: {'hash': doc['hash'], 'faces': doc['faces']}
+                    for doc in collection.find({"username": username})}
+
+        timer.time('persist_mongo', persist_mongo, items=n_faces, trace=False)
+        timer.time('load_mongo', load_mongo, items=n_faces, trace=False)
+        del docs_by_file, collection
+    projection = None
+    if args.pca_dims:
+        sample = vectors[rng.choice(n_faces, size=min(n_faces, args.pca_sample), replace=False)]
+        projection = timer.time('pca_fit', PCAProjection.fit, sample, args.pca_dims)
+    del vectors
+
+    # Cold open: a fresh store object has no mapped views yet.
+    view = timer.time('load', EmbeddingStore(store.root).open, username, items=n_faces)
+    view = store.open(username)
+
+    queries = normalize(identities[rng.integers(0, len(identities), args.queries)]
+                        + rng.standard_normal((args.queries, EMBEDDING_DIM), dtype=np.float32) * 0.03)
+    # One synthetic photo on disk stands in for every match when rendering highlights.
+    sample_path = os.path.join(workdir, 'sample.jpg')
+    cv2.imwrite(sample_path, rng.integers(0, 256, (args.image_height, args.image_width, 3), dtype=np.uint8))
+    match_counts = []
+    matcher = None
+    if projection is not None:
+        matcher = TwoStageMatcher(store, projection, margin=args.pca_margin)
+        timer.time('pca_build', matcher.reduced_for, username, view, items=n_faces)
+        pca_report = {"dims": args.pca_dims, "margin": args.pca_margin,
+                      "explained_energy": round(projection.explained_energy(view.vectors[:10000]), 4),
+                      "exact_matches": 0, "found_matches": 0, "candidates": 0}
+    for query in queries:
+        hits = timer.time('match', best_faces_per_file, view, query, args.threshold, items=n_faces)
+        match_counts.append(len(hits))
+        if matcher is not None:
+            two_stage = timer.time('match_two_stage', matcher.best_faces_per_file,
+                                   username, view, query, args.threshold, items=n_faces)
+            # Recall of the two-stage matcher against the exact scan
+            exact_files = {hit[0] for hit in hits}
+            pca_report["exact_matches"] += len(exact_files)
+            pca_report["found_matches"] += len(exact_files & {hit[0] for hit in two_stage})
+            pca_report["candidates"] += int(matcher.candidates(matcher.reduced_for(username, view),
+                                                               query, args.threshold).size)
+        if not hits:
+            continue
+
+        def encode_response():
+            # Same shape as /api/search; highlights are rendered lazily.
+            matches = [{"filename": os.path.basename(view.files[file_idx][0]),
+                        "filepath": view.files[file_idx][0],
+                        "similarity": float((1 - distance) * 100),
+                        "box": view.boxes[row, 1:5].tolist()}
+                       for file_idx, distance, row in hits]
+            return json.dumps({"match_found": True, "matches": matches})
+
+        timer.time('encode_response', encode_response, items=len(hits))
+        # What the first screen of results costs through /api/highlight (uncached).
+        for file_idx, distance, row in hits[:args.render_limit]:
+            box = tuple(int(v) for v in view.boxes[row, 1:5])
+            timer.time('render_highlight', render_highlight, sample_path, box, max_side=RENDITIONS['thumb'])
+
+    result = {
+        "faces": n_faces,
+        "photos": len(files),
+        "queries": args.queries,
+        "mean_matches_per_query": round(float(np.mean(match_counts)), 2) if match_counts else 0,
+        "stages": timer.report(),
+    }
+    if matcher is not None:
+        exact = pca_report.pop("exact_matches")
+        found = pca_report.pop("found_matches")
+        pca_report["recall"] = round(found / exact, 6) if exact else 1.0
+        pca_report["mean_candidates_per_query"] = round(pca_report.pop("candidates") / args.queries, 1)
+        result["pca"] = pca_report
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the face search pipeline.")
+    parser.add_argument('--faces', type=int, nargs='+', default=[1000, 10000, 100000],
+                        help="Synthetic album sizes in faces (1k-1M)")
+    parser.add_argument('--queries', type=int, default=50, help="Searches per album size")
+    parser.add_argument('--threshold', type=float, default=0.5, help="Cosine distance threshold, as /api/search")
+    parser.add_argument('--render-limit', type=int, default=20, help="Highlights rendered per search")
+    parser.add_argument('--image-width', type=int, default=1600)
+    parser.add_argument('--image-height', type=int, default=1200)
+    parser.add_argument('--mongo-max-faces', type=int, default=100000,
+                        help="Skip the Mongo stand-in stages above this album size")
+    parser.add_argument('--spectrum-decay', type=float, default=0.0,
+                        help="Power-law decay of the synthetic embedding spectrum (0 = isotropic)")
+    parser.add_argument('--pca-dims', type=int, default=0,
+                        help="Also run the two-stage PCA matcher with this many dims and report its recall")
+    parser.add_argument('--pca-margin', type=float, default=1.0)
+    parser.add_argument('--pca-sample', type=int, default=200000)
+    parser.add_argument('--images', help="Fixture photo directory for decode/detect/embed stages")
+    parser.add_argument('--image-limit', type=int, default=200)
+    parser.add_argument('--panorama-megapixels', type=float, default=0,
+                        help="Also compare capped and uncapped decoding of a panorama this large")
+    parser.add_argument('--max-decode-pixels', type=int, default=24_000_000)
+    parser.add_argument('--no-trace-memory', dest='trace_memory', action='store_false',
+                        help="Skip per-request allocation tracing")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="Write JSON here instead of stdout")
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(args.seed)
+    workdir = tempfile.mkdtemp(prefix='bench_face_')
+    report = {
+        "benchmark": "face_pipeline",
+        "timestamp": datetime.utcnow().isoformat(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "albums": [],
+    }
+    try:
+        if args.panorama_megapixels:
+            timer = StageTimer(trace_memory=args.trace_memory)
+            summary = bench_large_decode(timer, workdir, args.panorama_megapixels, args.max_decode_pixels)
+            report["large_decode"] = dict(summary, stages=timer.report())
+        if args.images:
+            timer = StageTimer(trace_memory=args.trace_memory)
+            summary = bench_fixture_pipeline(timer, args.images, args.image_limit)
+            report["fixture"] = dict(summary, stages=timer.report())
+        for n_faces in args.faces:
+            report["albums"].append(bench_album(n_faces, args, rng, workdir))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    report["peak_rss_mb"] = peak_rss_mb()
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,177 @@
+"""Offline bulk indexer for existing photo archives.
+
+Scans a directory tree, registers every photo and video for a user and runs the
+detection/embedding pipeline in a process pool, outside the web server.
+Progress is checkpointed so an interrupted run resumes where it stopped.
+
+    python bulk_index.py --user alice /mnt/archive --workers 8
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import multiprocessing
+from datetime import datetime
+from pymongo import MongoClient
+from embedding_store import EmbeddingStore
+from photo_metadata import extract_photo_metadata
+from video_ingest import VIDEO_EXTENSIONS, is_video, extract_video_metadata
+
+# Same as face_pipeline.SUPPORTED_EXTENSIONS; the parent process never imports
+# face_pipeline so that the models are only loaded inside the pool workers.
+SUPPORTED_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+
+def scan_photos(root):
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if filename.lower().endswith(SUPPORTED_EXTENSIONS + VIDEO_EXTENSIONS):
+                yield os.path.abspath(os.path.join(dirpath, filename))
+
+
+def default_checkpoint_path(cache_folder, username, root):
+    digest = hashlib.md5(f"{username}:{os.path.abspath(root)}".encode('utf-8')).hexdigest()
+    return os.path.join(cache_folder, f"bulk_index-{digest}.ckpt")
+
+
+def load_checkpoint(path):
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, 'r') as f:
+        for line in f:
+            try:
+                done.add(json.loads(line)['filepath'])
+            except (ValueError, KeyError):
+                # A torn final line from a killed run; that photo is simply redone.
+                continue
+    return done
+
+
+def register_photos(photos_collection, username, root, paths, event=None, batch_size=1000):
+    existing = {photo['filepath'] for photo in photos_collection.find({"username": username}, {"filepath": 1})}
+    batch, registered = [], 0
+    for path in paths:
+        if path in existing:
+            continue
+        batch.append({
+            "username": username,
+            "filename": os.path.basename(path),
+            "filepath": path,
+            "upload_date": datetime.utcnow(),
+            "event": event,
+            # Archive sub-directory, usable as a search filter
+            "folder": os.path.relpath(os.path.dirname(path), os.path.abspath(root)),
+            "media_type": "video" if is_video(path) else "photo",
+            **(extract_video_metadata(path) if is_video(path) else extract_photo_metadata(path))
+        })
+        if len(batch) >= batch_size:
+            photos_collection.insert_many(batch)
+            registered += len(batch)
+            batch = []
+    if batch:
+        photos_collection.insert_many(batch)
+        registered += len(batch)
+    return registered
+
+
+def _init_worker(torch_threads):
+    # Models are loaded once per worker process, not per photo.
+    import torch
+    torch.set_num_threads(torch_threads)
+    import face_pipeline  # noqa: F401
+
+
+def _index_photo(img_path):
+    import face_pipeline
+    from video_ingest import index_video
+    try:
+        file_hash = face_pipeline.get_file_hash(img_path)
+        if is_video(img_path):
+            return img_path, file_hash, index_video(img_path), None
+        return img_path, file_hash, face_pipeline.index_image(img_path), None
+    except Exception as e:
+        return img_path, None, [], str(e)
+
+
+def run(args):
+    client = MongoClient(args.mongo_uri)
+    db = client[args.db]
+    photos_collection = db['photos']
+    embeddings_collection = db['embeddings']
+    store = EmbeddingStore(args.cache_folder)
+
+    checkpoint_path = args.checkpoint or default_checkpoint_path(args.cache_folder, args.user, args.root)
+    done = load_checkpoint(checkpoint_path)
+    paths = list(scan_photos(args.root))
+    registered = register_photos(photos_collection, args.user, args.root, paths, event=args.event)
+    pending = [path for path in paths if path not in done]
+    print(f"Found {len(paths)} photos ({registered} newly registered), "
+          f"{len(paths) - len(pending)} already indexed, {len(pending)} to go.")
+    if not pending:
+        return 0
+
+    ctx = multiprocessing.get_context('spawn')
+    started = time.time()
+    last_report = started
+    photos_done = faces_done = errors = 0
+    with open(checkpoint_path, 'a') as checkpoint, \
+            ctx.Pool(args.workers, initializer=_init_worker, initargs=(args.torch_threads,)) as pool:
+        for img_path, file_hash, face_data, error in pool.imap_unordered(_index_photo, pending, chunksize=args.chunksize):
+            if error:
+                errors += 1
+                print(f"Error processing {img_path}: {error}")
+                continue
+            if face_data:
+                embeddings_collection.replace_one(
+                    {"username": args.user, "filepath": img_path},
+                    {
+                        "username": args.user,
+                        "filepath": img_path,
+                        "hash": file_hash,
+                        "faces": face_data,
+                        "last_updated": datetime.utcnow()
+                    },
+                    upsert=True
+                )
+                store.append(args.user, img_path, file_hash, face_data)
+            # Only checkpoint once the embeddings are durable in Mongo.
+            checkpoint.write(json.dumps({"filepath": img_path, "faces": len(face_data)}) + "\n")
+            checkpoint.flush()
+            photos_done += 1
+            faces_done += len(face_data)
+
+            now = time.time()
+            if now - last_report >= args.report_every:
+                elapsed = now - started
+                print(f"{photos_done}/{len(pending)} photos, {faces_done} faces, "
+                      f"{photos_done / elapsed:.1f} photos/sec, {faces_done / elapsed:.1f} faces/sec")
+                last_report = now
+
+    elapsed = max(time.time() - started, 1e-9)
+    print(f"Indexed {photos_done} photos and {faces_done} faces in {elapsed:.1f}s "
+          f"({photos_done / elapsed:.1f} photos/sec, {faces_done / elapsed:.1f} faces/sec), {errors} errors.")
+    return 1 if errors else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk-index a photo archive for face search.")
+    parser.add_argument('root', help="Directory tree to scan for photos")
+    parser.add_argument('--user', required=True, help="Username that owns the photos")
+    parser.add_argument('--event', help="Event name recorded on every registered photo")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Indexing processes")
+    parser.add_argument('--torch-threads', type=int, default=1, help="Torch intra-op threads per worker")
+    parser.add_argument('--chunksize', type=int, default=8, help="Photos handed to a worker at a time")
+    parser.add_argument('--checkpoint', help="Checkpoint file (default: derived from user and root under the cache folder)")
+    parser.add_argument('--cache-folder', default='cache')
+    parser.add_argument('--mongo-uri', default='mongodb://localhost:27017/')
+    parser.add_argument('--db', default='snapid_db')
+    parser.add_argument('--report-every', type=float, default=10.0, help="Seconds between progress lines")
+    return run(parser.parse_args(argv))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
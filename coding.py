@@ -1,13 +1,105 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-import requests
+import os
 import json
 import re
+import time
+import uuid
+import secrets
+import hmac
+import hashlib
+import functools
+import itertools
+from itsdangerous import URLSafeTimedSerializer, BadSignature
+from judge0_client import Judge0Client, Judge0Error, CircuitOpenError
+from executors import create_executor, PENDING_STATUSES, STATUS_COMPILATION_ERROR, STATUS_TIME_LIMIT
+from metrics import MetricsRegistry, PROMETHEUS_CONTENT_TYPE
+from jobs import JobStore, JobManager, JobQueueFull
+from scheduler import ExecutionScheduler, AdmissionRejected, TokenBuckets
+from bounded_cache import BoundedLRU
+from question_registry import load_questions, compile_template, InvalidInput
+from complexity import generate, fit_complexity, percentile_rank
+from telemetry import ExecutionTelemetry
+import telemetry
 
 app = Flask(__name__)
 CORS(app)
 
-JUDGE0_URL = "https://judge0-ce.p.rapidapi.com/submissions?base64_encoded=false&wait=true"
+# Point at `python fake_judge0.py` (http://127.0.0.1:2358) for local runs
+JUDGE0_BASE_URL = os.environ.get('JUDGE0_BASE_URL', "https://judge0-ce.p.rapidapi.com")
+# 'judge0' or 'local' (sandboxed subprocesses on this host, see executors.py)
+EXECUTOR = os.environ.get('EXECUTOR', 'judge0')
+LOCAL_EXECUTOR_OPTIONS = {
+    'cpu_seconds': 5,
+    'wall_seconds': 10,
+    'memory_mb': 256,
+    'max_processes': 64,  # tasks per program, threads included, enforced by the pids cgroup
+    'pids_cgroup': os.environ.get('LOCAL_PIDS_CGROUP'),  # cgroup directory to run programs under, see pids_cgroup.py
+    # Without a pids cgroup the local executor refuses to start unless this is set (trusted code only)
+    'unlimited_processes': os.environ.get('LOCAL_UNLIMITED_PROCESSES') == '1',
+    'max_output_bytes': 1024 * 1024,
+    'warm_pool_size': int(os.environ.get('LOCAL_WARM_POOL_SIZE', '2')),  # parked runtimes per language
+    'artifact_cache_dir': os.environ.get('LOCAL_ARTIFACT_CACHE_DIR'),  # default: <tmp>/code-artifacts
+}
+
+# Question bank (see question_registry.py): JSON files under QUESTIONS_FOLDER,
+# plus documents in interview_platform.coding_questions when QUESTIONS_MONGO_URI is set
+QUESTIONS_FOLDER = os.environ.get('QUESTIONS_FOLDER', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'questions'))
+QUESTIONS_MONGO_URI = os.environ.get('QUESTIONS_MONGO_URI')
+
+# Test suites stream to the executor in chunks of at most SUITE_CHUNK_CASES
+# cases and SUITE_CHUNK_BYTES of input, SUITE_PARALLEL_CHUNKS at a time.  A
+# chunk may run for its cases' time limits plus start-up, up to
+# MAX_PROGRAM_SECONDS (Judge0's default maximum CPU time limit)
+SUITE_CHUNK_CASES = 50
+SUITE_CHUNK_BYTES = 4 * 1024 * 1024
+SUITE_PARALLEL_CHUNKS = 4
+PROGRAM_STARTUP_SECONDS = 2
+MAX_PROGRAM_SECONDS = 15
+INPUT_PREVIEW_CHARS = 200
+# Complexity grading (/submit with grade_complexity, see complexity.py): each
+# probe size runs as a program of its own.  The reference solution's profile
+# (REFERENCE_REPEATS uncached runs per size) is measured once per process
+REFERENCE_REPEATS = 5
+# Harness markers carry a nonce derived from the program and its input under
+# this secret (see harness_nonce); per process unless set, like the result cache
+HARNESS_NONCE_SECRET = (os.environ.get('HARNESS_NONCE_SECRET') or secrets.token_hex(32)).encode('utf-8')
+
+# Async jobs (/jobs/run, /jobs/submit): persisted under JOBS_FOLDER, run by JOB_WORKERS threads
+JOBS_FOLDER = os.environ.get('JOBS_FOLDER', 'jobs')
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', '8'))
+JOB_MAX_PENDING = 500
+SSE_KEEPALIVE_SECONDS = 15
+# Admission control (see scheduler.py): executions in flight across /run,
+# /submit and jobs, waiting executions before 503s, and each candidate's burst
+# size and sustained executions per second before 429s
+EXECUTION_MAX_CONCURRENT = int(os.environ.get('EXECUTION_MAX_CONCURRENT', '8'))
+EXECUTION_MAX_QUEUE = int(os.environ.get('EXECUTION_MAX_QUEUE', '100'))
+EXECUTION_MAX_WAIT = 30  # seconds a synchronous request may queue
+CANDIDATE_BURST = 10
+CANDIDATE_RATE = 0.5
+# Candidates are told apart by a token this service signs and hands out
+# (POST /session, sent back as X-Candidate-Token), never by anything the
+# client picks.  Requests without a token share their address's bucket.
+# Set CANDIDATE_TOKEN_SECRET when running several processes; the default
+# random secret invalidates tokens on restart
+CANDIDATE_TOKEN_SECRET = os.environ.get('CANDIDATE_TOKEN_SECRET') or secrets.token_hex(32)
+CANDIDATE_TOKEN_MAX_AGE = 12 * 60 * 60  # seconds
+# Tokens issued per address: a whole exam hall behind one NAT at once, then
+# one every 20 seconds, so rotating tokens does not escape the rate limit
+SESSION_ISSUE_BURST = 200
+SESSION_ISSUE_RATE = 0.05
+# Time Limit Exceeded, Internal Error and Exec Format Error depend on the
+# backend's load rather than on the program, so they are never cached
+UNCACHEABLE_STATUSES = (5, 13, 14)
+
+# Results of identical executions (language, wrapped source, stdin) are reused
+RESULT_CACHE_TTL = float(os.environ.get('RESULT_CACHE_TTL', '600'))  # seconds
+RESULT_CACHE_ENTRIES = 4096
+RESULT_CACHE_BYTES = 32 * 1024 * 1024
+
+# Requests taking longer than this are logged with their stage timings (see telemetry.py)
+SLOW_EXECUTION_SECONDS = float(os.environ.get('SLOW_EXECUTION_SECONDS', '10'))
 
 headers = {
     "Content-Type": "application/json",
@@ -22,318 +114,963 @@ language_ids = {
     'cpp': 54,         # C++
     'c': 50            # C
 }
+language_names = {language_id: language for language, language_id in language_ids.items()}
 
-def wrap_code_with_tests(question_id, code, language, test_cases):
-    if question_id == 1:  # Add Two Numbers
-        if language == 'javascript':
-            return f"""
-{code}
-console.log(add({test_cases[0][0]}, {test_cases[0][1]}));
-"""
-        elif language == 'python':
-            return f"""
-{code}
-solution = Solution()
-print(solution.add({test_cases[0][0]}, {test_cases[0][1]}))
-"""
-        elif language == 'java':
-            return f"""
-{code}
-public class Main {{
-    public static void main(String[] args) {{
-        Solution sol = new Solution();
-        System.out.println(sol.add({test_cases[0][0]}, {test_cases[0][1]}));
-    }}
-}}
-"""
-        elif language == 'cpp':
-            return f"""
-{code}
-#include <iostream>
-int main() {{
-    Solution sol;
-    std::cout << sol.add({test_cases[0][0]}, {test_cases[0][1]}) << std::endl;
-    return 0;
-}}
-"""
-        elif language == 'c':
-            return f"""
-{code}
-#include <stdio.h>
-int main() {{
-    printf("%d\\n", add({test_cases[0][0]}, {test_cases[0][1]}));
-    return 0;
-}}
-"""
-    elif question_id == 2:  # Reverse String
-        input_str = test_cases[0][0]
-        if language == 'javascript':
-            return f"""
-{code}
-let s = {json.dumps(list(input_str))};
-reverseString(s);
-console.log(s);
-"""
-        elif language == 'python':
-            return f"""
-{code}
-solution = Solution()
-s = {json.dumps(list(input_str))}
-solution.reverseString(s)
-print(s)
-"""
-        elif language == 'java':
-            return f"""
-{code}
-public class Main {{
-    public static void main(String[] args) {{
-        Solution sol = new Solution();
-        char[] s = {json.dumps(input_str).replace('"', "'")}.toCharArray();
-        sol.reverseString(s);
-        System.out.println(new String(s));
-    }}
-}}
-"""
-        elif language == 'cpp':
-            return f"""
-{code}
-#include <iostream>
-#include <vector>
-int main() {{
-    Solution sol;
-    std::vector<char> s = {json.dumps(list(input_str)).replace('"', "'")};
-    sol.reverseString(s);
-    for(char c : s) std::cout << c;
-    std::cout << std::endl;
-    return 0;
-}}
-"""
-        elif language == 'c':
-            return f"""
-{code}
-#include <stdio.h>
-#include <string.h>
-int main() {{
-    char s[] = {json.dumps(input_str)};
-    reverseString(s, strlen(s));
-    printf("%s\\n", s);
-    return 0;
-}}
-"""
-    elif question_id == 3:  # Two Sum
-        nums, target = test_cases[0]
-        if language == 'javascript':
-            return f"""
-{code}
-console.log(twoSum({json.dumps(nums)}, {target}));
-"""
-        elif language == 'python':
-            return f"""
-{code}
-solution = Solution()
-print(solution.twoSum({json.dumps(nums)}, {target}))
-"""
-        elif language == 'java':
-            return f"""
-{code}
-public class Main {{
-    public static void main(String[] args) {{
-        Solution sol = new Solution();
-        int[] nums = {json.dumps(nums)};
-        int[] result = sol.twoSum(nums, {target});
-        System.out.println("[" + result[0] + "," + result[1] + "]");
-    }}
-}}
-"""
-        elif language == 'cpp':
-            return f"""
-{code}
+questions = load_questions(QUESTIONS_FOLDER, QUESTIONS_MONGO_URI)
+metrics = MetricsRegistry()
+# One pooled, retrying client shared by every request this process serves
+judge0 = Judge0Client(JUDGE0_BASE_URL, headers=headers, registry=metrics)
+executor = create_executor(EXECUTOR, judge0_client=judge0, **(LOCAL_EXECUTOR_OPTIONS if EXECUTOR == 'local' else {}))
+result_cache = BoundedLRU(max_entries=RESULT_CACHE_ENTRIES, max_bytes=RESULT_CACHE_BYTES, ttl=RESULT_CACHE_TTL,
+                          sizeof=lambda result: len(json.dumps(result)))
+result_cache_lookups = metrics.counter('execution_cache_lookups_total', 'Execution result cache lookups.', ['outcome'])
+scheduler = ExecutionScheduler(max_concurrent=EXECUTION_MAX_CONCURRENT, max_queue=EXECUTION_MAX_QUEUE,
+                               max_wait=EXECUTION_MAX_WAIT, bucket_capacity=CANDIDATE_BURST,
+                               bucket_rate=CANDIDATE_RATE, registry=metrics)
+execution_telemetry = ExecutionTelemetry(metrics, slow_seconds=SLOW_EXECUTION_SECONDS, logger=app.logger)
+candidate_tokens = URLSafeTimedSerializer(CANDIDATE_TOKEN_SECRET, salt='candidate-token')
+session_issue_buckets = TokenBuckets(SESSION_ISSUE_BURST, SESSION_ISSUE_RATE)
+
+class InvalidCandidateToken(Exception):
+    pass
+
+def judge0_error_response(e):
+    if isinstance(e, CircuitOpenError):
+        response = jsonify({'error': str(e)})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(int(judge0.breaker.reset_timeout))
+        return response
+    return jsonify({'error': str(e)}), 500
+
+def admission_error_response(e):
+    response = jsonify({'error': str(e)})
+    response.status_code = e.status_code
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response
+
+def candidate_id():
+    # Rate limits are per issued candidate token; fall back to the client address for anonymous callers
+    token = request.headers.get('X-Candidate-Token')
+    if not token:
+        return f"address:{request.remote_addr}"
+    try:
+        return f"candidate:{candidate_tokens.loads(token, max_age=CANDIDATE_TOKEN_MAX_AGE)}"
+    except BadSignature:
+        raise InvalidCandidateToken("Invalid or expired candidate token, request a new one from /session")
+
+def invalid_token_response(e):
+    return jsonify({'error': str(e)}), 401
+
+def json_body():
+    """The request's JSON object, or None if the body is missing, not JSON or not an object."""
+    data = request.get_json(silent=True)
+    return data if isinstance(data, dict) else None
+
+def invalid_body_response():
+    return jsonify({'error': 'Request body must be a JSON object'}), 400
+
+def respond(handler):
+    data = json_body()
+    if data is None:
+        return invalid_body_response()
+    try:
+        scheduler.take_token(candidate_id())
+        body, status = handler(data)
+    except InvalidCandidateToken as e:
+        return invalid_token_response(e)
+    except AdmissionRejected as e:
+        return admission_error_response(e)
+    except Judge0Error as e:
+        return judge0_error_response(e)
+    return jsonify(body), status
+
+def result_cache_key(language_id, source, stdin=None, time_limit=None):
+    digest = hashlib.sha256(source.encode('utf-8'))
+    digest.update(b'\0' + (stdin or '').encode('utf-8'))
+    digest.update(b'\0' + str(time_limit).encode('utf-8'))
+    return (language_id, digest.hexdigest())
+
+def _cacheable(result):
+    return 'error' not in result and (result.get('status') or {}).get('id') not in UNCACHEABLE_STATUSES + PENDING_STATUSES
+
+def execute_program(source, language_id, use_cache=True, stdin=None, time_limit=None):
+    """Executor result of running one program, served from result_cache when possible."""
+    key = result_cache_key(language_id, source, stdin, time_limit)
+    if use_cache:
+        cached = result_cache.get(key)
+        result_cache_lookups.inc(outcome='hit' if cached is not None else 'miss')
+        if cached is not None:
+            telemetry.record(cached, language_names[language_id], cached=True)
+            return cached
+    result = executor.run(source, language_id, stdin=stdin, time_limit=time_limit)
+    telemetry.record(result, language_names[language_id])
+    if _cacheable(result):
+        result_cache.put(key, result)
+    return result
+
+def execute_programs(sources, language_id, use_cache=True, stdins=None, time_limit=None):
+    """executor.run_many through result_cache: only programs not already cached are run."""
+    stdins = stdins or [None] * len(sources)
+    results = [None] * len(sources)
+    keys = [result_cache_key(language_id, source, stdin, time_limit) for source, stdin in zip(sources, stdins)]
+    if use_cache:
+        for i, key in enumerate(keys):
+            results[i] = result_cache.get(key)
+            result_cache_lookups.inc(outcome='hit' if results[i] is not None else 'miss')
+            if results[i] is not None:
+                telemetry.record(results[i], language_names[language_id], cached=True)
+    misses = [i for i, result in enumerate(results) if result is None]
+    if misses:
+        ran = executor.run_many([sources[i] for i in misses], language_id, [stdins[i] for i in misses], time_limit)
+        for i, result in zip(misses, ran):
+            results[i] = result
+            telemetry.record(result, language_names[language_id])
+            if _cacheable(result):
+                result_cache.put(keys[i], result)
+    return results
+
+# Multi-test harness: the candidate's code is compiled together with a driver
+# that reads a nonce and the test cases from stdin (encoded by
+# question_registry) and prints
+#
+#   <<<nonce case i>>>
+#   ...output of case i...
+#   <<<nonce error i>>> message      (only if case i raised)
+#   <<<nonce time i>>> seconds       (spent in case i, not counting reading its input)
+#   <<<nonce end i>>>
+#
+# The program text depends only on the question, the language and the code,
+# so it compiles once however many cases it runs, and suites too large for
+# one process are streamed through it in chunks.  Cases run in order: when
+# the process dies (crash, exit, time limit) the first case without an end
+# marker was running, and the cases after it run again in a fresh process.
+#
+# The candidate's code shares the driver's stdout, so markers it prints
+# itself could end a case early, forge a result or report a fake time.  The
+# nonce (NONCE_WORDS integers) is not in the program text and cannot be
+# guessed, and output with the nonce anywhere the driver did not print it
+# fails every case of the run.  The driver's times still come from inside the
+# candidate's process, so they can only fail a case: time limits are
+# enforced from the executor's time for the whole run (see _charge_run_time).
+NONCE_WORDS = 4
+CASE_BEGIN = "<<<{} case {}>>>"
+CASE_ERROR = "<<<{} error {}>>>"
+CASE_TIME = "<<<{} time {}>>>"
+CASE_END = "<<<{} end {}>>>"
+TAMPERED_ERROR = "Output contains forged test harness markers"
+
+# Per-language drivers, compiled once; the markers above (and NONCE_WORDS)
+# are spelled out in each.  {{declarations}}, {{statements}} and {{releases}} come from the question
+HARNESSES = {language: compile_template(text) for language, text in {
+    'python': """{{code}}
+
+import sys as harness_sys
+import time as harness_time
+harness_ints = map(int, harness_sys.stdin.buffer.read().split())
+
+def harness_int():
+    return next(harness_ints)
+
+def harness_int_array():
+    return [next(harness_ints) for _ in range(next(harness_ints))]
+
+def harness_string():
+    return ''.join(map(chr, harness_int_array()))
+
+harness_nonce = '.'.join(str(harness_int()) for _ in range(4))
+for harness_case in range(harness_int()):
+    print("<<<%s case %d>>>" % (harness_nonce, harness_case), flush=True)
+{{declarations}}
+    harness_started = harness_time.perf_counter()
+    try:
+{{statements}}
+    except Exception as e:
+        print("<<<%s error %d>>>" % (harness_nonce, harness_case), (type(e).__name__ + ": " + str(e)).replace("\\n", " "))
+    print("<<<%s time %d>>> %.6f" % (harness_nonce, harness_case, harness_time.perf_counter() - harness_started))
+    print("<<<%s end %d>>>" % (harness_nonce, harness_case), flush=True)
+""",
+    'javascript': """{{code}}
+
+const harnessTokens = require('fs').readFileSync(0, 'utf8').split(/\\s+/).filter(Boolean);
+let harnessNext = 0;
+function harnessInt() { return parseInt(harnessTokens[harnessNext++], 10); }
+function harnessIntArray() { const values = new Array(harnessInt()); for (let i = 0; i < values.length; i++) values[i] = harnessInt(); return values; }
+function harnessString() { return harnessIntArray().map((code) => String.fromCharCode(code)).join(''); }
+
+const harnessNonce = [harnessInt(), harnessInt(), harnessInt(), harnessInt()].join('.');
+const harnessCount = harnessInt();
+for (let harnessCase = 0; harnessCase < harnessCount; harnessCase++) {
+    console.log("<<<" + harnessNonce + " case " + harnessCase + ">>>");
+{{declarations}}
+    const harnessStarted = process.hrtime.bigint();
+    try {
+{{statements}}
+    } catch (e) {
+        console.log("<<<" + harnessNonce + " error " + harnessCase + ">>> " + String(e).replace(/\\n/g, " "));
+    }
+    console.log("<<<" + harnessNonce + " time " + harnessCase + ">>> " + Number(process.hrtime.bigint() - harnessStarted) / 1e9);
+    console.log("<<<" + harnessNonce + " end " + harnessCase + ">>>");
+}
+""",
+    'java': """{{code}}
+
+public class Main {
+    static final java.io.InputStream harnessIn = new java.io.BufferedInputStream(System.in, 1 << 16);
+
+    static int harnessInt() throws java.io.IOException {
+        int c = harnessIn.read();
+        while (c != '-' && (c < '0' || c > '9')) {
+            if (c == -1) throw new java.io.EOFException();
+            c = harnessIn.read();
+        }
+        boolean negative = c == '-';
+        if (negative) c = harnessIn.read();
+        int value = 0;
+        while (c >= '0' && c <= '9') {
+            value = value * 10 + (c - '0');
+            c = harnessIn.read();
+        }
+        return negative ? -value : value;
+    }
+
+    static int[] harnessIntArray() throws java.io.IOException {
+        int[] values = new int[harnessInt()];
+        for (int i = 0; i < values.length; i++) values[i] = harnessInt();
+        return values;
+    }
+
+    static String harnessString() throws java.io.IOException {
+        StringBuilder s = new StringBuilder();
+        for (int code : harnessIntArray()) s.append((char) code);
+        return s.toString();
+    }
+
+    public static void main(String[] args) throws java.io.IOException {
+        String harnessNonce = harnessInt() + "." + harnessInt() + "." + harnessInt() + "." + harnessInt();
+        int harnessCount = harnessInt();
+        for (int harnessCase = 0; harnessCase < harnessCount; harnessCase++) {
+            System.out.println("<<<" + harnessNonce + " case " + harnessCase + ">>>");
+{{declarations}}
+            long harnessStarted = System.nanoTime();
+            try {
+{{statements}}
+            } catch (Throwable e) {
+                System.out.println("<<<" + harnessNonce + " error " + harnessCase + ">>> " + String.valueOf(e).replace("\\n", " "));
+            }
+            System.out.println("<<<" + harnessNonce + " time " + harnessCase + ">>> " + (System.nanoTime() - harnessStarted) / 1e9);
+            System.out.println("<<<" + harnessNonce + " end " + harnessCase + ">>>");
+            System.out.flush();
+        }
+    }
+}
+""",
+    'cpp': """#include <cstdio>
 #include <iostream>
+#include <string>
 #include <vector>
-int main() {{
-    Solution sol;
-    std::vector<int> nums = {json.dumps(nums)};
-    std::vector<int> result = sol.twoSum(nums, {target});
-    std::cout << "[" << result[0] << "," << result[1] << "]" << std::endl;
+#include <exception>
+#include <chrono>
+{{code}}
+
+static int harnessInt() {
+    int value = 0;
+    return std::scanf("%d", &value) == 1 ? value : 0;
+}
+
+static std::vector<int> harnessIntArray() {
+    std::vector<int> values(harnessInt());
+    for (int& value : values) value = harnessInt();
+    return values;
+}
+
+static std::string harnessString() {
+    std::vector<int> codes = harnessIntArray();
+    return std::string(codes.begin(), codes.end());
+}
+
+int main() {
+    std::string harnessNonce;
+    for (int i = 0; i < 4; i++) harnessNonce += (i ? "." : "") + std::to_string(harnessInt());
+    int harnessCount = harnessInt();
+    for (int harnessCase = 0; harnessCase < harnessCount; harnessCase++) {
+        std::cout << "<<<" << harnessNonce << " case " << harnessCase << ">>>" << std::endl;
+{{declarations}}
+        auto harnessStarted = std::chrono::steady_clock::now();
+        try {
+{{statements}}
+        } catch (const std::exception& e) {
+            std::cout << "<<<" << harnessNonce << " error " << harnessCase << ">>> " << e.what() << std::endl;
+        } catch (...) {
+            std::cout << "<<<" << harnessNonce << " error " << harnessCase << ">>> unknown exception" << std::endl;
+        }
+        std::cout << "<<<" << harnessNonce << " time " << harnessCase << ">>> "
+                  << std::chrono::duration<double>(std::chrono::steady_clock::now() - harnessStarted).count() << std::endl;
+        std::cout << "<<<" << harnessNonce << " end " << harnessCase << ">>>" << std::endl;
+    }
     return 0;
-}}
-"""
-        elif language == 'c':
-            return f"""
-{code}
-#include <stdio.h>
+}
+""",
+    # No exceptions in C: a crashing case is isolated by the re-run
+    'c': """#include <stdio.h>
 #include <stdlib.h>
-int main() {{
-    int nums[] = {json.dumps(nums)};
-    int target = {test_cases[0][1]};
-    int returnSize;
-    int* result = twoSum(nums, {len(nums)}, target, &returnSize);
-    printf("[%d,%d]\\n", result[0], result[1]);
-    free(result);
+#include <string.h>
+#include <time.h>
+{{code}}
+
+static int harness_int(void) {
+    int value = 0;
+    return scanf("%d", &value) == 1 ? value : 0;
+}
+
+static int* harness_int_array(int* length) {
+    *length = harness_int();
+    int* values = malloc(sizeof(int) * (*length > 0 ? *length : 1));
+    for (int i = 0; i < *length; i++) values[i] = harness_int();
+    return values;
+}
+
+static char* harness_string(void) {
+    int length = harness_int();
+    char* s = malloc(length + 1);
+    for (int i = 0; i < length; i++) s[i] = (char) harness_int();
+    s[length] = '\\0';
+    return s;
+}
+
+static double harness_now(void) {
+    struct timespec now;
+    clock_gettime(CLOCK_MONOTONIC, &now);
+    return now.tv_sec + now.tv_nsec / 1e9;
+}
+
+int main(void) {
+    char harness_nonce[48];
+    int harness_nonce_length = 0;
+    for (int i = 0; i < 4; i++) {
+        harness_nonce_length += sprintf(harness_nonce + harness_nonce_length, i ? ".%d" : "%d", harness_int());
+    }
+    int harness_count = harness_int();
+    for (int harness_case = 0; harness_case < harness_count; harness_case++) {
+        printf("<<<%s case %d>>>\\n", harness_nonce, harness_case);
+        fflush(stdout);
+{{declarations}}
+        double harness_started = harness_now();
+        {
+{{statements}}
+        }
+        printf("<<<%s time %d>>> %.6f\\n", harness_nonce, harness_case, harness_now() - harness_started);
+{{releases}}
+        printf("<<<%s end %d>>>\\n", harness_nonce, harness_case);
+        fflush(stdout);
+    }
     return 0;
-}}
-"""
-    return code
+}
+""",
+}.items()}
+# Indentation of (declarations and releases, statements) in each driver
+HARNESS_INDENT = {
+    'python': ('    ', '        '),
+    'javascript': ('    ', '        '),
+    'java': ('            ', '                '),
+    'cpp': ('        ', '            '),
+    'c': ('        ', '            '),
+}
+CODE_SLOT = '\0'
 
-@app.route('/run', methods=['POST'])
-def run_code():
-    data = request.get_json()
+def _indent(statements, prefix):
+    return '\n'.join(prefix + line for line in statements.splitlines())
+
+@functools.lru_cache(maxsize=None)
+def harness_template(question, language):
+    """(text before, text after) the candidate's code in question's driver for language."""
+    declarations_prefix, statements_prefix = HARNESS_INDENT[language]
+    harness = HARNESSES[language].render({
+        'code': CODE_SLOT,
+        'declarations': _indent(question.declarations(language), declarations_prefix),
+        'statements': _indent(question.templates[language], statements_prefix),
+        'releases': _indent(question.releases(language), declarations_prefix),
+    })
+    before, after = harness.split(CODE_SLOT, 1)
+    return before, after
+
+def wrap_code_with_tests(question_id, code, language):
+    """The program running code on every test case it is given on stdin."""
+    question = questions.get(question_id)
+    if question is None or not question.supports(language):
+        return code
+    with telemetry.stage('harness'):
+        before, after = harness_template(question, language)
+        return before + code + after
+
+def harness_nonce(source, encoded_cases):
+    """The marker nonce for running source on encoded_cases, as the driver prints it.
+
+    Keyed on HARNESS_NONCE_SECRET, so candidates cannot compute it, but the
+    same for the same program and cases, so results stay cacheable.
+    """
+    message = source.encode('utf-8') + b'\0' + f"{len(encoded_cases)}\n".encode('utf-8')
+    message += ''.join(encoded_cases).encode('utf-8')
+    digest = hmac.new(HARNESS_NONCE_SECRET, message, hashlib.sha256).digest()
+    # Non-negative 32-bit ints, which every driver reads like any other input
+    words = [int.from_bytes(digest[i:i + 4], 'big') & 0x7fffffff for i in range(0, 4 * NONCE_WORDS, 4)]
+    return '.'.join(map(str, words))
+
+def harness_input(source, encoded_cases):
+    """Driver stdin for running source on cases already encoded by Question.encode."""
+    nonce = harness_nonce(source, encoded_cases).replace('.', ' ')
+    return f"{nonce}\n{len(encoded_cases)}\n" + ''.join(encoded_cases)
+
+def _program_time_limit(question, count):
+    return min(MAX_PROGRAM_SECONDS, PROGRAM_STARTUP_SECONDS + question.time_limit * count)
+
+def parse_case_outputs(stdout, count, nonce):
+    """Per-case (output, error, seconds) from harness stdout; None for cases that never finished.
+
+    If the nonce appears anywhere the driver does not print it, every case
+    fails with TAMPERED_ERROR.
+    """
+    stdout = stdout or ''
+    cases = [None] * count
+    tampered = [('', TAMPERED_ERROR, None)] * count
+    pattern = re.compile(r"<<<%s case (\d+)>>>\n?(.*?)<<<%s end \1>>>" % (re.escape(nonce), re.escape(nonce)), re.DOTALL)
+    markers, end = 0, 0
+    for expected, match in enumerate(pattern.finditer(stdout)):
+        i = int(match.group(1))
+        if i != expected or i >= count:
+            return tampered
+        lines = match.group(2).splitlines()
+        error, seconds = None, None
+        error_prefix, time_prefix = CASE_ERROR.format(nonce, i), CASE_TIME.format(nonce, i)
+        # The driver's own lines close the case: an optional error, then the time
+        if not lines or not lines[-1].startswith(time_prefix):
+            return tampered
+        try:
+            seconds = float(lines.pop()[len(time_prefix):])
+        except ValueError:
+            return tampered
+        if lines and lines[-1].startswith(error_prefix):
+            error = lines.pop()[len(error_prefix):].strip()
+            markers += 1
+        markers += 3
+        cases[i] = ('\n'.join(lines).strip(), error, seconds)
+        end = match.end()
+    # At most the begin marker of the case the process died in may follow
+    if CASE_BEGIN.format(nonce, sum(case is not None for case in cases)) in stdout[end:]:
+        markers += 1
+    if stdout.count(nonce) != markers:
+        return tampered
+    return cases
+
+def _whole_run_result(result):
+    """(output, error) for a case from a run that did not print its case markers."""
+    stdout = result.get('stdout') or ''
+    stderr = result.get('stderr') or ''
+    compile_output = result.get('compile_output') or ''
+    # e.g. "Time Limit Exceeded", which leaves stdout and stderr empty
+    status = result.get('status') or {}
+    status_error = status.get('description') if status.get('id', 3) > 3 else None
+    output = stdout.strip() if stdout else (compile_output or stderr or "No Output")
+    return output, stderr or compile_output or status_error
+
+def _crashed_case(result, index, nonce):
+    """(output, error, None) for case index, which was running when its process died."""
+    stdout = result.get('stdout') or ''
+    marker = CASE_BEGIN.format(nonce, index)
+    output = stdout.split(marker, 1)[1].strip() if marker in stdout else ''
+    status = result.get('status') or {}
+    status_error = status.get('description') if status.get('id', 3) > 3 else None
+    if status.get('id') == STATUS_TIME_LIMIT:
+        error = status_error
+    else:
+        error = result.get('stderr') or status_error or "Exited before the test case finished"
+    return output or "No Output", error, None
+
+def _within_time_limit(case, time_limit):
+    output, error, seconds = case
+    if error is None and seconds is not None and seconds > time_limit:
+        error = f"Time Limit Exceeded ({seconds * 1000:.0f} ms, limit {time_limit * 1000:.0f} ms)"
+    return output, error, seconds
+
+def _charge_run_time(run_cases, result, time_limit):
+    """Fail the slowest-reported passing case if the executor timed the run over its cases' limits.
+
+    run_cases are the (output, error, seconds) of the cases the process ran;
+    the driver's own times may be forged low, but the executor's may not.
+    """
+    run_seconds = _executor_seconds(result)
+    if run_seconds is None or run_seconds <= PROGRAM_STARTUP_SECONDS + time_limit * len(run_cases):
+        return run_cases
+    passing = [i for i, (_, error, _) in enumerate(run_cases) if error is None]
+    if len(passing) < len(run_cases) or not passing:
+        # A failed case already fails the run
+        return run_cases
+    slowest = max(passing, key=lambda i: run_cases[i][2] or 0.0)
+    output, _, seconds = run_cases[slowest]
+    error = (f"Time Limit Exceeded ({run_seconds * 1000:.0f} ms for {len(run_cases)} test cases, "
+             f"limit {time_limit * 1000:.0f} ms each)")
+    return run_cases[:slowest] + [(output, error, seconds)] + run_cases[slowest + 1:]
+
+def _collect_cases(question, source, language_id, cases, result, use_cache=True):
+    """(output, error, seconds) per encoded case, given the result of running them all.
+
+    Cases the process did not finish run again in a fresh process, starting
+    after the one it died in.
+    """
+    collected = []
+    while True:
+        if 'error' in result:
+            return collected + [("No Output", result['error'], None)] * len(cases)
+        status = result.get('status') or {}
+        if status.get('id') == STATUS_COMPILATION_ERROR:
+            output, error = _whole_run_result(result)
+            return collected + [(output, error, None)] * len(cases)
+        nonce = harness_nonce(source, cases)
+        if CASE_BEGIN.format(nonce, 0) not in (result.get('stdout') or ''):
+            # Died before starting a case (e.g. a SyntaxError, which interpreted
+            # languages report as a runtime error): every case would fail alike
+            output, error = _whole_run_result(result)
+            return collected + [(output, error, None)] * len(cases)
+        with telemetry.stage('compare'):
+            parsed = parse_case_outputs(result.get('stdout'), len(cases), nonce)
+            finished = 0
+            while finished < len(cases) and parsed[finished] is not None:
+                finished += 1
+            run_cases = [_within_time_limit(case, question.time_limit) for case in parsed[:finished]]
+        if finished == len(cases):
+            return collected + _charge_run_time(run_cases, result, question.time_limit)
+        if finished and status.get('id') == STATUS_TIME_LIMIT:
+            # The cases before it may have used up the process's time: give it a process of its own
+            collected.extend(run_cases)
+            cases = cases[finished:]
+        else:
+            run_cases.append(_crashed_case(result, finished, nonce))
+            collected.extend(_charge_run_time(run_cases, result, question.time_limit))
+            cases = cases[finished + 1:]
+        if not cases:
+            return collected
+        result = execute_program(source, language_id, use_cache, stdin=harness_input(source, cases),
+                                 time_limit=_program_time_limit(question, len(cases)))
+
+def execute_test_cases(question_id, code, language, test_cases, use_cache=True):
+    """Run all test cases in one execution; returns an (output, error, seconds) triple per case."""
+    question = questions.get(question_id)
+    language_id = language_ids[language]
+    source = wrap_code_with_tests(question_id, code, language)
+    with telemetry.stage('harness'):
+        cases = [question.encode(args) for args in test_cases]
+    result = execute_program(source, language_id, use_cache, stdin=harness_input(source, cases),
+                             time_limit=_program_time_limit(question, len(cases)))
+    return _collect_cases(question, source, language_id, cases, result, use_cache)
+
+def _chunks(question, tests):
+    """Lists of (args, expected, encoded) bounded by SUITE_CHUNK_CASES and SUITE_CHUNK_BYTES."""
+    chunk, size = [], 0
+    for args, expected in tests:
+        encoded = question.encode(args)
+        if chunk and (len(chunk) >= SUITE_CHUNK_CASES or size + len(encoded) > SUITE_CHUNK_BYTES):
+            yield chunk
+            chunk, size = [], 0
+        chunk.append((args, expected, encoded))
+        size += len(encoded)
+    if chunk:
+        yield chunk
+
+def run_suite(question, code, language, tests, use_cache=True, fail_fast=False):
+    """Yield (args, expected, output, error, seconds, passed) per test, streaming tests in chunks.
+
+    SUITE_PARALLEL_CHUNKS chunks run at a time, so only that many are ever in
+    memory.  fail_fast runs one chunk at a time and stops at the first failing
+    test; a compilation error also stops after the first chunk.
+    """
+    language_id = language_ids[language]
+    source = wrap_code_with_tests(question.id, code, language)
+    chunks = _chunks(question, tests)
+    while True:
+        with telemetry.stage('harness'):
+            window = list(itertools.islice(chunks, 1 if fail_fast else SUITE_PARALLEL_CHUNKS))
+            encoded = [[case for _, _, case in chunk] for chunk in window]
+        if not window:
+            return
+        results = execute_programs([source] * len(window), language_id, use_cache,
+                                   stdins=[harness_input(source, cases) for cases in encoded],
+                                   time_limit=_program_time_limit(question, max(len(cases) for cases in encoded)))
+        for chunk, cases, result in zip(window, encoded, results):
+            collected = _collect_cases(question, source, language_id, cases, result, use_cache)
+            for (args, expected, _), (output, error, seconds) in zip(chunk, collected):
+                with telemetry.stage('compare'):
+                    passed = error is None and outputs_match(output, expected)
+                yield args, expected, output, error, seconds, passed
+                if fail_fast and not passed:
+                    return
+            if (result.get('status') or {}).get('id') == STATUS_COMPILATION_ERROR:
+                return
+
+def outputs_match(output, expected):
+    # Whitespace-insensitive, so "[0, 1]" (Python) and "[0,1]" (Java, C) compare equal
+    return ''.join(str(output).split()) == ''.join(str(expected).split())
+
+def find_question(data):
+    """(question, None) for a request's question_id and language, or (None, (error body, status))."""
     code = data.get('code')
     language = data.get('language')
     question_id = data.get('question_id')
-    test_case = data.get('test_case')
 
     if not all([code, language, question_id]):
-        return jsonify({'error': 'Missing required parameters'}), 400
+        return None, ({'error': 'Missing required parameters'}, 400)
+    question = questions.get(question_id)
+    if question is None:
+        return None, ({'error': 'Invalid question ID'}, 400)
+    if language not in language_ids or not question.supports(language):
+        return None, ({'error': f"Unsupported language '{language}'"}, 400)
+    return question, None
 
-    try:
-        if question_id == 1:  # Add Two Numbers
-            # Handle test case format like "a = 0, b = undefined" or "0 undefined"
-            if test_case:
-                # Normalize input: remove "a =", "b =", and commas
-                cleaned_test_case = re.sub(r'a\s*=\s*', '', test_case)
-                cleaned_test_case = re.sub(r'b\s*=\s*', '', cleaned_test_case)
-                cleaned_test_case = cleaned_test_case.replace(',', ' ').strip()
-                inputs = cleaned_test_case.split()
-                if len(inputs) != 2:
-                    return jsonify({'error': 'Invalid test case: Expected two integers'}), 400
-                if any(x.lower() in ['undefined', 'null', 'nan'] for x in inputs):
-                    return jsonify({'error': 'Invalid test case: Inputs must be integers, not undefined/null/NaN'}), 400
-                inputs = [int(x) for x in inputs]
-            else:
-                inputs = [2, 3]
-            test_cases = [(inputs[0], inputs[1])]
-            expected = inputs[0] + inputs[1]
-        elif question_id == 2:  # Reverse String
-            input_str = test_case or "hello"
-            if not input_str.isascii():
-                return jsonify({'error': 'Invalid test case: Input must be printable ASCII characters'}), 400
-            test_cases = [(input_str,)]
-            expected = input_str[::-1]
-        elif question_id == 3:  # Two Sum
-            if test_case:
-                parts = test_case.split(', target = ')
-                if len(parts) != 2:
-                    return jsonify({'error': 'Invalid test case: Expected format "nums = [..], target = .."'}), 400
-                nums_str = parts[0].replace('nums = ', '').strip()
-                nums = json.loads(nums_str)
-                target = int(parts[1])
-            else:
-                nums = [2, 7, 11, 15]
-                target = 9
-            test_cases = [(nums, target)]
-            expected = [0, 1]  # Default for demo
-        else:
-            return jsonify({'error': 'Invalid question ID'}), 400
-    except ValueError as e:
-        return jsonify({'error': f'Invalid test case format: Inputs must be valid integers'}), 400
-    except json.JSONDecodeError as e:
-        return jsonify({'error': f'Invalid test case format: Invalid JSON for nums array'}), 400
-    except Exception as e:
-        return jsonify({'error': f'Invalid test case format: {str(e)}'}), 400
+def reference_output(question, args):
+    """Expected output for a custom test case: the question's reference solution run on it."""
+    reference = question.reference
+    if reference is None:
+        raise InvalidInput("This question does not accept custom test cases")
+    # Reference results never change, so these are always served from cache when possible
+    output, error, _ = execute_test_cases(question.id, reference['code'], reference['language'], [args])[0]
+    if error is not None:
+        raise InvalidInput(f"Reference solution failed on this input: {error}")
+    return output
 
-    wrapped_code = wrap_code_with_tests(question_id, code, language, test_cases)
+@functools.lru_cache(maxsize=16)
+def complexity_case(question, size):
+    """question's generated complexity input of size, encoded."""
+    return question.encode(generate(question.complexity['generator'], size))
 
-    try:
-        response = requests.post(JUDGE0_URL, json={
-            'source_code': wrapped_code,
-            'language_id': language_ids[language],
-        }, headers=headers)
+def _probe(question, source, language_id, size, use_cache=True):
+    """((output, error, seconds), executor result) of source on the size input."""
+    time_limit = question.complexity['time_limit']
+    with telemetry.stage('harness'):
+        stdin = harness_input(source, [complexity_case(question, size)])
+    result = execute_program(source, language_id, use_cache, stdin=stdin,
+                             time_limit=min(MAX_PROGRAM_SECONDS, PROGRAM_STARTUP_SECONDS + time_limit))
+    if 'error' in result:
+        return ("No Output", result['error'], None), result
+    if (result.get('status') or {}).get('id') == STATUS_COMPILATION_ERROR:
+        output, error = _whole_run_result(result)
+        return (output, error, None), result
+    nonce = harness_nonce(source, [complexity_case(question, size)])
+    case = parse_case_outputs(result.get('stdout'), 1, nonce)[0]
+    if case is None:
+        return _crashed_case(result, 0, nonce), result
+    return _charge_run_time([_within_time_limit(case, time_limit)], result, time_limit)[0], result
+
+reference_profiles = {}
+
+def reference_profile(question, language):
+    """{size: (output, sorted executor seconds of REFERENCE_REPEATS runs)} of the reference language is compared with.
+
+    Stops at the first size the reference itself cannot handle.  Profiles cut
+    short by the executor rather than by the reference are not kept.
+    """
+    key = (question.id, language)
+    if key in reference_profiles:
+        return reference_profiles[key]
+    reference = question.complexity_reference(language)
+    source = wrap_code_with_tests(question.id, reference['code'], reference['language'])
+    profile, complete = {}, True
+    for size in question.complexity['sizes']:
+        runs = [_probe(question, source, language_ids[reference['language']], size, use_cache=False)
+                for _ in range(REFERENCE_REPEATS)]
+        if any('error' in result or _executor_seconds(result) is None for _, result in runs):
+            complete = False
+            break
+        if any(error is not None for (_, error, _), _ in runs):
+            break
+        profile[size] = (runs[0][0][0], sorted(_executor_seconds(result) for _, result in runs))
+    if complete:
+        reference_profiles[key] = profile
+    return profile
 
-        if response.status_code != 200:
-            return jsonify({'error': f'Judge0 API error: {response.text}'}), 500
+def _executor_seconds(result):
+    return float(result['time']) if result.get('time') is not None else None
 
-        result = response.json()
-        stdout = result.get('stdout', '')
-        stderr = result.get('stderr', '')
-        compile_output = result.get('compile_output', '')
+def grade_complexity(question, code, language, use_cache=True):
+    """Estimated complexity class of code and its runtime percentile against the reference solution.
 
-        output = stdout.strip() if stdout else (compile_output or stderr or "No Output")
-        passed = str(output).strip() == str(expected).strip()
+    code runs on question's complexity inputs, smallest first, until one fails
+    (time limit, crash or an answer differing from the reference's).  Grading
+    uses the executor's time for each run: the harness's own timing runs in
+    the candidate's process, where the candidate's code can tamper with it.
+    """
+    if question.complexity is None:
+        return {'error': 'This question does not support complexity grading'}
+    reference = question.complexity_reference(language)
+    if reference is None:
+        return {'error': 'This question has no reference solution to grade complexity against'}
+    profile = reference_profile(question, language)
+    source = wrap_code_with_tests(question.id, code, language)
+    measurements, failed = [], None
+    for size in question.complexity['sizes']:
+        (output, error, seconds), result = _probe(question, source, language_ids[language], size, use_cache)
+        if error is None and size in profile and not outputs_match(output, profile[size][0]):
+            error = "Wrong Answer"
+        if error is not None:
+            failed = {'size': size, 'error': error}
+            break
+        measurements.append({
+            'size': size,
+            'seconds': seconds,
+            'executor_seconds': _executor_seconds(result),
+            'memory_kb': result.get('memory'),
+        })
+
+    sizes = [measurement['size'] for measurement in measurements]
+    seconds = [measurement['executor_seconds'] for measurement in measurements]
+    estimated_class, exponent = fit_complexity(sizes, seconds) if None not in seconds else (None, None)
+    memory = [measurement['memory_kb'] for measurement in measurements]
+    memory_class = fit_complexity(sizes, memory)[0] if None not in memory else None
+    reference_sizes = sorted(profile)
+    # The fastest of the reference's runs: the least disturbed by other load
+    reference_class, reference_exponent = fit_complexity(
+        reference_sizes, [profile[size][1][0] for size in reference_sizes])
+
+    # Compared at the largest size both handled, or where the candidate gave up and the reference did not
+    percentile = relative_runtime = compared_at = None
+    if failed is not None and failed['size'] in profile:
+        compared_at, percentile = failed['size'], 0.0
+    else:
+        common = [measurement for measurement in measurements
+                  if measurement['size'] in profile and measurement['executor_seconds'] is not None]
+        if common:
+            compared_at = common[-1]['size']
+            samples = profile[compared_at][1]
+            percentile = percentile_rank(samples, common[-1]['executor_seconds'])
+            median = samples[len(samples) // 2]
+            relative_runtime = round(common[-1]['executor_seconds'] / median, 3) if median else None
+
+    return {
+        'estimated_class': estimated_class,
+        'exponent': round(exponent, 2) if exponent is not None else None,
+        'estimated_memory_class': memory_class,
+        'measurements': measurements,
+        'failed': failed,
+        'reference': {
+            'language': reference['language'],
+            'estimated_class': reference_class,
+            'exponent': round(reference_exponent, 2) if reference_exponent is not None else None,
+        },
+        'compared_at': compared_at,
+        'percentile': percentile,
+        'relative_runtime': relative_runtime,
+    }
+
+def run_request(data, emit=None, admitted=False):
+    """Body and status of a /run request; emit(event) receives the case result as it is known.
+
+    See submit_request for admitted.
+    """
+    question, failure = find_question(data)
+    if failure:
+        return failure
+    test_case = data.get('test_case')
+    try:
+        args = question.parse_input(test_case) if test_case else question.example[0]
+    except InvalidInput as e:
+        return {'error': f'Invalid test case: {str(e)}'}, 400
 
-        return jsonify({
+    try:
+        with execution_telemetry.trace('run', data['language'], question.id) as trace:
+            with scheduler.slot('run', bounded=not admitted):
+                trace.add('admission', time.perf_counter() - trace.started)
+                expected = reference_output(question, args) if test_case else question.example[1]
+                output, error, _ = execute_test_cases(question.id, data['code'], data['language'], [args],
+                                                      use_cache=not data.get('bypass_cache'))[0]
+            with telemetry.stage('compare'):
+                passed = error is None and outputs_match(output, expected)
+        if emit is not None:
+            emit({'type': 'case', 'test_case': 'Test Case 1', 'output': output, 'passed': passed, 'error': error})
+
+        return {
             'output': f"Test Case:\nInput: {test_case or 'default'}\nOutput: {output}",
             'passed': passed,
-            'error': stderr or compile_output
-        })
+            'error': error,
+            'timings': trace.as_dict(),
+        }, 200
+    except InvalidInput as e:
+        return {'error': f'Invalid test case: {str(e)}'}, 400
+    except (Judge0Error, AdmissionRejected):
+        # The caller maps these to a response (503 while the circuit is open or the queue is full)
+        raise
     except Exception as e:
-        return jsonify({'error': f'Error executing code: {str(e)}'}), 500
+        return {'error': f'Error executing code: {str(e)}'}, 500
 
-@app.route('/submit', methods=['POST'])
-def submit_code():
-    data = request.get_json()
-    code = data.get('code')
-    language = data.get('language')
-    question_id = data.get('question_id')
+def _preview(text, limit=INPUT_PREVIEW_CHARS):
+    return text if len(text) <= limit else text[:limit] + '...'
 
-    if not all([code, language, question_id]):
-        return jsonify({'error': 'Missing required parameters'}), 400
+def submit_request(data, emit=None, admitted=False):
+    """Body and status of a /submit request; emit(event) receives each case result as it is known.
 
-    test_cases = []
-    expected_outputs = []
-    if question_id == 1:  # Add Two Numbers
-        test_cases = [(2, 3), (-1, 1)]
-        expected_outputs = [5, 0]
-    elif question_id == 2:  # Reverse String
-        test_cases = [("hello",), ("Hannah",)]
-        expected_outputs = ["olleh", "hannaH"]
-    elif question_id == 3:  # Two Sum
-        test_cases = [([2,7,11,15], 9), ([3,2,4], 6)]
-        expected_outputs = [[0,1], [1,2]]
-    else:
-        return jsonify({'error': 'Invalid question ID'}), 400
+    admitted requests (async jobs) wait for an execution slot however long the
+    queue is; others raise AdmissionRejected when it is full.  With fail_fast
+    set, the run stops at the first failing test and the rest count as skipped.
+    With grade_complexity set, a submission passing every test is also graded
+    for complexity (see grade_complexity).
+    """
+    question, failure = find_question(data)
+    if failure:
+        return failure
 
     results = []
     passed_count = 0
+    complexity = None
+
+    # The question's tests and suite, streamed through one compiled program; see run_suite
+    try:
+        with execution_telemetry.trace('submit', data['language'], question.id) as trace:
+            with scheduler.slot('submit', bounded=not admitted):
+                trace.add('admission', time.perf_counter() - trace.started)
+                suite = run_suite(question, data['code'], data['language'], question.iter_tests(),
+                                  use_cache=not data.get('bypass_cache'), fail_fast=bool(data.get('fail_fast')))
+                for i, (args, expected, output, error, seconds, passed) in enumerate(suite):
+                    if passed:
+                        passed_count += 1
+                    result = {
+                        'test_case': f"Test Case {i+1}",
+                        'passed': passed,
+                        'error': error,
+                        'time_ms': round(seconds * 1000, 3) if seconds is not None else None,
+                    }
+                    # Only the question's visible tests show their data; suite cases are hidden tests
+                    if i < len(question.tests):
+                        result.update(input=_preview(str(args)), output=_preview(output), expected=_preview(expected))
+                    else:
+                        result['hidden'] = True
+                    results.append(result)
+                    if emit is not None:
+                        emit(dict(results[-1], type='case'))
+                if data.get('grade_complexity'):
+                    if passed_count == question.test_count:
+                        complexity = grade_complexity(question, data['code'], data['language'],
+                                                      use_cache=not data.get('bypass_cache'))
+                    else:
+                        complexity = {'error': 'Complexity is graded only when every test case passes'}
+                    if emit is not None:
+                        emit(dict(complexity, type='complexity'))
+    except (Judge0Error, AdmissionRejected):
+        # The caller maps these to a response (503 while the circuit is open or the queue is full)
+        raise
+    except Exception as e:
+        return {'error': f'Error executing code: {str(e)}'}, 500
+
+    body = {
+        'results': results,
+        'summary': f"{passed_count}/{question.test_count} test cases passed",
+        'all_passed': passed_count == question.test_count,
+        'skipped': question.test_count - len(results),
+        'timings': trace.as_dict(),
+    }
+    if data.get('grade_complexity'):
+        body['complexity'] = complexity
+    return body, 200
+
+@app.route('/session', methods=['POST'])
+def create_session():
+    wait = session_issue_buckets.take(request.remote_addr)
+    if wait:
+        return admission_error_response(AdmissionRejected("Too many sessions from this address", 429, wait))
+    return jsonify({'token': candidate_tokens.dumps(uuid.uuid4().hex), 'expires_in': CANDIDATE_TOKEN_MAX_AGE}), 201
+
+@app.route('/run', methods=['POST'])
+def run_code():
+    return respond(run_request)
+
+@app.route('/submit', methods=['POST'])
+def submit_code():
+    return respond(submit_request)
 
-    for i, test_case in enumerate(test_cases):
-        wrapped_code = wrap_code_with_tests(question_id, code, language, [test_case])
-        
+def job_handler(handler):
+    def run(data, emit):
         try:
-            response = requests.post(JUDGE0_URL, json={
-                'source_code': wrapped_code,
-                'language_id': language_ids[language],
-            }, headers=headers)
-
-            if response.status_code != 200:
-                results.append({
-                    'test_case': f"Test Case {i+1}",
-                    'error': f"Judge0 API error: {response.text}"
-                })
-                continue
+            # The candidate's token was charged when the job was accepted
+            return handler(data, emit, admitted=True)
+        except Judge0Error as e:
+            return {'error': str(e)}, 503 if isinstance(e, CircuitOpenError) else 500
+    return run
+
+job_manager = JobManager(JobStore(JOBS_FOLDER), {
+    'run': job_handler(run_request),
+    'submit': job_handler(submit_request),
+}, workers=JOB_WORKERS, max_pending=JOB_MAX_PENDING)
+# Jobs a previous process accepted but did not finish
+job_manager.resume()
 
-            result = response.json()
-            stdout = result.get('stdout', '')
-            stderr = result.get('stderr', '')
-            compile_output = result.get('compile_output', '')
-
-            output = stdout.strip() if stdout else (compile_output or stderr or "No Output")
-            expected = str(expected_outputs[i]).strip()
-            passed = output == expected
-
-            if passed:
-                passed_count += 1
-
-            results.append({
-                'test_case': f"Test Case {i+1}",
-                'input': str(test_case),
-                'output': output,
-                'expected': expected,
-                'passed': passed,
-                'error': stderr or compile_output
-            })
-
-        except Exception as e:
-            results.append({
-                'test_case': f"Test Case {i+1}",
-                'error': f"Error: {str(e)}"
-            })
+def job_view(job):
+    return {key: job[key] for key in ('id', 'kind', 'status', 'created_at', 'updated_at', 'events', 'result', 'http_status')}
 
+@app.route('/jobs/<kind>', methods=['POST'])
+def create_job(kind):
+    if kind not in ('run', 'submit'):
+        return jsonify({'error': f"Unknown job kind '{kind}'"}), 404
+    data = json_body()
+    if data is None:
+        return invalid_body_response()
+    if not all([data.get('code'), data.get('language'), data.get('question_id')]):
+        return jsonify({'error': 'Missing required parameters'}), 400
+    try:
+        scheduler.take_token(candidate_id())
+        job = job_manager.submit(kind, data)
+    except InvalidCandidateToken as e:
+        return invalid_token_response(e)
+    except AdmissionRejected as e:
+        return admission_error_response(e)
+    except JobQueueFull:
+        response = jsonify({'error': 'Too many pending executions, try again shortly'})
+        response.status_code = 503
+        response.headers['Retry-After'] = '5'
+        return response
     return jsonify({
-        'results': results,
-        'summary': f"{passed_count}/{len(test_cases)} test cases passed",
-        'all_passed': passed_count == len(test_cases)
-    })
+        'job_id': job['id'],
+        'status_url': f"/jobs/{job['id']}",
+        'events_url': f"/jobs/{job['id']}/events",
+    }), 202
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job_view(job))
+
+@app.route('/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    if job_manager.get(job_id) is None:
+        return jsonify({'error': 'Job not found'}), 404
+    # Reconnecting EventSource clients resume after the last event they saw
+    try:
+        last_id = int(request.headers.get('Last-Event-ID', request.args.get('after', -1)))
+    except ValueError:
+        return jsonify({'error': 'Last-Event-ID must be an event id'}), 400
+
+    def stream():
+        after = last_id
+        while True:
+            waited = job_manager.wait_for_events(job_id, after, timeout=SSE_KEEPALIVE_SECONDS)
+            if waited is None:
+                return
+            events, finished = waited
+            if not events:
+                if finished:
+                    return
+                yield ": keep-alive\n\n"
+                continue
+            for event in events:
+                after = event['id']
+                yield f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n"
+                if event['type'] == 'done':
+                    return
+
+    response = app.response_class(stream(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    return app.response_class(response=metrics.render(), status=200, content_type=PROMETHEUS_CONTENT_TYPE)
 
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
@@ -0,0 +1,115 @@
+import math
+import random
+import string
+
+# Empirical complexity estimation for coding submissions.
+#
+# A question opts in with a "complexity" section naming an input generator and
+# the sizes to probe (see question_registry.py).  The solution runs once per
+# size, smallest first; fit_complexity then picks the growth class whose curve
+# a + b*f(n) best explains the measurements, minimising relative rather than
+# absolute error so the small sizes count as much as the large ones.  The
+# measurements must come from outside the candidate's process (the executor's
+# time), never from the harness the candidate's code runs in.
+
+# name -> f(n); ordered from slowest-growing, which wins near-ties
+COMPLEXITY_CLASSES = [
+    ('O(1)', lambda n: 1.0),
+    ('O(log n)', lambda n: math.log2(n)),
+    ('O(n)', lambda n: float(n)),
+    ('O(n log n)', lambda n: n * math.log2(n)),
+    ('O(n^2)', lambda n: float(n) ** 2),
+    ('O(n^3)', lambda n: float(n) ** 3),
+]
+# A slower-growing class is preferred unless a faster one fits this much
+# better.  n log n and n differ by only ~20% over the top decade of sizes,
+# about the run-to-run noise of a busy executor, so a faster class has to
+# halve the error before it wins
+FIT_TOLERANCE = 2.0
+# Measurements below this are timer noise rather than work
+MIN_SECONDS = 1e-6
+
+
+def two_sum(n, rng):
+    """Worst case for twoSum: n distinct values, only the last two sum to the target.
+
+    Every value is a multiple of 4 except the last two, which are 1 more, so no
+    other pair can reach the target (which is 2 mod 4).
+    """
+    values = rng.sample(range(-2 ** 28, 2 ** 28), n)
+    nums = [4 * value for value in values]
+    nums[-2] += 1
+    nums[-1] += 1
+    return nums, nums[-2] + nums[-1]
+
+
+def random_string(n, rng):
+    return (''.join(rng.choice(string.ascii_letters) for _ in range(n)),)
+
+
+GENERATORS = {
+    'two_sum': two_sum,
+    'string': random_string,
+}
+
+
+def generate(generator, n, seed=0):
+    """Argument tuple of size n; the same seed always gives the same input."""
+    return tuple(GENERATORS[generator](n, random.Random(f"{generator}:{n}:{seed}")))
+
+
+def _weights(values):
+    return [1.0 / max(value, MIN_SECONDS) ** 2 for value in values]
+
+
+def _fit_class(f, sizes, values):
+    """(a, b) >= 0 minimising sum(((a + b*f(n) - value) / value)^2)."""
+    xs = [f(n) for n in sizes]
+    ws = _weights(values)
+    total = sum(ws)
+    mean_x = sum(w * x for w, x in zip(ws, xs)) / total
+    mean_y = sum(w * y for w, y in zip(ws, values)) / total
+    spread = sum(w * (x - mean_x) ** 2 for w, x in zip(ws, xs))
+    b = sum(w * (x - mean_x) * (y - mean_y) for w, x, y in zip(ws, xs, values)) / spread if spread else 0.0
+    a = mean_y - b * mean_x
+    if b <= 0:
+        return mean_y, 0.0
+    if a < 0:
+        return 0.0, sum(w * x * y for w, x, y in zip(ws, xs, values)) / sum(w * x * x for w, x in zip(ws, xs))
+    return a, b
+
+
+def _relative_residual(f, a, b, sizes, values):
+    return sum(w * (a + b * f(n) - value) ** 2 for w, n, value in zip(_weights(values), sizes, values))
+
+
+def growth_exponent(sizes, values):
+    """Slope of log(value) against log(n): about 1 for linear growth, 2 for quadratic."""
+    xs = [math.log(n) for n in sizes]
+    ys = [math.log(max(value, MIN_SECONDS)) for value in values]
+    mean_x, mean_y = sum(xs) / len(xs), sum(ys) / len(ys)
+    spread = sum((x - mean_x) ** 2 for x in xs)
+    return sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / spread
+
+
+def fit_complexity(sizes, values):
+    """(class name, growth exponent) for values measured at sizes; (None, None) with under two sizes."""
+    if len(set(sizes)) < 2:
+        return None, None
+    residuals = []
+    for name, f in COMPLEXITY_CLASSES:
+        a, b = _fit_class(f, sizes, values)
+        residuals.append((name, _relative_residual(f, a, b, sizes, values)))
+    best = min(residual for _, residual in residuals)
+    # The first (slowest-growing) class about as good as the best one
+    name = next(name for name, residual in residuals if residual <= best * FIT_TOLERANCE + 1e-9)
+    return name, growth_exponent(sizes, values)
+
+
+def percentile_rank(samples, value):
+    """Percentage of samples slower than value, counting ties as half."""
+    if not samples:
+        return None
+    slower = sum(1 for sample in samples if sample > value)
+    ties = sum(1 for sample in samples if sample == value)
+    return 100.0 * (slower + ties / 2) / len(samples)
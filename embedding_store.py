@@ -0,0 +1,419 @@
+import os
+import json
+import uuid
+import hashlib
+import threading
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows dev boxes: fall back to the in-process lock only
+    fcntl = None
+
+# Per-user embedding matrices kept under CACHE_FOLDER.
+#
+# Mongo's embeddings collection stays the source of truth; these files are a
+# derived cache that every worker maps with np.memmap, so all processes on a
+# host share one copy through the page cache instead of each loading the whole
+# album from Mongo.  Layout per user directory:
+#
+#   vectors-<generation>.f32  raw float32 rows, count x dim, append-only
+#   boxes-<generation>.i32    raw int32 rows, count x 6: (file index, x1, y1, x2, y2, timestamp ms)
+#   meta.json    {"layout", "dim", "count", "version", "generation", "files": [[path, hash], ...]}
+#
+# Readers only trust the first meta["count"] rows, so an append writes the rows
+# first and publishes them by atomically replacing meta.json.  "generation" is
+# a random id that changes whenever existing rows are replaced rather than
+# appended to, so data derived from the rows (see pca_matcher.py) can tell an
+# extension from a rewrite.  A rewrite writes the new generation's files next
+# to the old ones and swaps meta.json last, so a reader always maps the files
+# of the meta it read; the old files are deleted afterwards, and a reader that
+# finds them gone reads meta.json again.  The timestamp column is the video
+# position of the face, -1 for photos.  Layout 1 (without it) and layout 2
+# (vectors.f32 and boxes.i32) stores are upgraded in place the first time
+# they are opened.
+
+EMBEDDING_DIM = 512
+LAYOUT_VERSION = 3
+BOX_COLUMNS = 6
+NO_TIMESTAMP = -1
+DATA_FILES = (('vectors', 'f32'), ('boxes', 'i32'))
+# Lockless attempts open() makes before mapping under the user lock
+OPEN_ATTEMPTS = 3
+
+
+def new_generation():
+    return uuid.uuid4().hex
+
+
+class EmbeddingView:
+    """Read-only snapshot of one user's on-disk embeddings."""
+
+    def __init__(self, meta, vectors, boxes):
+        self.meta = meta
+        self.version = meta['version']
+        self.files = meta['files']
+        self.vectors = vectors
+        self.boxes = boxes
+        # Files re-indexed by an append keep their old rows but lose their hash.
+        self.live = np.array([entry[1] is not None for entry in self.files], dtype=bool)
+        self._file_index = None
+        self._file_column = None
+
+    def __len__(self):
+        return self.vectors.shape[0]
+
+    def file_hashes(self):
+        return {path: {'hash': file_hash} for path, file_hash in self.files if file_hash is not None}
+
+    def rows_for_paths(self, paths):
+        """Row indices of the faces of the given (live) file paths, in row order."""
+        if self._file_index is None:
+            self._file_index = {path: i for i, (path, file_hash) in enumerate(self.files) if file_hash is not None}
+            # write() and append() both keep each file's rows contiguous and in file order.
+            self._file_column = np.asarray(self.boxes[:, 0])
+        wanted = np.array(sorted(self._file_index[p] for p in set(paths) if p in self._file_index), dtype=np.int32)
+        if wanted.size == 0:
+            return np.empty(0, dtype=np.int64)
+        starts = np.searchsorted(self._file_column, wanted, side='left')
+        stops = np.searchsorted(self._file_column, wanted, side='right')
+        lengths = stops - starts
+        offsets = np.repeat(starts - np.concatenate(([0], np.cumsum(lengths)[:-1])), lengths)
+        return offsets + np.arange(int(lengths.sum()))
+
+
+class EmbeddingStore:
+    def __init__(self, root, dim=EMBEDDING_DIM):
+        self.root = root
+        self.dim = dim
+        self._views = {}
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def user_dir(self, username):
+        digest = hashlib.md5(username.encode('utf-8')).hexdigest()
+        return os.path.join(self.root, digest)
+
+    def _paths(self, username):
+        user_dir = self.user_dir(username)
+        return {
+            'dir': user_dir,
+            # Layouts 1 and 2
+            'vectors': os.path.join(user_dir, 'vectors.f32'),
+            'boxes': os.path.join(user_dir, 'boxes.i32'),
+            'meta': os.path.join(user_dir, 'meta.json'),
+            'lock': os.path.join(user_dir, '.lock'),
+        }
+
+    @staticmethod
+    def _data_path(paths, key, generation):
+        extension = dict(DATA_FILES)[key]
+        return os.path.join(paths['dir'], f"{key}-{generation}.{extension}")
+
+    def _remove_stale_data(self, paths, generation):
+        """Delete data files of generations other than generation (or all, if None); caller holds the user lock."""
+        current = {self._data_path(paths, key, generation) for key, _ in DATA_FILES} if generation else set()
+        try:
+            names = os.listdir(paths['dir'])
+        except FileNotFoundError:
+            return
+        for name in names:
+            path = os.path.join(paths['dir'], name)
+            is_data = any(name.startswith(key + '-') and name.endswith('.' + extension) for key, extension in DATA_FILES)
+            if (is_data or path in (paths['vectors'], paths['boxes'])) and path not in current:
+                try:
+                    os.remove(path)
+                except OSError:
+                    # e.g. still mapped by a reader on Windows: the next rewrite retries
+                    pass
+
+    def _user_lock(self, paths):
+        return _FileLock(paths['lock'])
+
+    def user_lock(self, username):
+        """Cross-process lock serialising writers of one user's store files."""
+        paths = self._paths(username)
+        os.makedirs(paths['dir'], exist_ok=True)
+        return self._user_lock(paths)
+
+    def _load_meta(self, paths):
+        try:
+            with open(paths['meta'], 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def read_meta(self, username):
+        meta = self._load_meta(self._paths(username))
+        if meta is None or meta.get('layout') != LAYOUT_VERSION or meta.get('dim') != self.dim:
+            return None
+        return meta
+
+    def _upgrade(self, paths):
+        """Bring a layout 1 or 2 store up to date; caller holds the user lock.
+
+        Layout 1 gains the timestamp column; both move their data to
+        generation-named files.  The old files stay until the new meta.json
+        is in place, so a crash part way leaves the old store intact.
+        """
+        meta = self._load_meta(paths)
+        if meta is None or meta.get('layout') not in (1, 2) or meta.get('dim') != self.dim:
+            return
+        generation = new_generation()
+        count = meta['count']
+        if meta['layout'] == 1:
+            old = np.fromfile(paths['boxes'], dtype=np.int32, count=count * 5).reshape(-1, 5) if count else np.empty((0, 5), dtype=np.int32)
+            boxes = np.full((old.shape[0], BOX_COLUMNS), NO_TIMESTAMP, dtype=np.int32)
+            boxes[:, :5] = old
+            self._write_data(self._data_path(paths, 'boxes', generation), boxes)
+            linked = ('vectors',)
+        else:
+            linked = ('vectors', 'boxes')
+        # Rows beyond count are crash leftovers, which readers never look at.
+        for key in linked:
+            if os.path.exists(paths[key]):
+                os.link(paths[key], self._data_path(paths, key, generation))
+        meta['layout'] = LAYOUT_VERSION
+        meta['generation'] = generation
+        meta['version'] += 1
+        self._write_meta(paths, meta)
+        for key, _ in DATA_FILES:
+            try:
+                os.remove(paths[key])
+            except FileNotFoundError:
+                pass
+
+    @staticmethod
+    def _write_data(path, array):
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.ascontiguousarray(array).tofile(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def _write_meta(self, paths, meta):
+        tmp_path = paths['meta'] + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(meta, f, separators=(',', ':'))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, paths['meta'])
+
+    def _rows_from_faces(self, file_idx, faces):
+        vectors = np.asarray([face['embedding'] for face in faces], dtype=np.float32).reshape(-1, self.dim)
+        boxes = np.asarray([[file_idx] + list(face['position']) + [face.get('timestamp_ms', NO_TIMESTAMP)]
+                            for face in faces], dtype=np.int32).reshape(-1, BOX_COLUMNS)
+        return vectors, boxes
+
+    def write(self, username, cache):
+        """Replace a user's matrix with the contents of a load_cache()-style dict."""
+        files, vector_parts, box_parts = [], [], []
+        for filepath, data in cache.items():
+            faces = data.get('faces') or []
+            if not faces:
+                continue
+            vectors, boxes = self._rows_from_faces(len(files), faces)
+            files.append([filepath, data['hash']])
+            vector_parts.append(vectors)
+            box_parts.append(boxes)
+        vectors = np.concatenate(vector_parts) if vector_parts else np.empty((0, self.dim), dtype=np.float32)
+        boxes = np.concatenate(box_parts) if box_parts else np.empty((0, BOX_COLUMNS), dtype=np.int32)
+        return self.write_arrays(username, files, vectors, boxes)
+
+    def write_arrays(self, username, files, vectors, boxes):
+        """Replace a user's matrix with prebuilt rows; boxes[:, 0] indexes files."""
+        paths = self._paths(username)
+        os.makedirs(paths['dir'], exist_ok=True)
+        with self._user_lock(paths):
+            previous = self.read_meta(username)
+            # A new generation's files, published by meta.json: readers holding
+            # the old maps keep their inodes until they reopen.
+            generation = new_generation()
+            self._write_data(self._data_path(paths, 'vectors', generation), np.asarray(vectors, dtype=np.float32))
+            self._write_data(self._data_path(paths, 'boxes', generation), np.asarray(boxes, dtype=np.int32))
+            self._write_meta(paths, {
+                'layout': LAYOUT_VERSION,
+                'dim': self.dim,
+                'count': int(vectors.shape[0]),
+                'version': (previous['version'] + 1) if previous else 1,
+                'generation': generation,
+                'files': [list(entry) for entry in files],
+            })
+            self._remove_stale_data(paths, generation)
+        return int(vectors.shape[0])
+
+    def append(self, username, filepath, file_hash, faces):
+        """Append one file's faces without rewriting the existing rows."""
+        paths = self._paths(username)
+        os.makedirs(paths['dir'], exist_ok=True)
+        with self._user_lock(paths):
+            self._upgrade(paths)
+            meta = self.read_meta(username)
+            if meta is None:
+                meta = {'layout': LAYOUT_VERSION, 'dim': self.dim, 'count': 0, 'version': 0, 'files': []}
+            if 'generation' not in meta:
+                # New store
+                meta['generation'] = new_generation()
+            for entry in meta['files']:
+                if entry[0] == filepath:
+                    entry[1] = None
+            if faces:
+                vectors, boxes = self._rows_from_faces(len(meta['files']), faces)
+                meta['files'].append([filepath, file_hash])
+                # Drop any rows a crashed append left beyond the published count.
+                for key, array, width in (('vectors', vectors, self.dim), ('boxes', boxes, BOX_COLUMNS)):
+                    with open(self._data_path(paths, key, meta['generation']), 'ab') as f:
+                        f.truncate(meta['count'] * width * 4)
+                        np.ascontiguousarray(array).tofile(f)
+                        f.flush()
+                        os.fsync(f.fileno())
+                meta['count'] += int(vectors.shape[0])
+            meta['version'] += 1
+            self._write_meta(paths, meta)
+        return meta['count']
+
+    def delete(self, username):
+        paths = self._paths(username)
+        if os.path.isdir(paths['dir']):
+            with self._user_lock(paths):
+                # meta.json first: without it the store no longer exists for readers
+                try:
+                    os.remove(paths['meta'])
+                except FileNotFoundError:
+                    pass
+                self._remove_stale_data(paths, None)
+        with self._lock:
+            self._views.pop(username, None)
+
+    def open(self, username):
+        """Return a memory-mapped view, or None if the user has no store yet."""
+        paths = self._paths(username)
+        for _ in range(OPEN_ATTEMPTS):
+            try:
+                return self._open(username, paths)
+            except (FileNotFoundError, ValueError):
+                # A rewrite deleted the files of the meta.json just read
+                pass
+        # Still racing writers: map while they are held off
+        with self.user_lock(username):
+            return self._open(username, paths, locked=True)
+
+    def _open(self, username, paths, locked=False):
+        try:
+            st = os.stat(paths['meta'])
+        except FileNotFoundError:
+            return None
+        # meta.json is always replaced, never edited, so a new inode means a new version.
+        stamp = (st.st_ino, st.st_mtime_ns)
+        with self._lock:
+            cached = self._views.get(username)
+            if cached and cached[0] == stamp:
+                return cached[1]
+        meta = self.read_meta(username)
+        if meta is None:
+            if locked:
+                self._upgrade(paths)
+            else:
+                with self.user_lock(username):
+                    self._upgrade(paths)
+            meta = self.read_meta(username)
+            if meta is None:
+                return None
+            st = os.stat(paths['meta'])
+            stamp = (st.st_ino, st.st_mtime_ns)
+        count = meta['count']
+        if count:
+            vectors = np.memmap(self._data_path(paths, 'vectors', meta['generation']), dtype=np.float32, mode='r',
+                                shape=(count, self.dim))
+            boxes = np.memmap(self._data_path(paths, 'boxes', meta['generation']), dtype=np.int32, mode='r',
+                              shape=(count, BOX_COLUMNS))
+        else:
+            vectors = np.empty((0, self.dim), dtype=np.float32)
+            boxes = np.empty((0, BOX_COLUMNS), dtype=np.int32)
+        view = EmbeddingView(meta, vectors, boxes)
+        with self._lock:
+            self._views[username] = (stamp, view)
+        return view
+
+    def cached_users(self):
+        with self._lock:
+            return {username: len(view) for username, (_, view) in self._views.items()}
+
+
+def best_faces_per_file(view, query, threshold, rows=None):
+    """Closest face per file among rows whose cosine distance is below threshold.
+
+    Embeddings are L2-normalised, so cosine distance is 1 - dot product and the
+    whole album is scored with a single matrix-vector product.  rows limits the
+    scan to a slice or an index array.  Returns a list of (file index,
+    distance, row index) sorted by ascending distance.
+    """
+    if len(view) == 0:
+        return []
+    q = np.asarray(query, dtype=np.float32).ravel()
+    q = q / np.linalg.norm(q)
+    if rows is None or isinstance(rows, slice):
+        # Contiguous ranges are scanned straight off the map, without a copy.
+        start = rows.indices(len(view))[0] if rows is not None else 0
+        distances = 1.0 - view.vectors[rows if rows is not None else slice(None)] @ q
+        hits = np.nonzero(distances < threshold)[0]
+        hit_distances = distances[hits]
+        hits += start
+    else:
+        rows = np.asarray(rows, dtype=np.int64)
+        distances = 1.0 - view.vectors[rows] @ q
+        keep = distances < threshold
+        hits, hit_distances = rows[keep], distances[keep]
+    if hits.size == 0:
+        return []
+    order = np.argsort(hit_distances, kind='stable')
+    hits, hit_distances = hits[order], hit_distances[order]
+    file_idx = np.asarray(view.boxes[hits, 0])
+    alive = view.live[file_idx]
+    hits, hit_distances, file_idx = hits[alive], hit_distances[alive], file_idx[alive]
+    _, first = np.unique(file_idx, return_index=True)
+    first.sort()
+    return [(int(file_idx[i]), float(hit_distances[i]), int(hits[i])) for i in first]
+
+
+_thread_locks = {}
+_thread_locks_guard = threading.Lock()
+
+
+def _thread_lock(path):
+    with _thread_locks_guard:
+        return _thread_locks.setdefault(os.path.abspath(path), threading.Lock())
+
+
+class _FileLock:
+    """flock on path, plus a per-path thread lock so writers in one process
+    are serialised even where fcntl is unavailable."""
+
+    def __init__(self, path):
+        self.path = path
+        self._fd = None
+        self._lock = _thread_lock(path)
+
+    def __enter__(self):
+        self._lock.acquire()
+        try:
+            self._fd = open(self.path, 'a')
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+        except BaseException:
+            if self._fd is not None:
+                self._fd.close()
+                self._fd = None
+            self._lock.release()
+            raise
+        return self
+
+    def __exit__(self, *exc):
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            self._fd.close()
+            self._fd = None
+        finally:
+            self._lock.release()
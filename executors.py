@@ -0,0 +1,399 @@
+import os
+import sys
+import math
+import time
+import logging
+import shutil
+import signal
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from warm_pool import (ArtifactCache, WarmPool, RuntimeNotParked, PYTHON_BOOTSTRAP, NODE_BOOTSTRAP,
+                       JAVA_BOOTSTRAP_CLASS, build_java_bootstrap)
+from pids_cgroup import PidsCgroups
+
+try:
+    import resource
+except ImportError:  # Windows: no rlimits, so the local backend is unavailable
+    resource = None
+
+# Code execution backends for coding.py.
+#
+# Every backend returns results in Judge0's shape, so the harness parsing and
+# result cache do not care where a program ran:
+#
+#   {'stdout', 'stderr', 'compile_output', 'status': {'id', 'description'}, 'time', 'memory'}
+#
+# time is in seconds (a string, as Judge0 sends it) and memory is the peak in
+# KB.  LocalExecutor leaves memory as None: wait4's peak RSS for a child forked
+# from this server counts the server's pages it held until exec, which would
+# swamp a small program's own use.
+#
+# Results also carry 'timings', the seconds the program spent in each stage
+# this backend can tell apart (see telemetry.py): Judge0 reports only the run
+# time, so its queueing and compiling are measured together as 'wait'.
+#
+# Judge0Executor forwards to the hosted (or self-hosted) Judge0 API.
+# LocalExecutor compiles and runs programs in subprocesses on this host, each
+# in its own scratch directory and under CPU, memory and file-size rlimits
+# plus a wall-clock timeout, and with each program's process and thread count
+# capped by a pids cgroup (see pids_cgroup.py).  Without a pids cgroup it
+# refuses to start unless told the code is trusted (unlimited_processes),
+# since a fork bomb would otherwise take the host down.  It is meant for trusted
+# deployments or inside a container; rlimits are not a security boundary
+# against a hostile user on their own.  Interpreter and JVM start-up is taken
+# off the request path by warm pools, and compiler runs by an artifact cache
+# (see warm_pool.py).
+
+logger = logging.getLogger(__name__)
+
+# Judge0 status ids
+STATUS_ACCEPTED = 3
+STATUS_TIME_LIMIT = 5
+STATUS_COMPILATION_ERROR = 6
+STATUS_SIGSEGV = 7
+STATUS_SIGXFSZ = 8
+STATUS_SIGFPE = 9
+STATUS_SIGABRT = 10
+STATUS_NZEC = 11
+STATUS_OTHER = 12
+STATUS_INTERNAL_ERROR = 13
+# Judge0 status ids 1 (In Queue) and 2 (Processing) are not final yet
+PENDING_STATUSES = (1, 2)
+
+STATUS_DESCRIPTIONS = {
+    STATUS_ACCEPTED: 'Accepted',
+    STATUS_TIME_LIMIT: 'Time Limit Exceeded',
+    STATUS_COMPILATION_ERROR: 'Compilation Error',
+    STATUS_SIGSEGV: 'Runtime Error (SIGSEGV)',
+    STATUS_SIGXFSZ: 'Runtime Error (SIGXFSZ)',
+    STATUS_SIGFPE: 'Runtime Error (SIGFPE)',
+    STATUS_SIGABRT: 'Runtime Error (SIGABRT)',
+    STATUS_NZEC: 'Runtime Error (NZEC)',
+    STATUS_OTHER: 'Runtime Error (Other)',
+    STATUS_INTERNAL_ERROR: 'Internal Error',
+}
+
+SIGNAL_STATUSES = {
+    signal.SIGSEGV: STATUS_SIGSEGV,
+    signal.SIGXFSZ: STATUS_SIGXFSZ,
+    signal.SIGFPE: STATUS_SIGFPE,
+    signal.SIGABRT: STATUS_SIGABRT,
+    signal.SIGXCPU: STATUS_TIME_LIMIT,
+    signal.SIGKILL: STATUS_TIME_LIMIT,
+}
+
+
+def make_result(status_id, stdout=None, stderr=None, compile_output=None, elapsed=None):
+    return {
+        'stdout': stdout or None,
+        'stderr': stderr or None,
+        'compile_output': compile_output or None,
+        'status': {'id': status_id, 'description': STATUS_DESCRIPTIONS[status_id]},
+        'time': f"{elapsed:.3f}" if elapsed is not None else None,
+        'memory': None,
+    }
+
+
+class Executor:
+    """Runs a program and returns a Judge0-shaped result dict.
+
+    time_limit, in seconds, replaces the backend's default CPU time limit for
+    one run; the wall-clock limit is twice that.
+    """
+
+    def run(self, source, language_id, stdin=None, time_limit=None):
+        raise NotImplementedError
+
+    def run_many(self, sources, language_id, stdins=None, time_limit=None):
+        """Results for several programs, in order; failures are {'error': ...} entries."""
+        stdins = stdins or [None] * len(sources)
+        return [self.run(source, language_id, stdin, time_limit) for source, stdin in zip(sources, stdins)]
+
+
+class Judge0Executor(Executor):
+    def __init__(self, client, poll_interval=0.25, batch_timeout=30,
+                 fields="token,stdout,stderr,compile_output,status,time,memory"):
+        self.client = client
+        self.poll_interval = poll_interval
+        self.batch_timeout = batch_timeout
+        self.fields = fields
+
+    def _limits(self, time_limit):
+        if time_limit is None:
+            return {}
+        return {'cpu_time_limit': time_limit, 'wall_time_limit': 2 * time_limit}
+
+    @staticmethod
+    def _timings(result, enqueue, waited):
+        run = float(result['time']) if result.get('time') is not None else 0.0
+        return {'enqueue': enqueue, 'wait': max(0.0, waited - run), 'run': run}
+
+    def run(self, source, language_id, stdin=None, time_limit=None):
+        started = time.monotonic()
+        result = self.client.submit(source, language_id, stdin=stdin, **self._limits(time_limit))
+        # wait=true: queueing, compiling and running are one round trip
+        result['timings'] = self._timings(result, 0.0, time.monotonic() - started)
+        return result
+
+    def run_many(self, sources, language_id, stdins=None, time_limit=None):
+        """Run several programs through one Judge0 batch submission.
+
+        All submissions are queued with a single POST and their tokens polled
+        together, so the wait is that of the slowest program rather than the sum.
+        """
+        stdins = stdins or [None] * len(sources)
+        started = time.monotonic()
+        created = self.client.submit_batch([
+            dict(self._limits(time_limit), source_code=source, language_id=language_id, stdin=stdin)
+            for source, stdin in zip(sources, stdins)
+        ])
+        queued = time.monotonic()
+        # One POST queued them all: each program's share of it
+        enqueue = (queued - started) / max(1, len(sources))
+
+        results = [None] * len(sources)
+        pending = {}
+        for i, entry in enumerate(created):
+            if entry.get('token'):
+                pending[entry['token']] = i
+            else:
+                results[i] = {'error': f"Judge0 rejected submission: {entry}"}
+
+        deadline = time.time() + self.batch_timeout
+        while pending:
+            if time.time() > deadline:
+                for i in pending.values():
+                    results[i] = {'error': 'Timed out waiting for Judge0'}
+                break
+            time.sleep(self.poll_interval)
+            for submission in self.client.get_batch(list(pending), self.fields):
+                if submission and submission.get('status', {}).get('id') not in PENDING_STATUSES:
+                    submission['timings'] = self._timings(submission, enqueue, time.monotonic() - queued)
+                    results[pending.pop(submission['token'])] = submission
+        return results
+
+
+class LocalLanguage:
+    def __init__(self, filename, run, compile=None, artifacts=(), warm=None, limit_address_space=True,
+                 startup_cpu_seconds=0):
+        self.filename = filename
+        self.compile = compile
+        self.run = run
+        # Files the compiler produces, kept in the artifact cache
+        self.artifacts = artifacts
+        # Command that parks a runtime for the warm pool; "{bootstrap}" is the
+        # directory holding the compiled JVM bootstrap
+        self.warm = warm
+        # The JVM reserves far more address space than it uses; it is bounded
+        # with -Xmx instead of RLIMIT_AS.
+        self.limit_address_space = limit_address_space
+        # CPU a warm runtime spends starting up, added to its CPU limit
+        self.startup_cpu_seconds = startup_cpu_seconds
+
+
+def default_languages(memory_mb=256):
+    """language_id -> LocalLanguage for the ids coding.py uses."""
+    java_flags = [f'-Xmx{memory_mb}m', '-Xss64m', '-XX:TieredStopAtLevel=1']
+    return {
+        71: LocalLanguage('main.py', [sys.executable, '-I', '-S', 'main.py'],
+                          warm=[sys.executable, '-I', '-S', '-c', PYTHON_BOOTSTRAP]),
+        63: LocalLanguage('main.js', ['node', 'main.js'], warm=['node', '-e', NODE_BOOTSTRAP],
+                          limit_address_space=False),
+        62: LocalLanguage('Main.java', ['java'] + java_flags + ['-cp', '.', 'Main'],
+                          compile=['javac', '-J-Xmx512m', 'Main.java'], artifacts=('*.class',),
+                          warm=['java'] + java_flags + ['-cp', '{bootstrap}', JAVA_BOOTSTRAP_CLASS],
+                          limit_address_space=False, startup_cpu_seconds=2),
+        54: LocalLanguage('main.cpp', ['./main'], compile=['g++', '-O2', '-std=c++17', 'main.cpp', '-o', 'main'],
+                          artifacts=('main',)),
+        50: LocalLanguage('main.c', ['./main'], compile=['gcc', '-O2', 'main.c', '-o', 'main', '-lm'],
+                          artifacts=('main',)),
+    }
+
+
+class LocalExecutor(Executor):
+    def __init__(self, languages=None, cpu_seconds=5, wall_seconds=10, memory_mb=256, max_processes=64,
+                 max_output_bytes=1024 * 1024, compile_seconds=30, workers=None, scratch_root=None,
+                 warm_pool_size=2, artifact_cache_dir=None, artifact_cache_entries=256, pids_cgroup=None,
+                 unlimited_processes=False):
+        """max_processes caps each program's tasks, threads included, through pids_cgroup, a cgroup
+        directory the server can create children in.  Without one, unlimited_processes must be set."""
+        if resource is None:
+            raise RuntimeError("LocalExecutor needs POSIX rlimits")
+        if not pids_cgroup:
+            if not unlimited_processes:
+                raise RuntimeError("LocalExecutor needs a pids cgroup to limit each program's processes "
+                                   "(LOCAL_PIDS_CGROUP); set unlimited_processes (LOCAL_UNLIMITED_PROCESSES=1) "
+                                   "only if every program it runs is trusted")
+            logger.warning("LocalExecutor has no pids cgroup: programs' processes and threads are NOT limited, "
+                           "so any program can fork-bomb this host. Run only trusted code.")
+        self.languages = languages or default_languages(memory_mb)
+        self.cpu_seconds = cpu_seconds
+        self.wall_seconds = wall_seconds
+        self.memory_bytes = memory_mb * 1024 * 1024
+        self.max_processes = max_processes
+        self.cgroups = PidsCgroups(pids_cgroup, max_processes) if pids_cgroup else None
+        self.max_output_bytes = max_output_bytes
+        self.compile_seconds = compile_seconds
+        self.scratch_root = scratch_root
+        self._pool = ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1, thread_name_prefix='local-exec')
+        self.env = {'PATH': os.environ.get('PATH', '/usr/bin:/bin')}
+        cache_dir = artifact_cache_dir or os.path.join(tempfile.gettempdir(), 'code-artifacts')
+        self.artifact_cache = ArtifactCache(cache_dir, max_entries=artifact_cache_entries)
+        self.warm_pools = {}
+        if warm_pool_size:
+            self._start_warm_pools(warm_pool_size, cache_dir)
+
+    def _start_warm_pools(self, size, cache_dir):
+        for language_id, language in self.languages.items():
+            if not language.warm or shutil.which(language.warm[0]) is None:
+                continue
+            command = language.warm
+            if any('{bootstrap}' in part for part in command):
+                bootstrap = build_java_bootstrap(os.path.join(cache_dir, '.java-bootstrap'))
+                if bootstrap is None:
+                    continue
+                command = [part.replace('{bootstrap}', bootstrap) for part in command]
+            limits = self._limits(self.cpu_seconds + language.startup_cpu_seconds, language.limit_address_space)
+            self.warm_pools[language_id] = WarmPool(command, size, limits, scratch_root=self.scratch_root, env=self.env,
+                                                    cgroups=self.cgroups)
+
+    def close(self):
+        for pool in self.warm_pools.values():
+            pool.close()
+        self._pool.shutdown(wait=False)
+
+    def _limits(self, cpu_seconds, limit_address_space, cgroup=None):
+        def apply():
+            if cgroup is not None:
+                PidsCgroups.join(cgroup)
+            resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds + 1))
+            if limit_address_space:
+                resource.setrlimit(resource.RLIMIT_AS, (self.memory_bytes, self.memory_bytes))
+            resource.setrlimit(resource.RLIMIT_FSIZE, (self.max_output_bytes, self.max_output_bytes))
+            resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+        return apply
+
+    def _spawn(self, command, workdir, stdin, cpu_seconds, wall_seconds, limit_address_space, output_prefix='.'):
+        """(returncode or None on timeout, stdout, stderr, elapsed) of one sandboxed process."""
+        stdout_path = os.path.join(workdir, output_prefix + 'stdout')
+        stderr_path = os.path.join(workdir, output_prefix + 'stderr')
+        cgroup = self.cgroups.create() if self.cgroups is not None else None
+        # Output goes to files so RLIMIT_FSIZE caps it, not to unbounded pipes
+        try:
+            with open(stdout_path, 'wb') as out, open(stderr_path, 'wb') as err:
+                started = time.monotonic()
+                process = subprocess.Popen(command, cwd=workdir, stdin=subprocess.PIPE, stdout=out, stderr=err,
+                                           env=dict(self.env, HOME=workdir),
+                                           preexec_fn=self._limits(cpu_seconds, limit_address_space, cgroup),
+                                           start_new_session=True)
+                try:
+                    process.communicate((stdin or '').encode('utf-8'), timeout=wall_seconds)
+                    returncode = process.returncode
+                except subprocess.TimeoutExpired:
+                    os.killpg(process.pid, signal.SIGKILL)
+                    process.wait()
+                    returncode = None
+                elapsed = time.monotonic() - started
+        finally:
+            if cgroup is not None:
+                self.cgroups.remove(cgroup)
+        return returncode, self._read(stdout_path), self._read(stderr_path), elapsed
+
+    def _read(self, path):
+        with open(path, 'rb') as f:
+            return f.read(self.max_output_bytes).decode('utf-8', errors='replace')
+
+    def _status(self, returncode):
+        if returncode is None:
+            return STATUS_TIME_LIMIT
+        if returncode == 0:
+            return STATUS_ACCEPTED
+        if returncode < 0:
+            return SIGNAL_STATUSES.get(-returncode, STATUS_OTHER)
+        return STATUS_NZEC
+
+    def _prepare(self, language, source, workdir):
+        """Write and compile source in workdir; returns a failed result or None."""
+        with open(os.path.join(workdir, language.filename), 'w') as f:
+            f.write(source)
+        if language.compile is None:
+            return None
+        key = self.artifact_cache.key(language.compile, source)
+        if self.artifact_cache.restore(key, workdir):
+            return None
+        returncode, stdout, stderr, _ = self._spawn(language.compile, workdir, None, self.compile_seconds,
+                                                    self.compile_seconds, limit_address_space=False,
+                                                    output_prefix='.compile.')
+        if returncode is None:
+            return make_result(STATUS_COMPILATION_ERROR, compile_output='Compilation timed out')
+        if returncode != 0:
+            return make_result(STATUS_COMPILATION_ERROR, compile_output=stderr or stdout)
+        self.artifact_cache.store(key, workdir, language.artifacts)
+        return None
+
+    def run(self, source, language_id, stdin=None, time_limit=None):
+        language = self.languages.get(language_id)
+        if language is None:
+            return make_result(STATUS_INTERNAL_ERROR, stderr=f"Language {language_id} is not available locally")
+        cpu_seconds, wall_seconds = self.cpu_seconds, self.wall_seconds
+        if time_limit is not None:
+            cpu_seconds, wall_seconds = math.ceil(time_limit), 2 * time_limit
+        pool = self.warm_pools.get(language_id)
+        # Parked runtimes carry the default CPU rlimit, too low for a longer limit
+        runtime = pool.acquire() if pool is not None and cpu_seconds <= self.cpu_seconds else None
+        workdir = runtime.workdir if runtime is not None else tempfile.mkdtemp(prefix='run-', dir=self.scratch_root)
+        try:
+            started = time.monotonic()
+            failed = self._prepare(language, source, workdir)
+            timings = {'compile': time.monotonic() - started} if language.compile is not None else {}
+            if failed is not None:
+                failed['timings'] = timings
+                return failed
+            warm = None
+            if runtime is not None:
+                try:
+                    warm = runtime.go(stdin, wall_seconds)
+                except RuntimeNotParked:
+                    # The program has not started; run it cold in the same directory
+                    runtime.kill()
+            if warm is not None:
+                returncode, elapsed = warm
+                stdout = self._read(os.path.join(workdir, '.stdout'))
+                stderr = self._read(os.path.join(workdir, '.stderr'))
+            else:
+                returncode, stdout, stderr, elapsed = self._spawn(language.run, workdir, stdin, cpu_seconds,
+                                                                  wall_seconds, language.limit_address_space)
+            result = make_result(self._status(returncode), stdout, stderr, elapsed=elapsed)
+            result['timings'] = dict(timings, run=elapsed)
+            return result
+        except OSError as e:
+            # e.g. the compiler or runtime is not installed on this host
+            return make_result(STATUS_INTERNAL_ERROR, stderr=str(e))
+        finally:
+            if runtime is not None:
+                runtime.discard()
+            else:
+                shutil.rmtree(workdir, ignore_errors=True)
+
+    def run_many(self, sources, language_id, stdins=None, time_limit=None):
+        stdins = stdins or [None] * len(sources)
+        queued = time.monotonic()
+
+        def run(program):
+            waited = time.monotonic() - queued
+            result = self.run(program[0], language_id, program[1], time_limit)
+            # Time spent waiting for a free worker thread
+            result['timings'] = dict(result.get('timings') or {}, wait=waited)
+            return result
+
+        return list(self._pool.map(run, zip(sources, stdins)))
+
+
+def create_executor(name, judge0_client=None, **options):
+    """Backend selected by config: 'judge0' (default) or 'local'."""
+    if name == 'local':
+        return LocalExecutor(**options)
+    if name == 'judge0':
+        return Judge0Executor(judge0_client)
+    raise ValueError(f"Unknown executor '{name}', expected 'judge0' or 'local'")
@@ -0,0 +1,98 @@
+import hashlib
+from contextlib import nullcontext
+import cv2
+import numpy as np
+import torch
+import torchvision.transforms as transforms
+from PIL import Image
+from mtcnn import MTCNN
+from facenet_pytorch import InceptionResnetV1
+from image_io import decode_image
+
+# Detection/embedding pipeline shared by the web app and the offline indexer.
+
+SUPPORTED_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+# Initialize MTCNN & FaceNet
+device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+detector = MTCNN()
+facenet = InceptionResnetV1(pretrained='vggface2').eval().to(device)
+
+# Tensor Transform
+transform = transforms.Compose([
+    transforms.ToTensor(),
+    transforms.Resize((160, 160)),
+    transforms.Normalize(mean=[0.5], std=[0.5])
+])
+
+def extract_faces(img_array, confidence_threshold=0.8, inplace=False):
+    # inplace converts the caller's BGR array to RGB without allocating a second
+    # full-size image; the returned face crops are views into it.
+    if img_array is None:
+        return [], []
+    rgb_img = cv2.cvtColor(img_array, cv2.COLOR_BGR2RGB, dst=img_array if inplace else None)
+    faces = detector.detect_faces(rgb_img)
+    face_images, face_positions = [], []
+    for face in faces:
+        if face['confidence'] >= confidence_threshold:
+            x, y, w, h = face['box']
+            x1, y1, x2, y2 = max(0, x), max(0, y), min(rgb_img.shape[1], x + w), min(rgb_img.shape[0], y + h)
+            face_img = rgb_img[y1:y2, x1:x2]
+            if face_img.size > 0:
+                face_images.append(face_img)
+                face_positions.append((x1, y1, x2, y2))
+    return face_images, face_positions
+
+def extract_features(face_img):
+    face_img = Image.fromarray(face_img)
+    face_tensor = transform(face_img).unsqueeze(0).to(device)
+    with torch.no_grad():
+        embedding = facenet(face_tensor).cpu().numpy()
+    return embedding / np.linalg.norm(embedding)
+
+def extract_features_batch(face_imgs, batch_size=32):
+    """Normalised embeddings of many face crops, run through FaceNet in batches."""
+    embeddings = []
+    for start in range(0, len(face_imgs), batch_size):
+        batch = torch.stack([transform(Image.fromarray(face)) for face in face_imgs[start:start + batch_size]]).to(device)
+        with torch.no_grad():
+            embeddings.append(facenet(batch).cpu().numpy())
+    if not embeddings:
+        return np.empty((0, 512), dtype=np.float32)
+    embeddings = np.concatenate(embeddings)
+    return embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+def _no_stage(name):
+    return nullcontext()
+
+def index_image(img_path, stage=_no_stage):
+    """Detect and embed every face in an image file, in the cache's face format.
+
+    stage(name) returns a context manager wrapped around the decode, detect
+    and embed steps, for callers that record per-stage timings.
+    """
+    with stage('decode'):
+        img_array, scale = decode_image(img_path)
+    if img_array is None:
+        return []
+    with stage('detect'):
+        faces, positions = extract_faces(img_array, inplace=True)
+    face_data = []
+    with stage('embed'):
+        for face, position in zip(faces, positions):
+            features = extract_features(face)
+            face_data.append({
+                'embedding': features.tolist(),
+                # Boxes are stored in original-image pixels even if decoded reduced
+                'position': tuple(int(round(v / scale)) for v in position) if scale != 1.0 else position
+            })
+    return face_data
+
+def get_file_hash(file_path):
+    hasher = hashlib.md5()
+    with open(file_path, 'rb') as f:
+        buf = f.read(65536)
+        while len(buf) > 0:
+            hasher.update(buf)
+            buf = f.read(65536)
+    return hasher.hexdigest()
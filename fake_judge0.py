@@ -0,0 +1,163 @@
+"""Local stand-in for the Judge0 API, for exercising coding.py without RapidAPI.
+
+Implements the endpoints coding.py uses (POST /submissions with wait=true,
+GET /submissions/<token>, POST and GET /submissions/batch).  Python
+submissions (language 71) are actually run with a subprocess when --execute
+is given; everything else "succeeds" with empty output.  Latency, throttling
+and failures can be injected to exercise the client's retries and breaker;
+latency is a fixed part plus jitter drawn uniformly or, for a long tail,
+exponentially with the jitter as its mean.
+
+    python fake_judge0.py --port 2358 --latency 0.2 --error-rate 0.1
+    python fake_judge0.py --execute --latency 0.05 --jitter 0.2 --jitter-distribution exponential
+    JUDGE0_BASE_URL=http://127.0.0.1:2358 python coding.py
+"""
+import sys
+import time
+import uuid
+import random
+import argparse
+import threading
+import subprocess
+from flask import Flask, request, jsonify
+
+PYTHON_LANGUAGE_ID = 71
+
+app = Flask(__name__)
+app.config.update(LATENCY=0.0, JITTER=0.0, JITTER_DISTRIBUTION='uniform', ERROR_RATE=0.0, THROTTLE_RATE=0.0,
+                  GARBAGE_RATE=0.0, TLE_RATE=0.0, EXECUTE=False, RUN_TIMEOUT=5.0)
+
+submissions = {}
+submissions_lock = threading.Lock()
+
+
+def _injected_failure():
+    roll = random.random()
+    if roll < app.config['THROTTLE_RATE']:
+        response = jsonify({'error': 'Too many requests'})
+        response.status_code = 429
+        response.headers['Retry-After'] = '1'
+        return response
+    if roll < app.config['THROTTLE_RATE'] + app.config['ERROR_RATE']:
+        return jsonify({'error': 'Internal error'}), 500
+    if roll < app.config['THROTTLE_RATE'] + app.config['ERROR_RATE'] + app.config['GARBAGE_RATE']:
+        # A proxy's error page with a success status
+        return '<html><body>Bad gateway</body></html>', 200, {'Content-Type': 'text/html'}
+    return None
+
+
+def _run(body):
+    result = {'stdout': None, 'stderr': None, 'compile_output': None,
+              'status': {'id': 3, 'description': 'Accepted'}}
+    if random.random() < app.config['TLE_RATE']:
+        result['status'] = {'id': 5, 'description': 'Time Limit Exceeded'}
+        return result
+    if app.config['EXECUTE'] and body.get('language_id') == PYTHON_LANGUAGE_ID:
+        started = time.time()
+        try:
+            completed = subprocess.run([sys.executable, '-c', body.get('source_code', '')],
+                                       input=body.get('stdin') or '', capture_output=True, text=True,
+                                       timeout=body.get('wall_time_limit') or app.config['RUN_TIMEOUT'])
+            result['stdout'] = completed.stdout or None
+            result['stderr'] = completed.stderr or None
+            if completed.returncode:
+                result['status'] = {'id': 11, 'description': 'Runtime Error (NZEC)'}
+        except subprocess.TimeoutExpired:
+            result['status'] = {'id': 5, 'description': 'Time Limit Exceeded'}
+        result['time'] = f"{time.time() - started:.3f}"
+    return result
+
+
+def _enqueue(body):
+    token = uuid.uuid4().hex
+    if app.config['JITTER_DISTRIBUTION'] == 'exponential' and app.config['JITTER']:
+        jitter = random.expovariate(1 / app.config['JITTER'])
+    else:
+        jitter = random.uniform(0, app.config['JITTER'])
+    delay = app.config['LATENCY'] + jitter
+    entry = {'token': token, 'ready_at': time.time() + delay, 'body': body, 'result': None}
+    with submissions_lock:
+        submissions[token] = entry
+    return entry
+
+
+def _view(entry, fields=None):
+    if time.time() < entry['ready_at']:
+        view = {'token': entry['token'], 'stdout': None, 'stderr': None, 'compile_output': None,
+                'status': {'id': 2, 'description': 'Processing'}}
+    else:
+        if entry['result'] is None:
+            entry['result'] = _run(entry['body'])
+        view = dict(entry['result'], token=entry['token'])
+    if fields:
+        wanted = set(fields.split(','))
+        view = {key: value for key, value in view.items() if key in wanted}
+    return view
+
+
+@app.route('/submissions', methods=['POST'])
+def create_submission():
+    failure = _injected_failure()
+    if failure is not None:
+        return failure
+    entry = _enqueue(request.get_json())
+    if request.args.get('wait') == 'true':
+        time.sleep(max(0.0, entry['ready_at'] - time.time()))
+        return jsonify(_view(entry)), 201
+    return jsonify({'token': entry['token']}), 201
+
+
+@app.route('/submissions/<token>', methods=['GET'])
+def get_submission(token):
+    with submissions_lock:
+        entry = submissions.get(token)
+    if entry is None:
+        return jsonify({'error': 'Not found'}), 404
+    return jsonify(_view(entry, request.args.get('fields')))
+
+
+@app.route('/submissions/batch', methods=['POST'])
+def create_batch():
+    failure = _injected_failure()
+    if failure is not None:
+        return failure
+    return jsonify([{'token': _enqueue(body)['token']} for body in request.get_json().get('submissions', [])]), 201
+
+
+@app.route('/submissions/batch', methods=['GET'])
+def get_batch():
+    failure = _injected_failure()
+    if failure is not None:
+        return failure
+    views = []
+    for token in request.args.get('tokens', '').split(','):
+        with submissions_lock:
+            entry = submissions.get(token)
+        views.append(_view(entry, request.args.get('fields')) if entry else None)
+    return jsonify({'submissions': views})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fake Judge0 API server.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=2358)
+    parser.add_argument('--latency', type=float, default=0.0, help="Seconds before a submission finishes")
+    parser.add_argument('--jitter', type=float, default=0.0, help="Extra random latency, seconds (max or mean)")
+    parser.add_argument('--jitter-distribution', choices=['uniform', 'exponential'], default='uniform',
+                        help="uniform in [0, jitter], or exponential with mean jitter")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of calls answered with 500")
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help="Fraction of calls answered with 429")
+    parser.add_argument('--garbage-rate', type=float, default=0.0,
+                        help="Fraction of calls answered with 200 and a body that is not JSON")
+    parser.add_argument('--tle-rate', type=float, default=0.0,
+                        help="Fraction of submissions finishing as Time Limit Exceeded")
+    parser.add_argument('--execute', action='store_true', help="Actually run Python submissions")
+    args = parser.parse_args(argv)
+    app.config.update(LATENCY=args.latency, JITTER=args.jitter, JITTER_DISTRIBUTION=args.jitter_distribution,
+                      ERROR_RATE=args.error_rate, THROTTLE_RATE=args.throttle_rate, GARBAGE_RATE=args.garbage_rate,
+                      TLE_RATE=args.tle_rate, EXECUTE=args.execute)
+    app.run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == '__main__':
+    main()
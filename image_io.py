@@ -0,0 +1,88 @@
+import io
+import os
+import cv2
+import numpy as np
+from PIL import Image
+
+# Memory-bounded image decoding shared by indexing, search and rendering.
+#
+# Images above MAX_DECODE_PIXELS are decoded at reduced resolution: JPEGs go
+# through libjpeg's DCT scaling (IMREAD_REDUCED_*), so a 100-megapixel
+# panorama never materialises at full size; anything still over the cap is
+# area-resized.  Callers get back the scale from original to decoded pixels so
+# face boxes can be stored in original coordinates.
+
+MAX_DECODE_PIXELS = int(os.environ.get('MAX_DECODE_PIXELS', 24_000_000))
+
+# Images larger than this are refused outright, before anything is decoded.
+# PIL's default decompression-bomb bound (~89MP) is below some real photos, so
+# it is raised to cover the largest camera sensors and stitched panoramas, but
+# kept: a tiny file claiming billions of pixels must not reach the decoder.
+MAX_IMAGE_PIXELS = int(os.environ.get('MAX_IMAGE_PIXELS', 200_000_000))
+Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+
+_REDUCED_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+
+# EXIF orientations that turn the image by 90 or 270 degrees
+TRANSPOSING_ORIENTATIONS = (5, 6, 7, 8)
+EXIF_ORIENTATION = 0x0112
+
+
+def image_size(source):
+    """(width, height) as displayed, from the header of a path or an encoded bytes buffer.
+
+    OpenCV applies the EXIF orientation when decoding, so for photos stored
+    on their side this is the stored size transposed.
+    """
+    fp = io.BytesIO(source) if isinstance(source, (bytes, bytearray, memoryview)) else source
+    with Image.open(fp) as img:
+        width, height = img.size
+        if img.getexif().get(EXIF_ORIENTATION) in TRANSPOSING_ORIENTATIONS:
+            return height, width
+        return width, height
+
+
+def _imread(source, flag):
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return cv2.imdecode(np.frombuffer(source, np.uint8), flag)
+    return cv2.imread(source, flag)
+
+
+def decode_image(source, max_pixels=MAX_DECODE_PIXELS, max_side=None):
+    """Decode a path or bytes to BGR within max_pixels, optionally down to ~max_side.
+
+    Returns (array, scale) where scale maps original coordinates to the
+    decoded array; array is None if the image cannot be decoded or is over
+    MAX_IMAGE_PIXELS.
+    """
+    try:
+        width, height = image_size(source)
+    except Image.DecompressionBombError:
+        return None, 1.0
+    except Exception:
+        img = _imread(source, cv2.IMREAD_COLOR)
+        return img, 1.0
+    if width * height > MAX_IMAGE_PIXELS:
+        return None, 1.0
+    factor = 1
+    for candidate in (2, 4, 8):
+        over_cap = max_pixels and (width // factor) * (height // factor) > max_pixels
+        above_side = max_side and max(width, height) // candidate >= max_side
+        if over_cap or above_side:
+            factor = candidate
+    img = _imread(source, _REDUCED_FLAGS[factor])
+    if img is None and factor > 1:
+        img = _imread(source, cv2.IMREAD_COLOR)
+    if img is None:
+        return None, 1.0
+    pixels = img.shape[0] * img.shape[1]
+    if max_pixels and pixels > max_pixels:
+        ratio = (max_pixels / pixels) ** 0.5
+        img = cv2.resize(img, None, fx=ratio, fy=ratio, interpolation=cv2.INTER_AREA)
+    return img, img.shape[1] / width
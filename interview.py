@@ -8,8 +8,10 @@ import tempfile
 from werkzeug.utils import secure_filename
 import PyPDF2
 import docx
+import time
 import random
 import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from dotenv import load_dotenv
 
 # --- LangChain & Groq Imports ---
@@ -34,12 +36,29 @@ os.makedirs(AUDIO_FOLDER, exist_ok=True)
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024
 
+# The LLM calls for a response run concurrently, each kind on its own pool so
+# slow evaluations can never hold up the next question.  The next question is
+# awaited for up to QUESTION_TIMEOUT_SECONDS (then a stock question for the
+# phase is asked); the evaluation is not awaited at all: it is stored in the
+# conversation when it finishes and polled from /evaluation, and one still
+# running after EVALUATION_TIMEOUT_SECONDS gets the fallback score.  Every
+# Groq request gives up after LLM_REQUEST_TIMEOUT_SECONDS, so a hung call
+# frees its worker instead of holding it forever.
+QUESTION_WORKERS = int(os.getenv('LLM_QUESTION_WORKERS', '4'))
+EVALUATION_WORKERS = int(os.getenv('LLM_EVALUATION_WORKERS', '8'))
+QUESTION_TIMEOUT_SECONDS = 15
+EVALUATION_TIMEOUT_SECONDS = 30
+LLM_REQUEST_TIMEOUT_SECONDS = 10
+LLM_MAX_RETRIES = 1
+
 # --- AI & TTS Initialization ---
 try:
     llm = ChatGroq(
         temperature=0.7, 
         model_name="llama3-8b-8192", 
-        api_key=os.getenv("GROK_API_KEY")
+        api_key=os.getenv("GROK_API_KEY"),
+        timeout=LLM_REQUEST_TIMEOUT_SECONDS,
+        max_retries=LLM_MAX_RETRIES
     )
     import pyttsx3
     tts_engine = pyttsx3.init()
@@ -54,6 +73,10 @@ except Exception as e:
     print(f"Error initializing AI or TTS: {e}")
     llm = None
     tts_engine = None
+question_pool = ThreadPoolExecutor(max_workers=QUESTION_WORKERS, thread_name_prefix='llm-question')
+evaluation_pool = ThreadPoolExecutor(max_workers=EVALUATION_WORKERS, thread_name_prefix='llm-evaluation')
+# pyttsx3 engines are not safe to drive from several request threads at once
+tts_lock = threading.Lock()
 
 # --- Interview State Management ---
 interview_sessions = {}
@@ -63,6 +86,14 @@ INTERVIEW_PHASES = {
     'projects': {'name': 'Project Highlights', 'questions_count': 3, 'next_phase': 'experience'},
     'experience': {'name': 'Experience Review', 'questions_count': 2, 'next_phase': 'complete'}
 }
+# Asked when the LLM cannot come up with a follow-up in time
+FALLBACK_QUESTIONS = {
+    'self_intro': "What motivates you in your work, and how has that shaped the path you've taken so far?",
+    'skills': "Which of your skills are you most confident in, and where did you use it most recently?",
+    'projects': "Could you walk me through a project you're proud of and the part you personally owned?",
+    'experience': "Tell me about a difficult situation at work and how you handled it.",
+}
+FALLBACK_EVALUATION = {'score': 78, 'feedback': 'Thank you for your response. Try to include more specific examples next time.'}
 
 
 # --- Resume Parsing (unchanged) ---
@@ -199,15 +230,51 @@ def evaluate_response(user_response, question):
         return evaluation
     except Exception as e:
         print(f"Evaluation parsing error: {e}")
-        return {'score': 78, 'feedback': 'Thank you for your response. Try to include more specific examples next time.'}
+        return dict(FALLBACK_EVALUATION)
+
+def next_question(session, last_user_response):
+    """The follow-up question, or the phase's stock question if the LLM fails or takes too long."""
+    future = question_pool.submit(generate_contextual_question, session, last_user_response)
+    try:
+        return future.result(timeout=QUESTION_TIMEOUT_SECONDS)
+    except FutureTimeoutError:
+        # Not worth starting any more if it is still queued
+        future.cancel()
+        print(f"Question generation timed out after {QUESTION_TIMEOUT_SECONDS}s")
+    except Exception as e:
+        print(f"Question generation error: {e}")
+    return FALLBACK_QUESTIONS[session['current_phase']]
+
+def start_evaluation(entry, question):
+    """Evaluate a response entry in the background; the result is stored in the entry."""
+    entry.update(score=None, feedback=None, evaluation_status='pending', evaluation_started=time.monotonic())
+
+    def store(future):
+        try:
+            evaluation = future.result()
+        except Exception as e:
+            print(f"Evaluation error: {e}")
+            evaluation = FALLBACK_EVALUATION
+        if entry['evaluation_status'] == 'pending':
+            entry.update(score=evaluation['score'], feedback=evaluation['feedback'], evaluation_status='done')
+
+    future = evaluation_pool.submit(evaluate_response, entry['message'], question)
+    future.add_done_callback(store)
+
+def evaluation_view(entry):
+    if entry['evaluation_status'] == 'pending' and \
+            time.monotonic() - entry['evaluation_started'] > EVALUATION_TIMEOUT_SECONDS:
+        entry.update(FALLBACK_EVALUATION, evaluation_status='fallback')
+    return {'status': entry['evaluation_status'], 'score': entry['score'], 'feedback': entry['feedback']}
 
 def text_to_speech(text, session_id):
     if not tts_engine: return None
     try:
         filename = f"hr_{session_id}_{datetime.now().strftime('%Y%m%d%H%M%S')}.mp3"
         filepath = os.path.join(AUDIO_FOLDER, filename)
-        tts_engine.save_to_file(text, filepath)
-        tts_engine.runAndWait()
+        with tts_lock:
+            tts_engine.save_to_file(text, filepath)
+            tts_engine.runAndWait()
         return filename
     except Exception as e:
         print(f"TTS Error: {e}")
@@ -280,12 +347,12 @@ def submit_response():
         return jsonify({'error': 'Empty response'}), 400
 
     session = interview_sessions[session_id]
-    
-    evaluation = evaluate_response(user_response, session['last_question'])
-    
-    session['conversation'].append({
-        'type': 'user', 'message': user_response, 'score': evaluation['score'], 'feedback': evaluation['feedback']
-    })
+
+    # Scoring runs in the background while the next question is generated
+    entry = {'type': 'user', 'message': user_response}
+    session['conversation'].append(entry)
+    response_index = sum(1 for msg in session['conversation'] if msg['type'] == 'user') - 1
+    start_evaluation(entry, session['last_question'])
 
     current_phase_info = INTERVIEW_PHASES[session['current_phase']]
     session['phase_question_count'] += 1
@@ -304,10 +371,10 @@ def submit_response():
             session['current_phase'] = next_phase_key
             session['phase_question_count'] = 0
             # Generate the first question of the new phase
-            hr_response = generate_contextual_question(session, user_response)
+            hr_response = next_question(session, user_response)
     else:
         # Continue in the same phase, generate next question
-        hr_response = generate_contextual_question(session, user_response)
+        hr_response = next_question(session, user_response)
 
     if not interview_complete:
         session['last_question'] = hr_response
@@ -315,13 +382,27 @@ def submit_response():
     
     audio_file = text_to_speech(hr_response, session_id)
 
+    # The score is included if it is ready by now; otherwise poll evaluation_url
+    evaluation = evaluation_view(entry)
     return jsonify({
         'hr_response': hr_response, 'audio_file': audio_file, 'interview_complete': interview_complete,
         'phase': session['current_phase'], 'question_number': get_current_question_number(session),
         'total_questions': calculate_total_questions(), 'response_score': evaluation['score'],
-        'response_feedback': evaluation['feedback'] # We still send this for the UI
+        'response_feedback': evaluation['feedback'], # We still send this for the UI
+        'evaluation_status': evaluation['status'],
+        'evaluation_url': f"/evaluation/{session_id}/{response_index}",
     })
 
+@app.route('/evaluation/<session_id>/<int:response_index>')
+def get_evaluation(session_id, response_index):
+    session = interview_sessions.get(session_id)
+    if session is None:
+        return jsonify({'error': 'Invalid session'}), 400
+    responses = [msg for msg in session['conversation'] if msg['type'] == 'user']
+    if response_index >= len(responses):
+        return jsonify({'error': 'Response not found'}), 404
+    return jsonify(evaluation_view(responses[response_index]))
+
 @app.route('/get-audio/<filename>')
 def get_audio(filename):
     try:
@@ -0,0 +1,250 @@
+import os
+import json
+import time
+import uuid
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Asynchronous execution jobs for coding.py.
+#
+# A job is created by POST and returns at once; a bounded thread pool runs it
+# and appends events (status changes, one per test-case result, and a final
+# "done" carrying the same body the synchronous endpoint would have returned).
+# Clients poll the job or follow its events over Server-Sent Events.
+#
+# Every job is two files under the jobs directory, so any worker process can
+# serve its status and a restarted worker re-queues the jobs that were still
+# queued or running: <id>.json holds everything but the events and is
+# rewritten atomically when the status changes, and <id>.events.jsonl gets
+# one line appended per event, so a job with many test cases costs O(1) I/O
+# per event.  Each job records the host and pid running it; only jobs whose
+# process is gone are taken over, so sibling workers sharing the directory do
+# not run them twice.  Jobs that finished more than ttl ago are deleted every
+# sweep_interval seconds.
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+FINISHED = (DONE, FAILED)
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class JobStore:
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, job_id):
+        return os.path.join(self.root, f"{job_id}.json")
+
+    def _events_path(self, job_id):
+        return os.path.join(self.root, f"{job_id}.events.jsonl")
+
+    def save(self, job):
+        """Write everything but the job's events."""
+        path = self._path(job['id'])
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({key: value for key, value in job.items() if key != 'events'}, f, separators=(',', ':'))
+        os.replace(tmp_path, path)
+
+    def append_event(self, job_id, event):
+        with open(self._events_path(job_id), 'a') as f:
+            f.write(json.dumps(event, separators=(',', ':')) + '\n')
+
+    def _load_events(self, job_id):
+        try:
+            with open(self._events_path(job_id), 'r') as f:
+                lines = f.read().split('\n')
+        except OSError:
+            return []
+        # The last element is '' or a line still being written
+        return [json.loads(line) for line in lines[:-1]]
+
+    def load(self, job_id):
+        # Ids are generated by uuid4().hex; anything else is not a job
+        if not job_id.isalnum():
+            return None
+        try:
+            with open(self._path(job_id), 'r') as f:
+                job = json.load(f)
+            job['events'] = self._load_events(job_id)
+        except (OSError, ValueError):
+            return None
+        return job
+
+    def all(self):
+        for name in os.listdir(self.root):
+            if name.endswith('.json'):
+                job = self.load(name[:-len('.json')])
+                if job is not None:
+                    yield job
+
+    def delete(self, job_id):
+        for path in (self._path(job_id), self._events_path(job_id)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+class JobManager:
+    """Runs jobs of registered kinds on a bounded pool; handler(request, emit) -> (body, http_status)."""
+
+    def __init__(self, store, handlers, workers=8, max_pending=500, ttl=24 * 3600, sweep_interval=600):
+        self.store = store
+        self.handlers = handlers
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='job')
+        self._jobs = {}
+        self._pending = 0
+        self._changed = threading.Condition()
+        self.worker = f"{socket.gethostname()}:{os.getpid()}"
+        if sweep_interval:
+            threading.Thread(target=self._sweep, args=(sweep_interval,), daemon=True, name='job-sweeper').start()
+
+    @property
+    def pending(self):
+        with self._changed:
+            return self._pending
+
+    def _append(self, job, event):
+        with self._changed:
+            event = dict(event, id=len(job['events']))
+            job['events'].append(event)
+            job['updated_at'] = time.time()
+            self.store.append_event(job['id'], event)
+            # Status changes (and the result, with 'done') also go to the job file
+            if event['type'] in ('status', 'done'):
+                self.store.save(job)
+            self._changed.notify_all()
+
+    def submit(self, kind, request, owner=None):
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind '{kind}'")
+        with self._changed:
+            if self._pending >= self.max_pending:
+                raise JobQueueFull(f"{self._pending} jobs already pending")
+            self._pending += 1
+        now = time.time()
+        job = {
+            'id': uuid.uuid4().hex,
+            'kind': kind,
+            'owner': owner,
+            'worker': self.worker,
+            'status': QUEUED,
+            'created_at': now,
+            'updated_at': now,
+            'request': request,
+            'events': [],
+            'result': None,
+            'http_status': None,
+        }
+        self._enqueue(job)
+        return job
+
+    def _enqueue(self, job):
+        with self._changed:
+            self._jobs[job['id']] = job
+        self._append(job, {'type': 'status', 'status': QUEUED})
+        self._pool.submit(self._run, job)
+
+    def _run(self, job):
+        job['status'] = RUNNING
+        self._append(job, {'type': 'status', 'status': RUNNING})
+        try:
+            body, http_status = self.handlers[job['kind']](job['request'], lambda event: self._append(job, event))
+            job['status'] = DONE
+        except Exception as e:
+            body, http_status = {'error': f'Error executing code: {str(e)}'}, 500
+            job['status'] = FAILED
+        job['result'], job['http_status'] = body, http_status
+        self._append(job, {'type': 'done', 'status': job['status'], 'result': body, 'http_status': http_status})
+        with self._changed:
+            self._pending -= 1
+            self._jobs.pop(job['id'], None)
+
+    def get(self, job_id):
+        with self._changed:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                return json.loads(json.dumps(job))
+        return self.store.load(job_id)
+
+    def wait_for_events(self, job_id, after, timeout=15.0):
+        """(events with id > after, finished), blocking up to timeout for new events.
+
+        Returns None if the job is unknown.
+
+        Jobs run by this process wake the waiter directly; jobs run by another
+        worker process are picked up by re-reading their file.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            job = self.get(job_id)
+            if job is None:
+                return None
+            events = job['events'][after + 1:]
+            remaining = deadline - time.monotonic()
+            finished = job['status'] in FINISHED
+            if events or finished or remaining <= 0:
+                return events, finished
+            with self._changed:
+                self._changed.wait(min(remaining, 0.5))
+
+    def _abandoned(self, job):
+        host, _, pid = (job.get('worker') or '').rpartition(':')
+        if host != socket.gethostname() or not pid.isdigit():
+            # Another host's worker: only its own restart can tell whether it died
+            return False
+        if int(pid) == os.getpid():
+            return job['id'] not in self._jobs
+        try:
+            os.kill(int(pid), 0)
+        except ProcessLookupError:
+            return True
+        except PermissionError:
+            return False
+        return False
+
+    def expire(self):
+        """Delete finished jobs last updated more than ttl ago; returns how many."""
+        expired = 0
+        for job in self.store.all():
+            if job['status'] in FINISHED and time.time() - job['updated_at'] > self.ttl:
+                self.store.delete(job['id'])
+                expired += 1
+        return expired
+
+    def _sweep(self, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                self.expire()
+            except OSError:
+                # e.g. the directory briefly unavailable; try again next time
+                pass
+
+    def resume(self):
+        """Re-queue jobs left queued or running by a dead process on this host; drop expired ones."""
+        resumed = 0
+        for job in self.store.all():
+            if time.time() - job['updated_at'] > self.ttl:
+                self.store.delete(job['id'])
+                continue
+            if job['status'] in FINISHED or not self._abandoned(job):
+                continue
+            with self._changed:
+                self._pending += 1
+            job['status'] = QUEUED
+            job['worker'] = self.worker
+            self._append(job, {'type': 'status', 'status': 'restarted'})
+            self._enqueue(job)
+            resumed += 1
+        return resumed
@@ -0,0 +1,204 @@
+import time
+import random
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from metrics import MetricsRegistry
+
+# Shared HTTP client for the Judge0 API.
+#
+# One requests.Session per client keeps TLS connections alive across runs
+# (pool_size connections per host), every call has connect and read timeouts,
+# 429 and 5xx responses and connection errors are retried a bounded number of
+# times with full-jitter exponential backoff (honouring Retry-After) within a
+# total time budget per call, and a circuit breaker fails calls fast while
+# Judge0 keeps failing instead of tying up a worker per request.
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class Judge0Error(Exception):
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class CircuitOpenError(Judge0Error):
+    pass
+
+
+class CircuitBreaker:
+    """Opens after failure_threshold consecutive failures, for reset_timeout seconds.
+
+    Once the timeout passes a single trial call is let through (half-open); its
+    success closes the breaker and its failure opens it again.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return 'closed'
+            if time.monotonic() - self._opened_at >= self.reset_timeout:
+                return 'half_open'
+            return 'open'
+
+    def allow(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_timeout or self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_in_flight or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+
+class Judge0Client:
+    def __init__(self, base_url, headers=None, connect_timeout=3.05, read_timeout=30.0,
+                 max_retries=3, backoff=0.25, max_backoff=4.0, pool_size=20,
+                 breaker=None, registry=None, total_timeout=45.0):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = (connect_timeout, read_timeout)
+        # Budget for one call, all attempts and backoff included
+        self.total_timeout = total_timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.breaker = breaker or CircuitBreaker()
+        self.session = requests.Session()
+        self.session.headers.update(headers or {})
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self.registry = registry or MetricsRegistry()
+        self.request_seconds = self.registry.histogram(
+            'judge0_request_seconds', 'Judge0 HTTP request latency, per attempt.', ['endpoint'])
+        self.requests_total = self.registry.counter(
+            'judge0_requests_total', 'Judge0 calls by final outcome.', ['endpoint', 'outcome'])
+        self.retries_total = self.registry.counter(
+            'judge0_retries_total', 'Judge0 attempts retried after a 429/5xx or connection error.', ['endpoint'])
+        self.registry.gauge(
+            'judge0_circuit_open', 'Whether the Judge0 circuit breaker is rejecting calls.',
+            callback=lambda: 1 if self.breaker.state == 'open' else 0)
+
+    def _sleep_before_retry(self, attempt, response, deadline):
+        """Back off before another attempt; False if that would run past deadline."""
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * (2 ** attempt)))
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after:
+            try:
+                delay = max(delay, min(float(retry_after), self.max_backoff))
+            except ValueError:
+                pass
+        if time.monotonic() + delay >= deadline:
+            return False
+        time.sleep(delay)
+        return True
+
+    def _attempts(self, method, url, endpoint, kwargs):
+        """(last response, last connection error) after retrying within the call's time budget."""
+        connect_timeout, read_timeout = kwargs.pop('timeout', self.timeout)
+        deadline = time.monotonic() + self.total_timeout
+        response = error = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                if not self._sleep_before_retry(attempt - 1, response, deadline):
+                    break
+                self.retries_total.inc(endpoint=endpoint)
+            response = error = None
+            # A wait=true POST can hang for the whole read timeout; never past the budget
+            timeout = (connect_timeout, max(0.001, min(read_timeout, deadline - time.monotonic())))
+            try:
+                with self.request_seconds.time(endpoint=endpoint):
+                    response = self.session.request(method, url, timeout=timeout, **kwargs)
+            except requests.RequestException as e:
+                # Connection errors, timeouts, and bodies cut off mid-transfer
+                error = e
+                continue
+            if response.status_code not in RETRY_STATUSES:
+                break
+        return response, error
+
+    def request(self, method, path, endpoint=None, **kwargs):
+        """JSON body of a Judge0 call, retried on 429/5xx; raises Judge0Error.
+
+        Retrying a POST can queue a submission twice if Judge0 accepted it but
+        failed to answer; for stateless code runs that only costs capacity.
+        Every call that gets past the breaker records exactly one outcome with
+        it, so a half-open trial always resolves.
+        """
+        endpoint = endpoint or path
+        if not self.breaker.allow():
+            self.requests_total.inc(endpoint=endpoint, outcome='circuit_open')
+            raise CircuitOpenError("Judge0 is unavailable (circuit open), try again shortly", status_code=503)
+        try:
+            response, error = self._attempts(method, self.base_url + path, endpoint, kwargs)
+            body = response.json() if error is None and response.status_code in (200, 201) else None
+        except ValueError as e:
+            # requests' JSONDecodeError: Judge0 answered, but not with JSON
+            self.breaker.record_failure()
+            self.requests_total.inc(endpoint=endpoint, outcome='invalid_response')
+            raise Judge0Error(f"Judge0 returned an invalid response: {e}")
+        except BaseException:
+            self.breaker.record_failure()
+            self.requests_total.inc(endpoint=endpoint, outcome='error')
+            raise
+        if error is not None:
+            self.breaker.record_failure()
+            self.requests_total.inc(endpoint=endpoint, outcome='connection_error')
+            raise Judge0Error(f"Judge0 request failed: {error}")
+        if response.status_code >= 500:
+            self.breaker.record_failure()
+        else:
+            # A 429 or 4xx means Judge0 is up and answering
+            self.breaker.record_success()
+        if response.status_code not in (200, 201):
+            self.requests_total.inc(endpoint=endpoint, outcome=str(response.status_code))
+            raise Judge0Error(f"Judge0 API error: {response.text}", status_code=response.status_code)
+        self.requests_total.inc(endpoint=endpoint, outcome='ok')
+        return body
+
+    def submit(self, source_code, language_id, stdin=None, **fields):
+        """Run one program synchronously (wait=true) and return Judge0's result.
+
+        fields are further submission fields, e.g. cpu_time_limit.
+        """
+        body = dict(fields, source_code=source_code, language_id=language_id)
+        if stdin is not None:
+            body['stdin'] = stdin
+        return self.request('POST', '/submissions', endpoint='submit',
+                            params={'base64_encoded': 'false', 'wait': 'true'}, json=body)
+
+    def submit_batch(self, submissions):
+        """Queue several submissions; returns Judge0's [{'token': ...}, ...] list."""
+        return self.request('POST', '/submissions/batch', endpoint='submit_batch',
+                            params={'base64_encoded': 'false'}, json={'submissions': submissions})
+
+    def get_batch(self, tokens, fields):
+        return self.request('GET', '/submissions/batch', endpoint='get_batch', params={
+            'tokens': ','.join(tokens),
+            'base64_encoded': 'false',
+            'fields': fields,
+        }).get('submissions', [])
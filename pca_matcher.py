@@ -0,0 +1,160 @@
+import os
+import json
+import hashlib
+import threading
+import numpy as np
+from embedding_store import best_faces_per_file
+
+# Two-stage matcher: a cheap first pass over PCA-reduced embeddings, then exact
+# 512-d cosine re-ranking of the survivors.
+#
+# The projection is an orthonormal basis W (k x 512) fitted once per deployment
+# on stored embeddings.  For unit vectors x and q, split into the part inside
+# the subspace and a residual,
+#
+#     x.q = (Wx).(Wq) + r_x.r_q   and   |r_x.r_q| <= |r_x| |r_q|
+#
+# so keeping every row with (Wx).(Wq) + |r_x| |r_q| above the similarity
+# cut-off never drops a true match.  Each user's reduced matrix stores Wx plus
+# |r_x| as an extra column, next to the full matrix in CACHE_FOLDER.  margin < 1
+# shrinks the residual allowance, trading guaranteed recall for a smaller
+# candidate set.
+
+PCA_FILENAME = 'pca.npz'
+# Slack for float32 rounding in the bound
+BOUND_EPSILON = 1e-4
+
+
+class PCAProjection:
+    def __init__(self, components):
+        self.components = np.ascontiguousarray(components, dtype=np.float32)
+        self.fingerprint = hashlib.md5(self.components.tobytes()).hexdigest()[:12]
+
+    @property
+    def dims(self):
+        return self.components.shape[0]
+
+    @classmethod
+    def fit(cls, samples, dims):
+        """Top `dims` right singular vectors of the (uncentred) sample matrix."""
+        samples = np.asarray(samples, dtype=np.float32)
+        if samples.shape[0] < dims:
+            raise ValueError(f"Need at least {dims} embeddings to fit a {dims}-d projection, got {samples.shape[0]}")
+        _, _, vt = np.linalg.svd(samples, full_matrices=False)
+        return cls(vt[:dims])
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data['components'])
+
+    def save(self, path):
+        tmp_path = path + '.tmp.npz'
+        np.savez(tmp_path, components=self.components)
+        os.replace(tmp_path, path)
+
+    def project(self, vectors):
+        """Rows of [W x, |r_x|] for unit-norm rows x."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        reduced = vectors @ self.components.T
+        residual = np.sqrt(np.maximum(0.0, 1.0 - np.einsum('ij,ij->i', reduced, reduced)))
+        return np.hstack([reduced, residual[:, None]]).astype(np.float32)
+
+    def explained_energy(self, vectors):
+        reduced = np.asarray(vectors, dtype=np.float32) @ self.components.T
+        return float(np.mean(np.einsum('ij,ij->i', reduced, reduced)))
+
+
+def sample_embeddings(store, usernames, max_rows, seed=0):
+    """Uniform sample of up to max_rows stored embeddings across users."""
+    rng = np.random.default_rng(seed)
+    views = [view for view in (store.open(username) for username in usernames) if view is not None and len(view)]
+    total = sum(len(view) for view in views)
+    parts = []
+    for view in views:
+        take = len(view) if total <= max_rows else int(round(max_rows * len(view) / total))
+        if take:
+            rows = np.sort(rng.choice(len(view), size=min(take, len(view)), replace=False))
+            parts.append(np.asarray(view.vectors[rows]))
+    return np.concatenate(parts) if parts else np.empty((0, store.dim), dtype=np.float32)
+
+
+class TwoStageMatcher:
+    def __init__(self, store, projection, margin=1.0, max_survivor_fraction=0.25, chunk_rows=65536):
+        self.store = store
+        self.projection = projection
+        self.margin = margin
+        self.max_survivor_fraction = max_survivor_fraction
+        self.chunk_rows = chunk_rows
+        self._reduced = {}
+        self._lock = threading.Lock()
+
+    def _paths(self, username):
+        base = os.path.join(self.store.user_dir(username), f"reduced-{self.projection.fingerprint}")
+        return base + '.f32', base + '.json'
+
+    def reduced_for(self, username, view):
+        """Memory-mapped [W x, |r_x|] rows for view, extended or rebuilt as the store changes."""
+        key = (username, view.version)
+        with self._lock:
+            cached = self._reduced.get(key)
+        if cached is not None:
+            return cached
+        width = self.projection.dims + 1
+        data_path, meta_path = self._paths(username)
+        generation = view.meta.get('generation')
+        with self.store.user_lock(username):
+            try:
+                with open(meta_path, 'r') as f:
+                    meta = json.load(f)
+            except (OSError, ValueError):
+                meta = None
+            # Appends keep the store's generation, so existing reduced rows stay
+            # valid; a full rewrite starts a new one and the reduced rows are rebuilt.
+            valid = meta and generation is not None and meta.get('generation') == generation
+            done = meta['count'] if valid and meta['count'] <= len(view) else 0
+            if done < len(view):
+                with open(data_path, 'ab') as f:
+                    f.truncate(done * width * 4)
+                    for start in range(done, len(view), self.chunk_rows):
+                        self.projection.project(view.vectors[start:start + self.chunk_rows]).tofile(f)
+                    f.flush()
+                    os.fsync(f.fileno())
+                tmp_path = meta_path + '.tmp'
+                with open(tmp_path, 'w') as f:
+                    json.dump({'generation': generation, 'count': len(view)}, f)
+                os.replace(tmp_path, meta_path)
+        if len(view):
+            reduced = np.memmap(data_path, dtype=np.float32, mode='r', shape=(len(view), width))
+        else:
+            reduced = np.empty((0, width), dtype=np.float32)
+        with self._lock:
+            self._reduced = {k: v for k, v in self._reduced.items() if k[0] != username}
+            self._reduced[key] = reduced
+        return reduced
+
+    def candidates(self, reduced, query, threshold, rows=None):
+        """Rows whose similarity upper bound clears the 1 - threshold cut-off."""
+        q = np.asarray(query, dtype=np.float32).ravel()
+        q = q / np.linalg.norm(q)
+        pq = self.projection.components @ q
+        rq = float(np.sqrt(max(0.0, 1.0 - float(pq @ pq))))
+        dims = self.projection.dims
+        block = reduced if rows is None else reduced[rows]
+        upper = block[:, :dims] @ pq + block[:, dims] * (rq * self.margin) + BOUND_EPSILON
+        keep = np.nonzero(upper > 1.0 - threshold)[0]
+        return keep if rows is None else np.asarray(rows)[keep]
+
+    def best_faces_per_file(self, username, view, query, threshold, rows=None):
+        """Drop-in for embedding_store.best_faces_per_file using the two-stage scan."""
+        if len(view) == 0:
+            return []
+        reduced = self.reduced_for(username, view)
+        survivors = self.candidates(reduced, query, threshold, rows)
+        if survivors.size == 0:
+            return []
+        scope = len(view) if rows is None else len(rows)
+        if survivors.size > scope * self.max_survivor_fraction:
+            # Gathering most rows costs more than streaming them: scan the scope exactly.
+            return best_faces_per_file(view, query, threshold, rows=rows)
+        return best_faces_per_file(view, query, threshold, rows=survivors)
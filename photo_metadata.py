@@ -0,0 +1,34 @@
+from datetime import datetime
+from PIL import Image
+
+# EXIF tags read at upload time and stored on photos_collection for search filters.
+EXIF_IFD = 0x8769
+TAG_DATETIME = 306
+TAG_MAKE = 271
+TAG_MODEL = 272
+TAG_DATETIME_ORIGINAL = 36867
+
+
+def _parse_exif_datetime(value):
+    if not value:
+        return None
+    try:
+        return datetime.strptime(str(value).strip('\x00 '), '%Y:%m:%d %H:%M:%S')
+    except ValueError:
+        return None
+
+
+def extract_photo_metadata(img_path):
+    """Capture time, camera and dimensions of an image, read from its header only."""
+    metadata = {"taken_at": None, "camera": None, "width": None, "height": None}
+    try:
+        with Image.open(img_path) as img:
+            metadata["width"], metadata["height"] = img.size
+            exif = img.getexif()
+            taken_at = exif.get_ifd(EXIF_IFD).get(TAG_DATETIME_ORIGINAL) or exif.get(TAG_DATETIME)
+            metadata["taken_at"] = _parse_exif_datetime(taken_at)
+            camera = " ".join(str(exif[tag]).strip('\x00 ') for tag in (TAG_MAKE, TAG_MODEL) if exif.get(tag))
+            metadata["camera"] = camera or None
+    except Exception as e:
+        print(f"Error reading metadata for {img_path}: {str(e)}")
+    return metadata
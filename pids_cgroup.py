@@ -0,0 +1,86 @@
+import os
+import time
+import uuid
+import signal
+
+# Per-program process limits for LocalExecutor.
+#
+# RLIMIT_NPROC cannot bound one program: it counts every task (threads too)
+# of the program's uid, which for programs run as the server's own user
+# includes the server's threads.  Instead each program runs in its own child
+# of a pids cgroup the server may write to -- a cgroup v2 directory with the
+# pids controller delegated (e.g. a systemd unit with Delegate=yes), or a
+# directory in the v1 pids hierarchy -- whose pids.max caps the processes and
+# threads of that program alone.  The program joins its cgroup between fork
+# and exec, so everything it starts is counted, and is killed with it when
+# the program is done, even processes that left its session.
+
+# How long remove() waits for killed tasks to leave the cgroup
+REMOVE_TIMEOUT_SECONDS = 1
+
+
+class PidsCgroups:
+    """Per-program cgroups under parent, each capped at max_processes tasks."""
+
+    def __init__(self, parent, max_processes):
+        self.parent = parent
+        self.max_processes = max_processes
+        try:
+            # cgroup v2: children only get pids.max once the controller is enabled for them
+            with open(os.path.join(parent, 'cgroup.subtree_control'), 'w') as f:
+                f.write('+pids')
+        except OSError:
+            pass
+        try:
+            self.remove(self.create())
+        except OSError as e:
+            raise ValueError(f"{parent} is not a writable pids cgroup: {e}") from e
+
+    def create(self):
+        """Path of a new cgroup with pids.max set."""
+        path = os.path.join(self.parent, f"run-{uuid.uuid4().hex}")
+        os.mkdir(path)
+        try:
+            with open(os.path.join(path, 'pids.max'), 'w') as f:
+                f.write(str(self.max_processes))
+        except OSError:
+            os.rmdir(path)
+            raise
+        return path
+
+    @staticmethod
+    def join(path):
+        """Move the calling process into the cgroup at path; for preexec_fn."""
+        with open(os.path.join(path, 'cgroup.procs'), 'w') as f:
+            f.write(str(os.getpid()))
+
+    def remove(self, path):
+        """Kill whatever is left in the cgroup at path and delete it."""
+        try:
+            # cgroup v2 on Linux 5.14+ kills the whole cgroup atomically
+            with open(os.path.join(path, 'cgroup.kill'), 'w') as f:
+                f.write('1')
+        except OSError:
+            pass
+        deadline = time.monotonic() + REMOVE_TIMEOUT_SECONDS
+        while True:
+            try:
+                with open(os.path.join(path, 'cgroup.procs'), 'r') as f:
+                    pids = [int(line) for line in f.read().split()]
+            except FileNotFoundError:
+                return
+            for pid in pids:
+                try:
+                    os.kill(pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+            try:
+                os.rmdir(path)
+                return
+            except FileNotFoundError:
+                return
+            except OSError:
+                # Busy until the killed tasks have exited
+                if time.monotonic() > deadline:
+                    return
+            time.sleep(0.01)
@@ -0,0 +1,349 @@
+import os
+import re
+import json
+from complexity import GENERATORS
+
+# Coding questions as data.
+#
+# Each question is a JSON document (a file under questions/, or a document in
+# a Mongo collection with the same shape):
+#
+#   {
+#     "id": 3,
+#     "title": "Two Sum",
+#     "params": [{"name": "nums", "type": "int[]"}, {"name": "target", "type": "int"}],
+#     "returns": "int[]",
+#     "templates": {"python": "print(Solution().twoSum(nums, target))", ...},
+#     "example": {"input": {"nums": [2, 7, 11, 15], "target": 9}, "expected": [0, 1]},
+#     "tests": [{"input": {...}, "expected": ...}, ...],
+#     "suite": "two-sum.suite.jsonl",
+#     "time_limit_ms": 2000,
+#     "reference": {"language": "python", "code": "class Solution: ..."},
+#     "complexity": {"generator": "two_sum", "sizes": [1000, 10000, 100000, 1000000],
+#                    "time_limit_ms": 5000, "references": {"cpp": "class Solution { ... };"}}
+#   }
+#
+# templates hold, per language, the statements that run one test case and
+# print its result.  The harness has already declared each parameter as a
+# variable of that name (plus `<name>_length` for arrays in C), read from
+# stdin, where every argument travels as whitespace-separated integers: an int
+# as itself, an array or string as its length followed by its elements (or
+# character codes).  The program text therefore never depends on the test
+# data.
+#
+# tests are run on every submission.  suite names a JSON Lines file of further
+# {"input", "expected"} cases next to the question file, streamed in chunks
+# rather than loaded; questions loaded from Mongo stream theirs from a tests
+# collection instead.  time_limit_ms is the limit for each case.
+#
+# complexity, when present, allows complexity grading (see complexity.py): the
+# generator from complexity.GENERATORS builds an input of each size, which
+# the solution must handle within the complexity time_limit_ms.  Solutions are
+# compared with references[language] when there is one, else with reference.
+
+PLACEHOLDER = re.compile(r"\{\{(\w+)\}\}")
+INT_MIN, INT_MAX = -2 ** 31, 2 ** 31 - 1
+DEFAULT_TIME_LIMIT_MS = 2000
+DEFAULT_COMPLEXITY_TIME_LIMIT_MS = 5000
+
+
+class InvalidQuestion(ValueError):
+    pass
+
+
+class InvalidInput(ValueError):
+    pass
+
+
+class CompiledTemplate:
+    """A template split once into literal text and {{placeholder}} names."""
+
+    def __init__(self, text):
+        self.text = text
+        parts = PLACEHOLDER.split(text)
+        # Even indices are literal text, odd indices placeholder names
+        self.parts = parts
+        self.names = set(parts[1::2])
+
+    def render(self, values):
+        parts = self.parts[:]
+        for i in range(1, len(parts), 2):
+            parts[i] = values[parts[i]]
+        return ''.join(parts)
+
+
+def compile_template(text):
+    return CompiledTemplate(text)
+
+
+class IntType:
+    name = 'int'
+    # Declarations of a parameter read from stdin by the harness helpers
+    declarations = {
+        'python': "{name} = harness_int()",
+        'javascript': "const {name} = harnessInt();",
+        'java': "int {name} = harnessInt();",
+        'cpp': "int {name} = harnessInt();",
+        'c': "int {name} = harness_int();",
+    }
+    releases = {}
+
+    def parse(self, text):
+        if text.lower() in ('undefined', 'null', 'nan'):
+            raise InvalidInput("Inputs must be integers, not undefined/null/NaN")
+        try:
+            return self.validate(int(text))
+        except ValueError:
+            raise InvalidInput(f"Expected an integer, got '{text}'")
+
+    def validate(self, value):
+        if not isinstance(value, int) or isinstance(value, bool):
+            raise InvalidInput(f"Expected an integer, got {value!r}")
+        if not INT_MIN <= value <= INT_MAX:
+            raise InvalidInput(f"{value} does not fit in a 32-bit integer")
+        return value
+
+    def encode(self, value):
+        return str(value)
+
+    def format(self, value):
+        return str(value)
+
+
+class StringType:
+    name = 'string'
+    declarations = {
+        'python': "{name} = harness_string()",
+        'javascript': "const {name} = harnessString();",
+        'java': "String {name} = harnessString();",
+        'cpp': "std::string {name} = harnessString();",
+        'c': "char* {name} = harness_string();",
+    }
+    releases = {'c': "free({name});"}
+
+    def parse(self, text):
+        return self.validate(text)
+
+    def validate(self, value):
+        # Characters travel as single bytes, which C and C++ read into char
+        if not isinstance(value, str) or not value.isascii():
+            raise InvalidInput("Input must be printable ASCII characters")
+        return value
+
+    def encode(self, value):
+        return ' '.join([str(len(value))] + [str(ord(char)) for char in value])
+
+    def format(self, value):
+        return value
+
+
+class IntArrayType:
+    name = 'int[]'
+    declarations = {
+        'python': "{name} = harness_int_array()",
+        'javascript': "const {name} = harnessIntArray();",
+        'java': "int[] {name} = harnessIntArray();",
+        'cpp': "std::vector<int> {name} = harnessIntArray();",
+        'c': "int {name}_length; int* {name} = harness_int_array(&{name}_length);",
+    }
+    releases = {'c': "free({name});"}
+
+    def parse(self, text):
+        try:
+            value = json.loads(text)
+        except ValueError:
+            raise InvalidInput("Invalid JSON for integer array")
+        return self.validate(value)
+
+    def validate(self, value):
+        if not isinstance(value, list) or not all(isinstance(n, int) and not isinstance(n, bool) for n in value):
+            raise InvalidInput("Expected an array of integers")
+        if value and not INT_MIN <= min(value) <= max(value) <= INT_MAX:
+            raise InvalidInput("Array elements must fit in 32-bit integers")
+        return value
+
+    def encode(self, value):
+        return ' '.join([str(len(value))] + [str(n) for n in value])
+
+    def format(self, value):
+        return json.dumps(value)
+
+
+TYPES = {value_type.name: value_type for value_type in (IntType(), StringType(), IntArrayType())}
+
+
+def _split_values(text):
+    """Split on commas and whitespace outside brackets and quotes: '[1, 2], 9' -> ['[1, 2]', '9']."""
+    values, current, depth, quote = [], [], 0, None
+    for char in text:
+        if quote:
+            quote = None if char == quote else quote
+        elif char in '"\'':
+            quote = char
+        elif char in '[{(':
+            depth += 1
+        elif char in ']})':
+            depth -= 1
+        elif depth == 0 and (char == ',' or char.isspace()):
+            if current:
+                values.append(''.join(current))
+                current = []
+            continue
+        current.append(char)
+    if current:
+        values.append(''.join(current))
+    return values
+
+
+class Question:
+    def __init__(self, document, folder=None, tests_collection=None):
+        try:
+            self.id = document['id']
+            self.title = document.get('title', str(self.id))
+            self.params = [(param['name'], TYPES[param['type']]) for param in document['params']]
+            self.returns = TYPES[document['returns']]
+            self.templates = dict(document['templates'])
+        except KeyError as e:
+            raise InvalidQuestion(f"Question {document.get('id')!r}: missing or unknown {e}")
+        self.reference = document.get('reference')
+        self.time_limit = document.get('time_limit_ms', DEFAULT_TIME_LIMIT_MS) / 1000
+        self._keyword = re.compile(r"(?:^|,)\s*(" + '|'.join(re.escape(name) for name, _ in self.params) + r")\s*=\s*")
+        try:
+            self.example = self._case(document['example'])
+            self.tests = [self._case(test) for test in document.get('tests', [])]
+        except (KeyError, InvalidInput) as e:
+            raise InvalidQuestion(f"Question {self.id!r}: invalid test case: {e}")
+        self.suite_path = None
+        self.tests_collection = tests_collection
+        if document.get('suite'):
+            if folder is None:
+                raise InvalidQuestion(f"Question {self.id!r}: a suite file needs a questions folder")
+            self.suite_path = os.path.join(folder, document['suite'])
+        self.test_count = len(self.tests) + self._suite_count()
+        self.complexity = self._complexity(document.get('complexity'))
+
+    def _complexity(self, config):
+        if config is None:
+            return None
+        sizes = config.get('sizes') or []
+        if config.get('generator') not in GENERATORS:
+            raise InvalidQuestion(f"Question {self.id!r}: unknown complexity generator {config.get('generator')!r}")
+        if not all(isinstance(size, int) and size > 1 for size in sizes):
+            raise InvalidQuestion(f"Question {self.id!r}: complexity sizes must be integers above 1")
+        return {
+            'generator': config['generator'],
+            'sizes': sorted(set(sizes)),
+            'time_limit': config.get('time_limit_ms', DEFAULT_COMPLEXITY_TIME_LIMIT_MS) / 1000,
+            'references': dict(config.get('references', {})),
+        }
+
+    def _case(self, test):
+        """(args tuple, expected output text) from a stored test case."""
+        args = tuple(value_type.validate(test['input'][name]) for name, value_type in self.params)
+        return args, self.returns.format(test['expected'])
+
+    def _suite_count(self):
+        if self.suite_path is not None:
+            with open(self.suite_path, 'rb') as f:
+                return sum(1 for line in f if line.strip())
+        if self.tests_collection is not None:
+            return self.tests_collection.count_documents({'question_id': self.id})
+        return 0
+
+    def iter_tests(self):
+        """Every (args, expected) case: tests, then the suite, read lazily."""
+        yield from self.tests
+        if self.suite_path is not None:
+            with open(self.suite_path, 'r') as f:
+                for number, line in enumerate(f, 1):
+                    if not line.strip():
+                        continue
+                    try:
+                        yield self._case(json.loads(line))
+                    except (KeyError, ValueError) as e:
+                        raise InvalidQuestion(f"{self.suite_path}:{number}: invalid test case: {e}")
+        elif self.tests_collection is not None:
+            for test in self.tests_collection.find({'question_id': self.id}, {'_id': 0}).sort('index', 1):
+                yield self._case(test)
+
+    def supports(self, language):
+        return language in self.templates
+
+    def complexity_reference(self, language):
+        """{'language', 'code'} of the solution to compare a language's submissions with, or None."""
+        if self.complexity and language in self.complexity['references']:
+            return {'language': language, 'code': self.complexity['references'][language]}
+        return self.reference
+
+    def parse_input(self, text):
+        """Argument tuple from a candidate-typed test case, e.g. 'nums = [2,7], target = 9' or '2 3'."""
+        text = text.strip()
+        if len(self.params) == 1 and isinstance(self.params[0][1], StringType):
+            # The whole input is the string
+            return (self.params[0][1].parse(text),)
+        if self._keyword.match(text):
+            parts = self._keyword.split(text)
+            named = {parts[i]: parts[i + 1].strip().rstrip(',').strip() for i in range(1, len(parts), 2)}
+            texts = [named.get(name) for name, _ in self.params]
+        else:
+            texts = _split_values(text)
+        if len(texts) != len(self.params) or None in texts:
+            expected = ', '.join(f"{name} ({value_type.name})" for name, value_type in self.params)
+            raise InvalidInput(f"Expected {expected}")
+        return tuple(value_type.parse(value) for (_, value_type), value in zip(self.params, texts))
+
+    def encode(self, args):
+        """One case as harness stdin: a line of integers per argument."""
+        return ''.join(value_type.encode(value) + '\n' for (_, value_type), value in zip(self.params, args))
+
+    def declarations(self, language):
+        """Statements declaring each argument, read from stdin, in language."""
+        return '\n'.join(value_type.declarations[language].format(name=name) for name, value_type in self.params)
+
+    def releases(self, language):
+        return '\n'.join(value_type.releases[language].format(name=name)
+                         for name, value_type in self.params if language in value_type.releases)
+
+
+class QuestionRegistry:
+    def __init__(self, questions=()):
+        self._questions = {}
+        for question in questions:
+            self.add(question)
+
+    def add(self, question):
+        self._questions[question.id] = question
+
+    def get(self, question_id):
+        return self._questions.get(question_id)
+
+    def __contains__(self, question_id):
+        return question_id in self._questions
+
+    def __len__(self):
+        return len(self._questions)
+
+    def load_folder(self, folder):
+        for name in sorted(os.listdir(folder)):
+            if name.endswith('.json'):
+                with open(os.path.join(folder, name), 'r') as f:
+                    self.add(Question(json.load(f), folder=folder))
+        return self
+
+    def load_mongo(self, collection, tests_collection=None):
+        # Documents override files with the same id
+        for document in collection.find({}, {'_id': 0}):
+            self.add(Question(document, tests_collection=tests_collection))
+        return self
+
+
+def load_questions(folder=None, mongo_uri=None, database='interview_platform', collection='coding_questions',
+                   tests_collection='coding_tests'):
+    registry = QuestionRegistry()
+    if folder and os.path.isdir(folder):
+        registry.load_folder(folder)
+    if mongo_uri:
+        from pymongo import MongoClient
+        db = MongoClient(mongo_uri)[database]
+        registry.load_mongo(db[collection], db[tests_collection])
+    return registry
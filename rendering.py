@@ -0,0 +1,38 @@
+import cv2
+from image_io import decode_image
+from video_ingest import read_frame, fit_frame
+
+# Highlight rendering for search results.  Images are decoded through
+# image_io.decode_image, which uses reduced-resolution JPEG decoding when the
+# requested rendition is much smaller than the original, so a thumbnail never
+# pays for a full-size decode and no rendition exceeds the decode pixel cap.
+
+RENDITIONS = {
+    'thumb': 480,
+    'full': None,
+}
+
+
+def render_highlight(img_path, box, max_side=None, quality=85, timestamp_ms=None):
+    """JPEG bytes of img_path with box (x1, y1, x2, y2, original pixels) outlined.
+
+    For a video, timestamp_ms selects the frame to render.
+    """
+    if timestamp_ms is not None:
+        frame = read_frame(img_path, timestamp_ms)
+        img_array, scale = fit_frame(frame) if frame is not None else (None, 1.0)
+    else:
+        img_array, scale = decode_image(img_path, max_side=max_side)
+    if img_array is None:
+        return None
+    if max_side and max(img_array.shape[:2]) > max_side:
+        ratio = max_side / max(img_array.shape[:2])
+        img_array = cv2.resize(img_array, None, fx=ratio, fy=ratio, interpolation=cv2.INTER_AREA)
+        scale *= ratio
+    if box:
+        x1, y1, x2, y2 = (int(round(v * scale)) for v in box)
+        thickness = max(2, int(round(2 * max(img_array.shape[:2]) / 1000)))
+        # The decoded array is private to this call, so draw on it in place.
+        cv2.rectangle(img_array, (x1, y1), (x2, y2), (0, 255, 0), thickness)
+    ok, buffer = cv2.imencode('.jpg', img_array, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return buffer.tobytes() if ok else None
@@ -0,0 +1,133 @@
+import time
+import heapq
+import itertools
+import threading
+from contextlib import contextmanager
+from metrics import MetricsRegistry
+
+# Admission control in front of the code executor.
+#
+# - A global limit on executions in flight keeps us inside the Judge0 quota
+#   (or the host's cores for the local executor).
+# - Executions beyond the limit wait in a priority queue: /submit before /run,
+#   first come first served within a priority.
+# - Each candidate has a token bucket, so a burst from a few candidates is
+#   refused with 429 instead of starving everyone else.
+# - A full queue, or a wait longer than max_wait, is refused with 503; both
+#   refusals carry a Retry-After estimate.
+
+PRIORITIES = {'submit': 0, 'run': 1}
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, message, status_code, retry_after):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = max(1, int(round(retry_after)))
+
+
+class TokenBuckets:
+    """Per-key token buckets holding up to capacity tokens, refilled at rate per second."""
+
+    def __init__(self, capacity, rate, max_keys=10000):
+        self.capacity = capacity
+        self.rate = rate
+        self.max_keys = max_keys
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def take(self, key):
+        """0 if a token was taken, else the seconds until one is available."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (self.capacity, now))
+            tokens = min(self.capacity, tokens + (now - updated) * self.rate)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                wait = 0.0
+            else:
+                self._buckets[key] = (tokens, now)
+                wait = (1 - tokens) / self.rate
+            if len(self._buckets) > self.max_keys:
+                self._prune(now)
+        return wait
+
+    def _prune(self, now):
+        # Buckets that have refilled completely carry no state worth keeping
+        full_after = self.capacity / self.rate
+        self._buckets = {key: value for key, value in self._buckets.items() if now - value[1] < full_after}
+
+
+class ExecutionScheduler:
+    def __init__(self, max_concurrent=8, max_queue=100, max_wait=30.0, bucket_capacity=10,
+                 bucket_rate=0.5, registry=None):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.buckets = TokenBuckets(bucket_capacity, bucket_rate)
+        self._queue = []
+        self._sequence = itertools.count()
+        self._active = 0
+        # Moving average of execution time, for Retry-After estimates
+        self._service_seconds = 1.0
+        self._changed = threading.Condition()
+
+        registry = registry or MetricsRegistry()
+        self.wait_seconds = registry.histogram(
+            'execution_queue_wait_seconds', 'Time executions waited for an execution slot.', ['kind'])
+        self.rejections = registry.counter(
+            'execution_rejections_total', 'Executions refused by admission control.', ['reason'])
+        registry.gauge('execution_queue_depth', 'Executions waiting for a slot.', callback=lambda: len(self._queue))
+        registry.gauge('execution_in_flight', 'Executions holding a slot.', callback=lambda: self._active)
+
+    def _retry_after(self, queued):
+        return (queued + 1) * self._service_seconds / self.max_concurrent
+
+    def take_token(self, candidate):
+        """Charge one execution to candidate's bucket; raises AdmissionRejected (429) when empty."""
+        wait = self.buckets.take(candidate)
+        if wait:
+            self.rejections.inc(reason='rate_limited')
+            raise AdmissionRejected("Too many executions, slow down", 429, wait)
+
+    @contextmanager
+    def slot(self, kind, bounded=True):
+        """Hold one of max_concurrent execution slots for the duration of the block.
+
+        bounded requests are refused with 503 when the queue is full or the wait
+        would exceed max_wait; unbounded ones (already-accepted async jobs) wait.
+        """
+        entry = (PRIORITIES.get(kind, len(PRIORITIES)), next(self._sequence))
+        queued_at = time.monotonic()
+        with self._changed:
+            if bounded and len(self._queue) >= self.max_queue:
+                self.rejections.inc(reason='queue_full')
+                raise AdmissionRejected("Execution queue is full, try again shortly", 503,
+                                        self._retry_after(len(self._queue)))
+            heapq.heappush(self._queue, entry)
+            try:
+                while self._queue[0] != entry or self._active >= self.max_concurrent:
+                    remaining = queued_at + self.max_wait - time.monotonic()
+                    if bounded and remaining <= 0:
+                        self.rejections.inc(reason='wait_timeout')
+                        raise AdmissionRejected("Execution queue is busy, try again shortly", 503,
+                                                self._retry_after(len(self._queue)))
+                    self._changed.wait(remaining if bounded else None)
+            except BaseException:
+                self._queue.remove(entry)
+                heapq.heapify(self._queue)
+                self._changed.notify_all()
+                raise
+            heapq.heappop(self._queue)
+            self._active += 1
+            # The next in line may also fit
+            self._changed.notify_all()
+        started = time.monotonic()
+        self.wait_seconds.observe(started - queued_at, kind=kind)
+        try:
+            yield
+        finally:
+            with self._changed:
+                self._active -= 1
+                self._service_seconds = 0.9 * self._service_seconds + 0.1 * (time.monotonic() - started)
+                self._changed.notify_all()
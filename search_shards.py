@@ -0,0 +1,264 @@
+"""Scatter-gather face search over shard worker processes.
+
+Each worker maps the same on-disk embedding store (see embedding_store.py)
+and scores only the row range it is handed, so one user's album is scanned
+by several cores at once.  Shard ranges are derived from the current store
+version on every query, which rebalances them automatically as update_cache
+or bulk_index.py grows the album.
+
+Workers are normally local processes started by ShardedSearcher as
+`python search_shards.py worker`, connected over a private socket pair; being
+started from this script rather than forked or spawned from the caller, they
+never import the caller's main module (app.py's models, Mongo client and
+cache warm-up stay in the parent).  Local workers need a POSIX host.  They can
+also run on other hosts that see the same CACHE_FOLDER.  Remote workers
+authenticate with the shared secret in SEARCH_WORKER_AUTHKEY, which must be
+set on both sides; bind to a non-loopback address only on a trusted network:
+
+    SEARCH_WORKER_AUTHKEY=... python search_shards.py serve --address 127.0.0.1:7001 --cache-folder cache
+"""
+import os
+import sys
+import socket
+import argparse
+import threading
+import subprocess
+import multiprocessing
+from multiprocessing.connection import Client, Connection, Listener
+import numpy as np
+from embedding_store import EmbeddingStore, best_faces_per_file
+
+def _handle(store, request):
+    username, version, query, threshold, start, stop, limit = request
+    view = store.open(username)
+    if view is None or view.version != version:
+        return ('stale', view.version if view is not None else None, [])
+    hits = best_faces_per_file(view, query, threshold, rows=slice(start, stop))
+    return ('ok', version, hits[:limit] if limit else hits)
+
+
+def _serve(conn, cache_folder):
+    store = EmbeddingStore(cache_folder)
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            break
+        if request is None:
+            break
+        try:
+            conn.send(_handle(store, request))
+        except Exception as e:
+            conn.send(('error', None, str(e)))
+    conn.close()
+
+
+def _local_worker(fd, cache_folder):
+    _serve(Connection(fd), cache_folder)
+
+
+def authkey_from_env():
+    """SEARCH_WORKER_AUTHKEY as bytes, or None if it is not set."""
+    authkey = os.environ.get('SEARCH_WORKER_AUTHKEY')
+    return authkey.encode() if authkey else None
+
+
+def plan_shards(view, n_shards, min_rows_per_shard):
+    """Split a view's rows into contiguous ranges that do not cut a file in two."""
+    count = len(view)
+    n_shards = max(1, min(n_shards, count // max(1, min_rows_per_shard)))
+    if n_shards == 1:
+        return [(0, count)]
+    bounds = [0]
+    file_idx = view.boxes[:, 0]
+    for i in range(1, n_shards):
+        cut = (count * i) // n_shards
+        # Move the cut forward to the first row of the next file.
+        while cut < count and cut > bounds[-1] and file_idx[cut] == file_idx[cut - 1]:
+            cut += 1
+        if bounds[-1] < cut < count:
+            bounds.append(cut)
+    bounds.append(count)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def merge_hits(shard_results, limit=None):
+    """Merge per-shard (file index, distance, row) lists into one sorted list."""
+    best = {}
+    for hits in shard_results:
+        for file_idx, distance, row in hits:
+            if file_idx not in best or distance < best[file_idx][1]:
+                best[file_idx] = (file_idx, distance, row)
+    merged = sorted(best.values(), key=lambda hit: hit[1])
+    return merged[:limit] if limit else merged
+
+
+class ShardedSearcher:
+    """Fan a query out to shard workers and merge their top-k results.
+
+    Usable as a context manager, e.g. in tests:
+
+        with ShardedSearcher('cache', workers=4) as searcher:
+            hits = searcher.search('alice', view, embedding, 0.5)
+    """
+
+    def __init__(self, cache_folder, workers=0, addresses=(), authkey=None, min_rows_per_shard=50000):
+        if addresses and not authkey:
+            raise ValueError("Remote shard workers need an authkey (set SEARCH_WORKER_AUTHKEY)")
+        self.cache_folder = cache_folder
+        self.min_rows_per_shard = min_rows_per_shard
+        self._authkey = authkey
+        # Connections 0..workers-1 go to local processes, the rest to addresses
+        self._processes = []
+        self._addresses = list(addresses)
+        self._conns = []
+        for _ in range(workers):
+            process, conn = self._start_local_worker()
+            self._processes.append(process)
+            self._conns.append(conn)
+        for address in self._addresses:
+            self._conns.append(self._dial(address))
+        # One in-flight request per connection; searches pipeline across workers.
+        self._locks = [threading.Lock() for _ in self._conns]
+
+    def _start_local_worker(self):
+        parent_sock, child_sock = socket.socketpair()
+        try:
+            process = subprocess.Popen(
+                [sys.executable, os.path.abspath(__file__), 'worker', '--fd', str(child_sock.fileno()),
+                 '--cache-folder', self.cache_folder],
+                pass_fds=(child_sock.fileno(),), stdin=subprocess.DEVNULL)
+        except BaseException:
+            parent_sock.close()
+            raise
+        finally:
+            child_sock.close()
+        return process, Connection(parent_sock.detach())
+
+    @staticmethod
+    def _stop_local_worker(process):
+        process.terminate()
+        try:
+            process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+    def _dial(self, address):
+        host, port = address.rsplit(':', 1)
+        return Client((host, int(port)), authkey=self._authkey)
+
+    def _reconnect(self, i):
+        """Replace connection i, whose unread replies would otherwise answer the next query.
+
+        Called with the connection's lock held.  A remote worker that cannot be
+        reached leaves the slot empty (None) until a later query redials it.
+        """
+        if self._conns[i] is not None:
+            try:
+                self._conns[i].close()
+            except OSError:
+                pass
+        if i < len(self._processes):
+            self._stop_local_worker(self._processes[i])
+            self._processes[i], self._conns[i] = self._start_local_worker()
+            return
+        try:
+            self._conns[i] = self._dial(self._addresses[i - len(self._processes)])
+        except (OSError, EOFError, multiprocessing.AuthenticationError):
+            self._conns[i] = None
+
+    def __len__(self):
+        return len(self._conns)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def search(self, username, view, query, threshold, limit=None):
+        """Same result as best_faces_per_file(view, query, threshold)[:limit]."""
+        if not self._conns or len(view) < 2 * self.min_rows_per_shard:
+            hits = best_faces_per_file(view, query, threshold)
+            return hits[:limit] if limit else hits
+        shards = plan_shards(view, len(self._conns), self.min_rows_per_shard)
+        query = np.asarray(query, dtype=np.float32).ravel()
+        used = list(range(len(shards)))
+        # Locks are always taken in index order, so concurrent searches cannot deadlock.
+        for i in used:
+            self._locks[i].acquire()
+        # Connections that may hold a request or reply belonging to this query
+        pending = set()
+        try:
+            for i, (start, stop) in zip(used, shards):
+                pending.add(i)
+                if self._conns[i] is None:
+                    raise ConnectionError(f"Shard worker {i} is not connected")
+                self._conns[i].send((username, view.version, query, threshold, start, stop, limit))
+            replies = []
+            for i in used:
+                replies.append(self._conns[i].recv())
+                pending.discard(i)
+        except Exception:
+            for i in pending:
+                self._reconnect(i)
+            replies = None
+        finally:
+            for i in used:
+                self._locks[i].release()
+        if replies is None or any(status != 'ok' for status, _, _ in replies):
+            # A worker saw a different store version (or failed, or its connection did): score locally
+            # rather than mixing row numbers from two snapshots.
+            hits = best_faces_per_file(view, query, threshold)
+            return hits[:limit] if limit else hits
+        return merge_hits([hits for _, _, hits in replies], limit)
+
+    def close(self):
+        for conn in self._conns:
+            if conn is None:
+                continue
+            try:
+                conn.send(None)
+                conn.close()
+            except (OSError, EOFError):
+                pass
+        for process in self._processes:
+            try:
+                process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self._stop_local_worker(process)
+        self._conns, self._processes, self._locks = [], [], []
+
+
+def serve(address, cache_folder, authkey):
+    host, port = address.rsplit(':', 1)
+    with Listener((host, int(port)), authkey=authkey) as listener:
+        print(f"Search shard worker listening on {address} for {os.path.abspath(cache_folder)}")
+        while True:
+            conn = listener.accept()
+            threading.Thread(target=_serve, args=(conn, cache_folder), daemon=True).start()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Face search shard worker.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    serve_parser = subparsers.add_parser('serve', help="Serve shard requests over TCP")
+    serve_parser.add_argument('--address', default='127.0.0.1:7001')
+    serve_parser.add_argument('--cache-folder', default='cache')
+    worker_parser = subparsers.add_parser('worker', help="Serve a ShardedSearcher over an inherited socket")
+    worker_parser.add_argument('--fd', type=int, required=True)
+    worker_parser.add_argument('--cache-folder', default='cache')
+    args = parser.parse_args(argv)
+    if args.command == 'worker':
+        _local_worker(args.fd, args.cache_folder)
+        return 0
+    authkey = authkey_from_env()
+    if authkey is None:
+        parser.error("SEARCH_WORKER_AUTHKEY must be set to a shared secret")
+    serve(args.address, args.cache_folder, authkey)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
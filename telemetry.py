@@ -0,0 +1,147 @@
+import json
+import time
+import contextvars
+from contextlib import contextmanager
+
+# Per-request execution telemetry for coding.py.
+#
+# Each /run or /submit request (synchronous or as a job) is traced from
+# admission to response.  The trace adds up where the time went:
+#
+#   admission  waiting for an execution slot (scheduler.py)
+#   harness    building the driver program and encoding test input
+#   enqueue    handing programs to Judge0 (batch POSTs)
+#   wait       Judge0 queueing and compiling, or the local executor's thread pool
+#   compile    compiling locally (Judge0 does not report compile time)
+#   run        running, as the executor reports it (Judge0's `time` field)
+#   compare    parsing harness output and comparing it with the expected output
+#
+# Executor stages are summed over every program the request ran, so for
+# suites run in parallel they can exceed the request's wall time.  Results
+# served from the result cache count as cached and add no executor time.
+# Executors put each program's stage times in the result's 'timings'.
+#
+# Aggregates go to the metrics registry; requests slower than slow_seconds
+# are logged as one JSON line each.
+
+STAGES = ('admission', 'harness', 'enqueue', 'wait', 'compile', 'run', 'compare')
+MEMORY_BUCKETS_KB = (1024, 4096, 16384, 32768, 65536, 131072, 262144, 524288, 1048576)
+
+_current_trace = contextvars.ContextVar('execution_trace', default=None)
+
+
+class ExecutionTrace:
+    def __init__(self, telemetry, kind, language, question_id):
+        self.telemetry = telemetry
+        self.kind = kind
+        self.language = language
+        self.question_id = question_id
+        self.stages = dict.fromkeys(STAGES, 0.0)
+        self.programs = 0
+        self.cached = 0
+        self.statuses = {}
+        self.max_memory_kb = None
+        self.started = time.perf_counter()
+        self.seconds = None
+
+    def add(self, stage, seconds):
+        self.stages[stage] += seconds
+
+    def record(self, result, language, cached=False):
+        if cached:
+            self.cached += 1
+            return
+        self.programs += 1
+        for stage, seconds in (result.get('timings') or {}).items():
+            self.add(stage, seconds)
+        status = 'error' if 'error' in result else (result.get('status') or {}).get('description', 'unknown')
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        if result.get('memory') is not None:
+            self.max_memory_kb = max(self.max_memory_kb or 0, result['memory'])
+        self.telemetry.observe_program(self, result, language, status)
+
+    def as_dict(self):
+        return {
+            'kind': self.kind,
+            'language': self.language,
+            'question_id': self.question_id,
+            'total_ms': round(self.seconds * 1000, 1) if self.seconds is not None else None,
+            'stages_ms': {stage: round(seconds * 1000, 1) for stage, seconds in self.stages.items()},
+            'programs': self.programs,
+            'cached': self.cached,
+            'statuses': self.statuses,
+            'max_memory_kb': self.max_memory_kb,
+        }
+
+
+@contextmanager
+def stage(name):
+    """Add the block's duration to stage name of the request being traced, if any."""
+    trace = _current_trace.get()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if trace is not None:
+            trace.add(name, time.perf_counter() - started)
+
+
+def record(result, language, cached=False):
+    """Count an executor result (or a cache hit) for a language's program against the request being traced.
+
+    language is the program's own, which for reference solutions may differ from the request's.
+    """
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.record(result, language, cached)
+
+
+class ExecutionTelemetry:
+    def __init__(self, registry, slow_seconds=None, logger=None):
+        self.slow_seconds = slow_seconds
+        self.logger = logger
+        self.request_seconds = registry.histogram(
+            'execution_request_seconds', 'Wall time of /run and /submit requests.', ['kind', 'language', 'question'])
+        self.stage_seconds = registry.histogram(
+            'execution_stage_seconds', "Time per stage of a request's executions.", ['kind', 'language', 'stage'])
+        self.program_run_seconds = registry.histogram(
+            'execution_program_run_seconds', 'Run time of each program, as the executor reports it.',
+            ['language', 'question'])
+        self.program_memory_kb = registry.histogram(
+            'execution_program_memory_kb', 'Peak memory of each program, when the executor reports it.',
+            ['language', 'question'], buckets=MEMORY_BUCKETS_KB)
+        self.programs = registry.counter(
+            'execution_programs_total', 'Programs run, by language and executor status.', ['language', 'status'])
+        self.slow_requests = registry.counter(
+            'execution_slow_requests_total', 'Requests slower than the slow-request threshold.', ['kind', 'language'])
+
+    @contextmanager
+    def trace(self, kind, language, question_id):
+        """Trace the block as one request; yields the ExecutionTrace."""
+        trace = ExecutionTrace(self, kind, language, question_id)
+        token = _current_trace.set(trace)
+        try:
+            yield trace
+        finally:
+            _current_trace.reset(token)
+            trace.seconds = time.perf_counter() - trace.started
+            self.finish(trace)
+
+    def observe_program(self, trace, result, language, status):
+        self.programs.inc(language=language, status=status)
+        timings = result.get('timings') or {}
+        if 'run' in timings:
+            self.program_run_seconds.observe(timings['run'], language=language, question=trace.question_id)
+        if result.get('memory') is not None:
+            self.program_memory_kb.observe(result['memory'], language=language, question=trace.question_id)
+
+    def finish(self, trace):
+        self.request_seconds.observe(trace.seconds, kind=trace.kind, language=trace.language,
+                                     question=trace.question_id)
+        for name, seconds in trace.stages.items():
+            if seconds:
+                self.stage_seconds.observe(seconds, kind=trace.kind, language=trace.language, stage=name)
+        if self.slow_seconds is not None and trace.seconds > self.slow_seconds:
+            self.slow_requests.inc(kind=trace.kind, language=trace.language)
+            if self.logger is not None:
+                self.logger.warning("Slow execution: %s", json.dumps(trace.as_dict()))
@@ -0,0 +1,43 @@
+import pytest
+
+from complexity import fit_complexity, generate, percentile_rank
+
+SIZES = [1000, 3000, 10000, 30000, 100000, 300000, 1000000]
+
+# Executor seconds measured on the two-sum probes: a ~25ms start-up cost plus
+# the work, with the run-to-run noise of a loaded host
+LINEAR = [0.025, 0.019, 0.019, 0.043, 0.13, 0.234, 0.954]
+LINEAR_NOISY = [0.0305, 0.0315, 0.0351, 0.0444, 0.0785, 0.186, 0.57]
+N_LOG_N = [0.0305, 0.0317, 0.0367, 0.0521, 0.1147, 0.2975, 1.0365]
+QUADRATIC = [0.07, 0.42, 3.849]
+CONSTANT = [0.0301, 0.0292, 0.0306, 0.0298, 0.0289, 0.0304, 0.0297]
+
+
+@pytest.mark.parametrize('values, expected', [
+    (LINEAR, 'O(n)'),
+    (LINEAR_NOISY, 'O(n)'),
+    (N_LOG_N, 'O(n log n)'),
+    (QUADRATIC, 'O(n^2)'),
+    (CONSTANT, 'O(1)'),
+])
+def test_fit_complexity_classifies_measurements(values, expected):
+    name, exponent = fit_complexity(SIZES[:len(values)], values)
+    assert name == expected
+    assert exponent is not None
+
+
+def test_fit_complexity_needs_two_sizes():
+    assert fit_complexity([1000], [0.5]) == (None, None)
+    assert fit_complexity([1000, 1000], [0.5, 0.6]) == (None, None)
+
+
+def test_generated_inputs_are_reproducible():
+    assert generate('two_sum', 100) == generate('two_sum', 100)
+    nums, target = generate('two_sum', 100)
+    pairs = [(i, j) for i in range(len(nums)) for j in range(i + 1, len(nums)) if nums[i] + nums[j] == target]
+    assert pairs == [(98, 99)]
+
+
+def test_percentile_rank_counts_ties_as_half():
+    assert percentile_rank([1.0, 2.0, 3.0, 4.0], 2.0) == 62.5
+    assert percentile_rank([], 1.0) is None
@@ -0,0 +1,78 @@
+import os
+import json
+import threading
+
+import numpy as np
+
+from embedding_store import EmbeddingStore, BOX_COLUMNS
+
+DIM = 8
+
+
+def rows(count):
+    """A store's worth of rows that all hold count, so a reader can tell which write it sees."""
+    vectors = np.full((count, DIM), count, dtype=np.float32)
+    boxes = np.zeros((count, BOX_COLUMNS), dtype=np.int32)
+    boxes[:, 0] = np.arange(count)
+    boxes[:, 1] = count
+    files = [[f"photo{i}.jpg", f"hash{i}"] for i in range(count)]
+    return files, vectors, boxes
+
+
+def test_readers_never_pair_one_write_with_anothers_rows(tmp_path):
+    writer = EmbeddingStore(str(tmp_path), dim=DIM)
+    writer.write_arrays('alice', *rows(100))
+    stop = threading.Event()
+    errors = []
+
+    def rewrite():
+        for i in range(200):
+            writer.write_arrays('alice', *rows(300 if i % 2 == 0 else 100))
+        stop.set()
+
+    def read():
+        while not stop.is_set():
+            try:
+                # A fresh store each time, as another process would be
+                view = EmbeddingStore(str(tmp_path), dim=DIM).open('alice')
+                count = len(view)
+                if count != len(view.files) or not (np.all(view.vectors == count) and np.all(view.boxes[:, 1] == count)):
+                    errors.append(f"rows of a different write in a view of {count}")
+            except Exception as e:
+                errors.append(repr(e))
+
+    threads = [threading.Thread(target=rewrite)] + [threading.Thread(target=read) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    view = writer.open('alice')
+    # Only the current generation's files are left
+    assert sorted(os.listdir(writer.user_dir('alice'))) == sorted(
+        ['.lock', 'meta.json', f"vectors-{view.meta['generation']}.f32", f"boxes-{view.meta['generation']}.i32"])
+
+
+def test_layout_2_store_is_upgraded_on_open(tmp_path):
+    store = EmbeddingStore(str(tmp_path), dim=DIM)
+    directory = store.user_dir('alice')
+    os.makedirs(directory)
+    files, vectors, boxes = rows(5)
+    vectors.tofile(os.path.join(directory, 'vectors.f32'))
+    boxes.tofile(os.path.join(directory, 'boxes.i32'))
+    with open(os.path.join(directory, 'meta.json'), 'w') as f:
+        json.dump({'layout': 2, 'dim': DIM, 'count': 5, 'version': 3, 'generation': 'old', 'files': files}, f)
+    view = store.open('alice')
+    assert len(view) == 5 and np.all(view.vectors == 5)
+    assert view.meta['generation'] != 'old'
+    assert not os.path.exists(os.path.join(directory, 'vectors.f32'))
+    store.append('alice', 'new.jpg', 'hash', [{'embedding': [1.0] * DIM, 'position': [1, 2, 3, 4]}])
+    assert len(store.open('alice')) == 6
+
+
+def test_delete_removes_every_generation(tmp_path):
+    store = EmbeddingStore(str(tmp_path), dim=DIM)
+    store.write_arrays('alice', *rows(3))
+    store.delete('alice')
+    assert store.open('alice') is None
+    assert os.listdir(store.user_dir('alice')) == ['.lock']
@@ -0,0 +1,40 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from image_io import decode_image, image_size, EXIF_ORIENTATION
+
+
+def jpeg(width, height, orientation=None):
+    # Left half dark, right half light, to see which way the decoder turned it
+    pixels = np.zeros((height, width, 3), dtype=np.uint8)
+    pixels[:, width // 2:] = 255
+    exif = Image.Exif()
+    if orientation is not None:
+        exif[EXIF_ORIENTATION] = orientation
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, 'JPEG', exif=exif.tobytes())
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize('orientation', [6, 8])
+def test_scale_follows_the_orientation_opencv_applies(orientation):
+    data = jpeg(800, 400, orientation)
+    assert image_size(data) == (400, 800)
+    img, scale = decode_image(data)
+    assert img.shape[:2] == (800, 400)
+    assert scale == 1.0
+    # Reduced decoding: the stored 800 x 400 comes out about 100 wide, 200 high
+    img, scale = decode_image(data, max_side=200)
+    assert img.shape[:2] == (200, 100)
+    assert scale == pytest.approx(0.25)
+
+
+def test_unrotated_photo_keeps_its_size():
+    data = jpeg(800, 400)
+    assert image_size(data) == (800, 400)
+    img, scale = decode_image(data, max_side=200)
+    assert img.shape[:2] == (100, 200)
+    assert scale == pytest.approx(0.25)
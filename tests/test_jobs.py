@@ -0,0 +1,70 @@
+import os
+import threading
+import time
+
+from jobs import JobManager, JobStore, DONE
+
+
+def run_job(manager, events=100):
+    release = threading.Event()
+
+    def handler(request, emit):
+        for i in range(events):
+            emit({'type': 'test', 'index': i})
+        release.wait(5)
+        return {'passed': events}, 200
+
+    manager.handlers['emit'] = handler
+    job = manager.submit('emit', {})
+    return job, release
+
+
+def wait_done(manager, job_id):
+    deadline = time.monotonic() + 5
+    while manager.get(job_id)['status'] != DONE:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_events_are_appended_not_rewritten(tmp_path, monkeypatch):
+    store = JobStore(str(tmp_path))
+    saves = []
+    save = store.save
+    monkeypatch.setattr(store, 'save', lambda job: (saves.append(job['status']), save(job)))
+    manager = JobManager(store, {}, workers=1, sweep_interval=None)
+    job, release = run_job(manager)
+    release.set()
+    wait_done(manager, job['id'])
+    # queued, running and done; not once per event
+    assert saves == ['queued', 'running', DONE]
+    loaded = store.load(job['id'])
+    assert [event['id'] for event in loaded['events']] == list(range(103))
+    assert loaded['result'] == {'passed': 100}
+    assert 'events' not in open(tmp_path / f"{job['id']}.json").read()
+
+
+def test_another_process_sees_events_of_a_running_job(tmp_path):
+    manager = JobManager(JobStore(str(tmp_path)), {}, workers=1, sweep_interval=None)
+    job, release = run_job(manager, events=5)
+    reader = JobStore(str(tmp_path))
+    deadline = time.monotonic() + 5
+    while len(reader.load(job['id'])['events']) < 7:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    # A partly written last line is not an event yet
+    with open(tmp_path / f"{job['id']}.events.jsonl", 'a') as f:
+        f.write('{"type":"te')
+    assert len(reader.load(job['id'])['events']) == 7
+    release.set()
+
+
+def test_finished_jobs_expire_while_running(tmp_path):
+    manager = JobManager(JobStore(str(tmp_path)), {}, workers=1, ttl=0.2, sweep_interval=0.05)
+    job, release = run_job(manager, events=1)
+    release.set()
+    wait_done(manager, job['id'])
+    deadline = time.monotonic() + 5
+    while os.listdir(tmp_path):
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+    assert manager.get(job['id']) is None
@@ -0,0 +1,96 @@
+import time
+import threading
+
+import pytest
+from werkzeug.serving import make_server
+
+import fake_judge0
+from judge0_client import Judge0Client, Judge0Error, CircuitBreaker, CircuitOpenError
+
+DEFAULTS = dict(fake_judge0.app.config)
+
+
+@pytest.fixture(scope='module')
+def server():
+    httpd = make_server('127.0.0.1', 0, fake_judge0.app, threaded=True)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_port}"
+    httpd.shutdown()
+
+
+@pytest.fixture
+def judge0(server):
+    """Configure the fake server with fake_judge0.app.config.update(...) inside a test."""
+    yield fake_judge0.app.config
+    fake_judge0.app.config.update(DEFAULTS)
+
+
+def client(url, **options):
+    options.setdefault('backoff', 0.01)
+    options.setdefault('max_backoff', 0.02)
+    return Judge0Client(url, **options)
+
+
+def test_submit_returns_the_result(server, judge0):
+    result = client(server).submit("print(1)", 71)
+    assert result['status']['description'] == 'Accepted'
+
+
+def test_retries_errors_then_gives_up(server, judge0):
+    judge0.update(ERROR_RATE=1.0)
+    judge0_client = client(server, max_retries=2)
+    with pytest.raises(Judge0Error) as raised:
+        judge0_client.submit("print(1)", 71)
+    assert raised.value.status_code == 500
+    assert judge0_client.retries_total.value(endpoint='submit') == 2
+
+
+def test_retries_are_bounded_by_the_total_timeout(server, judge0):
+    # Every wait=true POST outlives the read timeout
+    judge0.update(LATENCY=2.0)
+    judge0_client = client(server, read_timeout=0.5, max_retries=10, total_timeout=1.2)
+    started = time.monotonic()
+    with pytest.raises(Judge0Error):
+        judge0_client.submit("print(1)", 71)
+    assert time.monotonic() - started < 2.0
+
+
+def test_breaker_opens_and_recovers(server, judge0):
+    judge0.update(ERROR_RATE=1.0)
+    judge0_client = client(server, max_retries=0, breaker=CircuitBreaker(failure_threshold=2, reset_timeout=0.2))
+    for _ in range(2):
+        with pytest.raises(Judge0Error):
+            judge0_client.submit("print(1)", 71)
+    with pytest.raises(CircuitOpenError):
+        judge0_client.submit("print(1)", 71)
+    judge0.update(ERROR_RATE=0.0)
+    time.sleep(0.25)
+    assert judge0_client.submit("print(1)", 71)['status']['description'] == 'Accepted'
+    assert judge0_client.breaker.state == 'closed'
+
+
+def test_half_open_trial_is_released_by_an_invalid_response(server, judge0):
+    judge0_client = client(server, max_retries=0, breaker=CircuitBreaker(failure_threshold=1, reset_timeout=0.1))
+    judge0.update(GARBAGE_RATE=1.0)
+    with pytest.raises(Judge0Error):
+        judge0_client.submit("print(1)", 71)
+    assert judge0_client.breaker.state == 'open'
+    time.sleep(0.15)
+    # The half-open trial gets garbage too; it must reopen the breaker, not wedge it
+    with pytest.raises(Judge0Error):
+        judge0_client.submit("print(1)", 71)
+    judge0.update(GARBAGE_RATE=0.0)
+    time.sleep(0.15)
+    assert judge0_client.submit("print(1)", 71)['status']['description'] == 'Accepted'
+
+
+def test_batch_submissions_round_trip(server, judge0):
+    judge0.update(EXECUTE=True)
+    judge0_client = client(server)
+    tokens = [entry['token'] for entry in judge0_client.submit_batch(
+        [{'source_code': f"print({i})", 'language_id': 71} for i in range(3)])]
+    assert len(tokens) == 3
+    results = judge0_client.get_batch(tokens, 'token,stdout,status')
+    assert [result['token'] for result in results] == tokens
+    assert [result['stdout'] for result in results] == ['0\n', '1\n', '2\n']
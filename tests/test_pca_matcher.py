@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+
+from embedding_store import EmbeddingStore, EMBEDDING_DIM, BOX_COLUMNS, best_faces_per_file
+from pca_matcher import PCAProjection, TwoStageMatcher
+
+THRESHOLD = 0.5
+RECALL_TARGET = 0.99
+
+
+def unit(rows):
+    return (rows / np.linalg.norm(rows, axis=-1, keepdims=True)).astype(np.float32)
+
+
+def fixture_album(seed=0, people=40, faces_per_person=30, noise=0.6):
+    """Faces of a few people scattered over photos: (files, vectors, boxes, identities)."""
+    rng = np.random.default_rng(seed)
+    identities = unit(rng.standard_normal((people, EMBEDDING_DIM)))
+    person = np.repeat(np.arange(people), faces_per_person)
+    rng.shuffle(person)
+    vectors = unit(identities[person] + noise * unit(rng.standard_normal((person.size, EMBEDDING_DIM))))
+    boxes = np.zeros((person.size, BOX_COLUMNS), dtype=np.int32)
+    # Two or three faces per photo, rows of a photo contiguous
+    boxes[:, 0] = np.cumsum(rng.random(person.size) < 0.4)
+    boxes[:, 0] -= boxes[0, 0]
+    files = [[f"photo{i}.jpg", f"hash{i}"] for i in range(int(boxes[-1, 0]) + 1)]
+    return files, vectors, boxes, identities
+
+
+@pytest.fixture
+def album(tmp_path):
+    files, vectors, boxes, identities = fixture_album()
+    store = EmbeddingStore(str(tmp_path))
+    store.write_arrays('alice', files, vectors, boxes)
+    return store, vectors, identities
+
+
+def recall(matcher, store, queries):
+    view = store.open('alice')
+    found = exact = 0
+    for query in queries:
+        expected = {hit[0] for hit in best_faces_per_file(view, query, THRESHOLD)}
+        got = matcher.best_faces_per_file('alice', view, query, THRESHOLD)
+        assert all(hit[1] < THRESHOLD for hit in got)
+        exact += len(expected)
+        found += len(expected & {hit[0] for hit in got})
+    assert exact > 0
+    return found / exact
+
+
+def queries_for(identities, seed=1):
+    rng = np.random.default_rng(seed)
+    return unit(identities + 0.6 * unit(rng.standard_normal(identities.shape)))
+
+
+@pytest.mark.parametrize('margin, target', [(1.0, 1.0), (0.5, RECALL_TARGET)])
+def test_two_stage_recall_against_exact_matcher(album, margin, target):
+    store, vectors, identities = album
+    projection = PCAProjection.fit(vectors, 64)
+    matcher = TwoStageMatcher(store, projection, margin=margin, max_survivor_fraction=1.0)
+    queries = queries_for(identities)
+    assert recall(matcher, store, queries) >= target
+    # The first pass must actually prune, or the exact scan did all the work
+    view = store.open('alice')
+    reduced = matcher.reduced_for('alice', view)
+    assert max(matcher.candidates(reduced, query, THRESHOLD).size for query in queries) < len(view) // 10
+
+
+def test_reduced_rows_follow_appends_and_rewrites(album):
+    store, vectors, identities = album
+    projection = PCAProjection.fit(vectors, 64)
+    matcher = TwoStageMatcher(store, projection)
+    view = store.open('alice')
+    np.testing.assert_allclose(matcher.reduced_for('alice', view), projection.project(view.vectors), atol=1e-5)
+
+    faces = [{'embedding': identities[0].tolist(), 'position': [0, 0, 1, 1]}]
+    store.append('alice', 'new.jpg', 'newhash', faces)
+    appended = store.open('alice')
+    assert appended.meta['generation'] == view.meta['generation']
+    np.testing.assert_allclose(matcher.reduced_for('alice', appended), projection.project(appended.vectors), atol=1e-5)
+
+    # Same row count, different rows: must be rebuilt however the files were replaced
+    files, other, boxes, _ = fixture_album(seed=2)
+    store.write_arrays('alice', files, other[:len(appended)], boxes[:len(appended)])
+    rewritten = store.open('alice')
+    assert rewritten.meta['generation'] != appended.meta['generation']
+    np.testing.assert_allclose(matcher.reduced_for('alice', rewritten), projection.project(rewritten.vectors),
+                               atol=1e-5)
@@ -0,0 +1,83 @@
+import os
+import uuid
+import threading
+
+import pytest
+
+pytest.importorskip('resource')
+
+from executors import LocalExecutor
+from pids_cgroup import PidsCgroups
+
+# A writable pids cgroup to create the test's own parent under
+CGROUP_ROOT = os.environ.get('TEST_PIDS_CGROUP', '/sys/fs/cgroup/pids')
+
+THREADS = """
+import threading, time
+started = 0
+try:
+    for _ in range(50):
+        threading.Thread(target=time.sleep, args=(1,)).start()
+        started += 1
+except RuntimeError:
+    pass
+print(started)
+"""
+
+
+@pytest.fixture
+def cgroup_parent():
+    parent = os.path.join(CGROUP_ROOT, f"test-{uuid.uuid4().hex}")
+    try:
+        os.mkdir(parent)
+        PidsCgroups(parent, 1)
+    except (OSError, ValueError):
+        pytest.skip('no writable pids cgroup')
+    yield parent
+    os.rmdir(parent)
+
+
+@pytest.mark.parametrize('warm_pool_size', [0, 1])
+def test_limit_counts_only_the_programs_own_tasks(tmp_path, cgroup_parent, warm_pool_size):
+    # More server threads than the limit: RLIMIT_NPROC would have counted these
+    stop = threading.Event()
+    threads = [threading.Thread(target=stop.wait, daemon=True) for _ in range(20)]
+    for thread in threads:
+        thread.start()
+    try:
+        executor = LocalExecutor(max_processes=8, pids_cgroup=cgroup_parent, warm_pool_size=warm_pool_size,
+                                 scratch_root=str(tmp_path), artifact_cache_dir=str(tmp_path / 'artifacts'))
+    except BaseException:
+        stop.set()
+        raise
+    try:
+        assert executor.run("print('ok')\n", 71)['stdout'] == 'ok\n'
+        started = int(executor.run(THREADS, 71)['stdout'])
+        assert 0 < started < 8
+    finally:
+        executor.close()
+        stop.set()
+        for thread in threads:
+            thread.join()
+    assert not [name for name in os.listdir(cgroup_parent) if name.startswith('run-')]
+
+
+def test_processes_left_behind_are_killed(tmp_path, cgroup_parent):
+    executor = LocalExecutor(pids_cgroup=cgroup_parent, warm_pool_size=0, scratch_root=str(tmp_path))
+    try:
+        source = ("import subprocess\n"
+                  "print(subprocess.Popen(['sleep', '60'], start_new_session=True).pid)\n")
+        pid = int(executor.run(source, 71)['stdout'])
+    finally:
+        executor.close()
+    # Killed: gone, or a zombie waiting for init to reap it
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            assert f.read().rsplit(')', 1)[1].split()[0] == 'Z'
+    except FileNotFoundError:
+        pass
+
+
+def test_refuses_to_start_without_a_process_limit(tmp_path):
+    with pytest.raises(RuntimeError):
+        LocalExecutor(warm_pool_size=0, scratch_root=str(tmp_path))
@@ -0,0 +1,87 @@
+import os
+import sys
+import subprocess
+
+import numpy as np
+import pytest
+
+import search_shards
+from embedding_store import EmbeddingStore, best_faces_per_file
+from search_shards import ShardedSearcher
+
+DIM = 16
+
+
+@pytest.fixture
+def album(tmp_path):
+    rng = np.random.default_rng(0)
+    count = 400
+    vectors = rng.standard_normal((count, DIM)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    boxes = np.zeros((count, 6), dtype=np.int32)
+    boxes[:, 0] = np.arange(count) // 2
+    files = [[f"photo{i}.jpg", f"hash{i}"] for i in range(count // 2)]
+    store = EmbeddingStore(str(tmp_path), dim=DIM)
+    store.write_arrays('alice', files, vectors, boxes)
+    return store, vectors
+
+
+class FlakyConnection:
+    """Delivers the request but fails before the reply is read, leaving it in the pipe."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def send(self, request):
+        self.conn.send(request)
+
+    def recv(self):
+        raise OSError("connection reset")
+
+    def close(self):
+        self.conn.close()
+
+
+def test_failed_query_does_not_leak_replies_into_the_next(album):
+    store, vectors = album
+    view = store.open('alice')
+    with ShardedSearcher(store.root, workers=2, min_rows_per_shard=50) as searcher:
+        searcher._conns[0] = FlakyConnection(searcher._conns[0])
+        first = searcher.search('alice', view, vectors[0], 1.5, limit=5)
+        assert first == best_faces_per_file(view, vectors[0], 1.5)[:5]
+        for row in (100, 300):
+            assert searcher.search('alice', view, vectors[row], 1.5, limit=5) == \
+                best_faces_per_file(view, vectors[row], 1.5)[:5]
+
+
+def test_remote_workers_require_an_authkey(tmp_path):
+    with pytest.raises(ValueError):
+        ShardedSearcher(str(tmp_path), addresses=['127.0.0.1:7001'])
+
+
+def test_serve_refuses_to_start_without_an_authkey(monkeypatch):
+    monkeypatch.delenv('SEARCH_WORKER_AUTHKEY', raising=False)
+    with pytest.raises(SystemExit):
+        search_shards.main(['serve'])
+
+
+def test_local_workers_do_not_import_the_callers_main_module(album, tmp_path):
+    store, vectors = album
+    np.save(tmp_path / 'query.npy', vectors[7])
+    script = tmp_path / 'entry.py'
+    script.write_text(
+        "import sys\n"
+        "import numpy as np\n"
+        f"sys.path.insert(0, {os.path.dirname(os.path.dirname(os.path.abspath(__file__)))!r})\n"
+        "from embedding_store import EmbeddingStore\n"
+        "from search_shards import ShardedSearcher\n"
+        "print('entry module body ran', flush=True)\n"
+        "if __name__ == '__main__':\n"
+        f"    store = EmbeddingStore({store.root!r}, dim={DIM})\n"
+        "    view = store.open('alice')\n"
+        f"    query = np.load({str(tmp_path / 'query.npy')!r})\n"
+        "    with ShardedSearcher(store.root, workers=2, min_rows_per_shard=50) as searcher:\n"
+        "        print(searcher.search('alice', view, query, 1.5, limit=3)[0][0])\n")
+    output = subprocess.run([sys.executable, str(script)], capture_output=True, text=True, timeout=60, check=True).stdout
+    assert output.count('entry module body ran') == 1
+    assert output.splitlines()[-1] == '3'
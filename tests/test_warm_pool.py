@@ -0,0 +1,90 @@
+import os
+import sys
+import time
+import shutil
+import subprocess
+
+import pytest
+
+pytest.importorskip('resource')
+
+from executors import LocalExecutor
+from warm_pool import WarmPool, WarmRuntime, RuntimeNotParked, PYTHON_BOOTSTRAP
+
+PROGRAMS = {
+    71: "print(int(input()) * 2)\n",
+    63: "console.log(parseInt(require('fs').readFileSync(0, 'utf8')) * 2)\n",
+}
+
+
+@pytest.fixture
+def executor(tmp_path):
+    # The test programs are trusted
+    executor = LocalExecutor(warm_pool_size=2, scratch_root=str(tmp_path), unlimited_processes=True,
+                             artifact_cache_dir=str(tmp_path / 'artifacts'))
+    yield executor
+    executor.close()
+
+
+@pytest.mark.parametrize('language_id', sorted(PROGRAMS))
+def test_concurrent_runs_never_hit_an_unparked_runtime(executor, language_id):
+    if language_id not in executor.warm_pools:
+        pytest.skip("runtime not installed")
+    for round_ in range(10):
+        results = executor.run_many([PROGRAMS[language_id]] * 3, language_id, stdins=[f"{round_}\n"] * 3)
+        for result in results:
+            assert result['status']['description'] == 'Accepted', result
+            assert result['stdout'].strip() == str(2 * round_)
+    assert executor.warm_pools[language_id].hits > 0
+
+
+def test_pool_only_hands_out_ready_runtimes(tmp_path):
+    pool = WarmPool([sys.executable, '-I', '-S', '-c', PYTHON_BOOTSTRAP], 1, None, scratch_root=str(tmp_path))
+    try:
+        runtime = None
+        for _ in range(200):
+            runtime = pool.acquire()
+            if runtime is not None:
+                break
+            time.sleep(0.05)
+        assert runtime is not None
+        assert os.path.exists(os.path.join(runtime.workdir, '.ready'))
+        with open(os.path.join(runtime.workdir, 'main.py'), 'w') as f:
+            f.write("print('warm')\n")
+        returncode, _ = runtime.go('', 5)
+        assert returncode == 0
+        with open(os.path.join(runtime.workdir, '.stdout')) as f:
+            assert f.read() == 'warm\n'
+        runtime.discard()
+    finally:
+        pool.close()
+
+
+def test_go_raises_when_runtime_never_parks(tmp_path):
+    workdir = tmp_path / 'dead'
+    workdir.mkdir()
+    subprocess.run(['mkfifo', str(workdir / '.go')], check=True)
+    process = subprocess.Popen([sys.executable, '-c', 'pass'], stdin=subprocess.PIPE)
+    process.wait()
+    runtime = WarmRuntime(process, str(workdir), 0)
+    with pytest.raises(RuntimeNotParked):
+        runtime.go('', 5)
+    shutil.rmtree(workdir)
+
+
+def test_unparked_runtime_falls_back_to_a_cold_run(executor, monkeypatch):
+    if 71 not in executor.warm_pools:
+        pytest.skip("runtime not installed")
+
+    def not_parked(self, stdin, wall_seconds):
+        raise RuntimeNotParked("runtime is not waiting on its go FIFO")
+
+    monkeypatch.setattr(WarmRuntime, 'go', not_parked)
+    for _ in range(50):
+        if executor.warm_pools[71]._ready:
+            break
+        time.sleep(0.05)
+    result = executor.run(PROGRAMS[71], 71, stdin="21\n")
+    assert result['status']['description'] == 'Accepted', result
+    assert result['stdout'].strip() == '42'
+    assert executor.warm_pools[71].hits == 1
@@ -0,0 +1,164 @@
+import os
+from contextlib import nullcontext
+import cv2
+import numpy as np
+from image_io import MAX_DECODE_PIXELS
+
+# Keyframe sampling for video indexing.
+#
+# Running detection on every frame of an hour of 30fps video is ~100k MTCNN
+# passes, almost all of them on frames that look like their neighbours.
+# Instead frames are probed at a low rate on a tiny grayscale thumbnail, and a
+# frame is kept only when
+#
+#   - SAMPLE_INTERVAL_S has passed since the last kept frame, or
+#   - it differs from the previous probe by more than SCENE_THRESHOLD (a cut),
+#
+# and it is not near-identical (DUPLICATE_THRESHOLD) to the last kept frame.
+# Kept frames go through the same extract_faces path as photos and their
+# crops are embedded in batches.  Every face records its timestamp_ms.
+
+VIDEO_EXTENSIONS = ('.mp4', '.mov', '.m4v', '.avi', '.mkv', '.webm')
+
+SAMPLE_INTERVAL_S = float(os.environ.get('VIDEO_SAMPLE_INTERVAL_S', '2.0'))
+PROBE_INTERVAL_S = 0.25
+# Mean absolute difference of 64x36 grayscale thumbnails, on a 0-255 scale
+SCENE_THRESHOLD = 30.0
+DUPLICATE_THRESHOLD = 4.0
+THUMB_SIZE = (64, 36)
+
+
+def is_video(path):
+    return path.lower().endswith(VIDEO_EXTENSIONS)
+
+
+def _thumbnail(frame):
+    small = cv2.resize(frame, THUMB_SIZE, interpolation=cv2.INTER_AREA)
+    return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY).astype(np.int16)
+
+
+def _difference(a, b):
+    return float(np.mean(np.abs(a - b)))
+
+
+def fit_frame(frame, max_pixels=MAX_DECODE_PIXELS):
+    """Downscale a frame over the decode pixel cap; returns (frame, scale)."""
+    pixels = frame.shape[0] * frame.shape[1]
+    if not max_pixels or pixels <= max_pixels:
+        return frame, 1.0
+    ratio = (max_pixels / pixels) ** 0.5
+    return cv2.resize(frame, None, fx=ratio, fy=ratio, interpolation=cv2.INTER_AREA), ratio
+
+
+def sample_keyframes(video_path, interval_s=SAMPLE_INTERVAL_S, probe_interval_s=PROBE_INTERVAL_S,
+                     scene_threshold=SCENE_THRESHOLD, duplicate_threshold=DUPLICATE_THRESHOLD):
+    """Yield (timestamp_ms, BGR frame) for the frames worth running detection on."""
+    capture = cv2.VideoCapture(video_path)
+    if not capture.isOpened():
+        raise ValueError(f"Cannot open video {video_path}")
+    try:
+        fps = capture.get(cv2.CAP_PROP_FPS) or 25.0
+        probe_every = max(1, int(round(fps * probe_interval_s)))
+        frame_no = 0
+        previous_probe = last_kept = None
+        last_kept_ms = None
+        while True:
+            # grab() advances without the colour conversion retrieve() does,
+            # so frames between probes cost only their decode.
+            if not capture.grab():
+                break
+            frame_no += 1
+            if (frame_no - 1) % probe_every:
+                continue
+            ok, frame = capture.retrieve()
+            if not ok:
+                break
+            timestamp_ms = int(round((frame_no - 1) * 1000 / fps))
+            thumb = _thumbnail(frame)
+            scene_cut = previous_probe is not None and _difference(thumb, previous_probe) > scene_threshold
+            previous_probe = thumb
+            due = last_kept_ms is None or timestamp_ms - last_kept_ms >= interval_s * 1000
+            if not (due or scene_cut):
+                continue
+            if last_kept is not None and _difference(thumb, last_kept) < duplicate_threshold:
+                # A static shot: push the interval on instead of re-detecting the same faces
+                last_kept_ms = timestamp_ms
+                continue
+            last_kept, last_kept_ms = thumb, timestamp_ms
+            yield timestamp_ms, frame
+    finally:
+        capture.release()
+
+
+def index_video(video_path, stage=None, batch_size=32, **sampling):
+    """Detect and embed faces in a video's keyframes, in the cache's face format.
+
+    Faces carry timestamp_ms next to their position; crops are embedded in
+    batches of batch_size across keyframes.
+    """
+    # Imported lazily: loading the models is only needed once a video is indexed.
+    from face_pipeline import extract_faces, extract_features_batch
+    stage = stage or (lambda name: nullcontext())
+    face_data, pending = [], []
+
+    def flush():
+        with stage('embed'):
+            embeddings = extract_features_batch([face for face, _, _ in pending], batch_size=batch_size)
+        for embedding, (_, position, timestamp_ms) in zip(embeddings, pending):
+            face_data.append({
+                'embedding': embedding.tolist(),
+                'position': position,
+                'timestamp_ms': timestamp_ms,
+            })
+        pending.clear()
+
+    keyframes = sample_keyframes(video_path, **sampling)
+    while True:
+        with stage('decode'):
+            keyframe = next(keyframes, None)
+        if keyframe is None:
+            break
+        timestamp_ms, frame = keyframe
+        frame, scale = fit_frame(frame)
+        with stage('detect'):
+            faces, positions = extract_faces(frame, inplace=True)
+        for face, position in zip(faces, positions):
+            if scale != 1.0:
+                position = tuple(int(round(v / scale)) for v in position)
+            # Crops are views into the frame, so copy before the next frame replaces it
+            pending.append((face.copy(), position, timestamp_ms))
+        if len(pending) >= batch_size:
+            flush()
+    if pending:
+        flush()
+    return face_data
+
+
+def read_frame(video_path, timestamp_ms):
+    """The BGR frame at timestamp_ms, or None."""
+    capture = cv2.VideoCapture(video_path)
+    try:
+        if not capture.isOpened():
+            return None
+        capture.set(cv2.CAP_PROP_POS_MSEC, float(timestamp_ms))
+        ok, frame = capture.read()
+        return frame if ok else None
+    finally:
+        capture.release()
+
+
+def extract_video_metadata(video_path):
+    """Dimensions and duration of a video, in the shape of extract_photo_metadata."""
+    metadata = {"taken_at": None, "camera": None, "width": None, "height": None, "duration_s": None}
+    capture = cv2.VideoCapture(video_path)
+    try:
+        if capture.isOpened():
+            metadata["width"] = int(capture.get(cv2.CAP_PROP_FRAME_WIDTH)) or None
+            metadata["height"] = int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT)) or None
+            fps = capture.get(cv2.CAP_PROP_FPS)
+            frames = capture.get(cv2.CAP_PROP_FRAME_COUNT)
+            if fps and frames:
+                metadata["duration_s"] = round(frames / fps, 3)
+    finally:
+        capture.release()
+    return metadata
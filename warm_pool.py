@@ -0,0 +1,303 @@
+import os
+import glob
+import errno
+import time
+import shutil
+import signal
+import hashlib
+import tempfile
+import threading
+import subprocess
+from collections import deque
+
+# Start-up cost removal for LocalExecutor.
+#
+# WarmPool keeps a few runtimes per language already started and parked, each
+# in its own scratch directory with its stdout/stderr files open and its
+# rlimits applied.  A parked runtime touches .ready and then blocks opening
+# the .go FIFO in its directory; to run a program the executor drops the
+# program (or compiled artifacts) into that directory and writes to the FIFO,
+# and the runtime loads and runs it.  A runtime is only handed out once .ready
+# exists, and go() waits out the short gap between .ready and the FIFO open;
+# a runtime that never parks raises RuntimeNotParked and the caller runs cold.  Every runtime serves exactly one program and is then thrown
+# away with its directory, so nothing leaks between runs; a replacement is
+# started in the background, off the request path.
+#
+# ArtifactCache keeps compiler output keyed by a hash of the compile command
+# and the source, so re-running unchanged C, C++ or Java code skips the
+# compiler.
+
+GO_FIFO = '.go'
+READY_FILE = '.ready'
+# How long a starting runtime may take to report ready (a JVM is the slowest)
+READY_TIMEOUT_SECONDS = 30
+# How long go() waits for a ready runtime to open the FIFO
+PARK_TIMEOUT_SECONDS = 1
+
+# Bootstraps: report ready, wait for the go signal, then run the program as its own entry point
+PYTHON_BOOTSTRAP = (
+    "import sys\n"
+    "open('.ready', 'w').close()\n"
+    "open('.go').read()\n"
+    "sys.argv = ['main.py']\n"
+    "sys.path.insert(0, '')\n"
+    "with open('main.py') as f:\n"
+    "    code = compile(f.read(), 'main.py', 'exec')\n"
+    "exec(code, {'__name__': '__main__', '__file__': 'main.py', '__builtins__': __builtins__})\n"
+)
+NODE_BOOTSTRAP = (
+    "require('fs').writeFileSync('.ready', '');"
+    "require('fs').readFileSync('.go');"
+    "require(require('path').resolve('main.js'));"
+)
+JAVA_BOOTSTRAP_CLASS = 'WarmMain'
+JAVA_BOOTSTRAP = """
+import java.lang.reflect.InvocationTargetException;
+import java.lang.reflect.Method;
+import java.net.URL;
+import java.net.URLClassLoader;
+import java.nio.file.Files;
+import java.nio.file.Paths;
+
+public class WarmMain {
+    public static void main(String[] args) throws Throwable {
+        Files.write(Paths.get(".ready"), new byte[0]);
+        Files.readAllBytes(Paths.get(".go"));
+        URL here = Paths.get("").toAbsolutePath().toUri().toURL();
+        Method main = new URLClassLoader(new URL[]{here}).loadClass("Main").getMethod("main", String[].class);
+        try {
+            main.invoke(null, (Object) new String[0]);
+        } catch (InvocationTargetException e) {
+            throw e.getCause();
+        }
+        System.out.flush();
+    }
+}
+"""
+
+
+def build_java_bootstrap(directory):
+    """Compile the JVM bootstrap class into directory; returns directory or None without javac."""
+    os.makedirs(directory, exist_ok=True)
+    if os.path.exists(os.path.join(directory, JAVA_BOOTSTRAP_CLASS + '.class')):
+        return directory
+    with open(os.path.join(directory, JAVA_BOOTSTRAP_CLASS + '.java'), 'w') as f:
+        f.write(JAVA_BOOTSTRAP)
+    try:
+        subprocess.run(['javac', JAVA_BOOTSTRAP_CLASS + '.java'], cwd=directory, check=True,
+                       capture_output=True, timeout=60)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return directory
+
+
+class ArtifactCache:
+    """Compiled outputs on disk, keyed by compile command and source, LRU by mtime."""
+
+    def __init__(self, root, max_entries=256):
+        self.root = root
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def key(self, compile_command, source):
+        digest = hashlib.sha256('\0'.join(compile_command).encode('utf-8'))
+        digest.update(b'\0\0' + source.encode('utf-8'))
+        return digest.hexdigest()
+
+    def restore(self, key, workdir):
+        """Copy cached artifacts into workdir; False on a miss."""
+        entry = os.path.join(self.root, key)
+        try:
+            names = os.listdir(entry)
+            for name in names:
+                shutil.copy2(os.path.join(entry, name), os.path.join(workdir, name))
+            os.utime(entry)
+        except FileNotFoundError:
+            self.misses += 1
+            return False
+        self.hits += 1
+        return True
+
+    def store(self, key, workdir, patterns):
+        entry = os.path.join(self.root, key)
+        if os.path.isdir(entry):
+            return
+        staging = tempfile.mkdtemp(prefix='.staging-', dir=self.root)
+        for pattern in patterns:
+            for path in glob.glob(os.path.join(workdir, pattern)):
+                shutil.copy2(path, staging)
+        try:
+            # Atomic publish: a concurrent identical compile simply loses the race
+            os.rename(staging, entry)
+        except OSError:
+            shutil.rmtree(staging, ignore_errors=True)
+        self._evict()
+
+    def _evict(self):
+        with self._lock:
+            entries = [os.path.join(self.root, name) for name in os.listdir(self.root) if not name.startswith('.')]
+            if len(entries) <= self.max_entries:
+                return
+            entries.sort(key=lambda path: os.stat(path).st_mtime)
+            for path in entries[:len(entries) - self.max_entries]:
+                shutil.rmtree(path, ignore_errors=True)
+
+
+class RuntimeNotParked(Exception):
+    """The runtime never opened its go FIFO (it died or stalled); run the program cold instead."""
+
+
+class WarmRuntime:
+    def __init__(self, process, workdir, started_at, cgroups=None, cgroup=None):
+        self.process = process
+        self.workdir = workdir
+        self.started_at = started_at
+        self.cgroups = cgroups
+        self.cgroup = cgroup
+
+    def go(self, stdin, wall_seconds):
+        """Release the parked runtime; (returncode or None on timeout, elapsed).
+
+        Raises RuntimeNotParked, before the program has started, if the runtime
+        does not open the FIFO within PARK_TIMEOUT_SECONDS.
+        """
+        fd = self._open_go()
+        started = time.monotonic()
+        os.write(fd, b'go')
+        os.close(fd)
+        try:
+            self.process.communicate((stdin or '').encode('utf-8'), timeout=wall_seconds)
+            returncode = self.process.returncode
+        except subprocess.TimeoutExpired:
+            self.kill()
+            returncode = None
+        return returncode, time.monotonic() - started
+
+    def _open_go(self):
+        path = os.path.join(self.workdir, GO_FIFO)
+        deadline = time.monotonic() + PARK_TIMEOUT_SECONDS
+        while True:
+            try:
+                # Non-blocking open fails with ENXIO until the runtime is waiting on the FIFO
+                return os.open(path, os.O_WRONLY | os.O_NONBLOCK)
+            except OSError as e:
+                if e.errno != errno.ENXIO:
+                    raise RuntimeNotParked(str(e)) from e
+            if self.process.poll() is not None or time.monotonic() > deadline:
+                raise RuntimeNotParked("runtime is not waiting on its go FIFO")
+            time.sleep(0.001)
+
+    def wait_ready(self, timeout):
+        """True once the bootstrap has reported ready; False if it died or took longer than timeout."""
+        path = os.path.join(self.workdir, READY_FILE)
+        deadline = time.monotonic() + timeout
+        while not os.path.exists(path):
+            if self.process.poll() is not None or time.monotonic() > deadline:
+                return False
+            time.sleep(0.005)
+        return True
+
+    def kill(self):
+        try:
+            os.killpg(self.process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        self.process.wait()
+
+    def discard(self):
+        if self.process.poll() is None:
+            self.kill()
+        if self.cgroup is not None:
+            self.cgroups.remove(self.cgroup)
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+class WarmPool:
+    """Up to `size` parked runtimes for one language, refilled in the background."""
+
+    def __init__(self, command, size, preexec_fn, scratch_root=None, env=None, cgroups=None):
+        self.command = command
+        self.size = size
+        self.preexec_fn = preexec_fn
+        # PidsCgroups: each runtime gets its own cgroup, removed when it is discarded
+        self.cgroups = cgroups
+        self.scratch_root = scratch_root
+        self.env = env
+        self.hits = 0
+        self.misses = 0
+        self._ready = deque()
+        self._starting = 0
+        self._closed = False
+        self._lock = threading.Lock()
+        self._refill()
+
+    def _start_one(self):
+        workdir = tempfile.mkdtemp(prefix='warm-', dir=self.scratch_root)
+        cgroup = None
+        try:
+            preexec_fn = self.preexec_fn
+            if self.cgroups is not None:
+                cgroup = self.cgroups.create()
+
+                def preexec_fn():
+                    self.cgroups.join(cgroup)
+                    self.preexec_fn()
+            os.mkfifo(os.path.join(workdir, GO_FIFO))
+            with open(os.path.join(workdir, '.stdout'), 'wb') as out, open(os.path.join(workdir, '.stderr'), 'wb') as err:
+                process = subprocess.Popen(self.command, cwd=workdir, stdin=subprocess.PIPE, stdout=out, stderr=err,
+                                           env=dict(self.env or {}, HOME=workdir), preexec_fn=preexec_fn,
+                                           start_new_session=True)
+        except OSError:
+            if cgroup is not None:
+                self.cgroups.remove(cgroup)
+            shutil.rmtree(workdir, ignore_errors=True)
+            with self._lock:
+                self._starting -= 1
+            return
+        runtime = WarmRuntime(process, workdir, time.monotonic(), self.cgroups, cgroup)
+        if not runtime.wait_ready(READY_TIMEOUT_SECONDS):
+            runtime.discard()
+            with self._lock:
+                self._starting -= 1
+            return
+        with self._lock:
+            self._starting -= 1
+            if not self._closed:
+                self._ready.append(runtime)
+                return
+        runtime.discard()
+
+    def _refill(self):
+        with self._lock:
+            missing = 0 if self._closed else self.size - len(self._ready) - self._starting
+            self._starting += max(0, missing)
+        for _ in range(max(0, missing)):
+            threading.Thread(target=self._start_one, daemon=True).start()
+
+    def acquire(self):
+        """A parked runtime, or None if none is ready (the caller runs cold)."""
+        runtime = None
+        with self._lock:
+            while self._ready:
+                candidate = self._ready.popleft()
+                if candidate.process.poll() is None:
+                    runtime = candidate
+                    break
+                # Died while parked (e.g. killed externally): drop it
+                threading.Thread(target=candidate.discard, daemon=True).start()
+        if runtime is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        self._refill()
+        return runtime
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            ready, self._ready = list(self._ready), deque()
+        for runtime in ready:
+            runtime.discard()